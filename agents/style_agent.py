@@ -2,17 +2,19 @@ import os
 import json
 from typing import Dict, List, Optional, Union
 from utils.need2text import get_need2text, get_addition_need2text
-from utils.model_based_text2garment import description_to_garment
+from utils.garment_source import description_to_garment
 from utils.flux_vton import run_vton
 from utils.search import search_clothing_items
 from utils.metrics import VQAScore, ClipScore
+from utils.cancellation import CancellationToken
 from config.config import STATIC_FOLDER
 
 class StyleAgent:
     def __init__(self):
         # 初始化各组件
-        self.vqa_scorer = VQAScore()
         self.clip_scorer = ClipScore()
+        # VQA的本地备选评分复用同一个CLIP评分器
+        self.vqa_scorer = VQAScore(clip_scorer=self.clip_scorer)
 
     def generate_clothing_description(self, user_need: str) -> Dict:
         """根据用户需求生成服装描述"""
@@ -42,11 +44,12 @@ class StyleAgent:
             # 返回原始描述
             return original_description
 
-    def generate_clothing_images(self, garment_description: Dict) -> Dict:
+    def generate_clothing_images(self, garment_description: Dict,
+                                 cancel_token: Optional[CancellationToken] = None) -> Dict:
         """根据服装描述生成服装图像"""
         try:
             # 调用text2garment组件生成服装图像
-            garment_images = description_to_garment(garment_description)
+            garment_images = description_to_garment(garment_description, cancel_token)
             print(f"生成了 {len(garment_images.get('garments', []))} 张服装图像")
             return garment_images
         except Exception as e:
@@ -58,7 +61,8 @@ class StyleAgent:
                 "garments": []
             }
 
-    def try_on_clothing(self, garment_info: Dict, human_image_path: str, gender: str = "female") -> Dict:
+    def try_on_clothing(self, garment_info: Dict, human_image_path: str, gender: str = "female",
+                        cancel_token: Optional[CancellationToken] = None) -> Dict:
         """进行虚拟试穿"""
         try:
             # 检查人体图像是否存在
@@ -71,7 +75,7 @@ class StyleAgent:
                 }
             
             # 调用flux_vton组件进行虚拟试穿
-            vton_result = run_vton(garment_info, human_image_path, gender)
+            vton_result = run_vton(garment_info, human_image_path, gender, cancel_token)
             print(f"生成了 {len(vton_result.get('vton_results', []))} 个虚拟试穿结果")
             return vton_result
         except Exception as e:
@@ -96,19 +100,20 @@ class StyleAgent:
             return []
 
     def run_pipeline(self, user_need: str, human_image_path: Optional[str] = None, 
-                    gender: str = "female", num_products: int = 5) -> Dict:
+                    gender: str = "female", num_products: int = 5,
+                    cancel_token: Optional[CancellationToken] = None) -> Dict:
         """运行完整的StyleAgent流程"""
         try:
             # 1. 生成服装描述
             garment_description = self.generate_clothing_description(user_need)
             
             # 2. 生成服装图像
-            garment_images = self.generate_clothing_images(garment_description)
+            garment_images = self.generate_clothing_images(garment_description, cancel_token)
             
             # 3. 进行虚拟试穿（如果提供了人体图像）
             vton_result = {}
             if human_image_path:
-                vton_result = self.try_on_clothing(garment_images, human_image_path, gender)
+                vton_result = self.try_on_clothing(garment_images, human_image_path, gender, cancel_token)
             
             # 4. 搜索相关服装商品
             search_query = garment_description.get("prompt", user_need)
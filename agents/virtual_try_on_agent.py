@@ -7,17 +7,23 @@ from utils.flux_vton import run_vton
 from utils.metrics import VQAScore, ClipScore
 from utils.image_process import image_process
 from utils.human_mask import human_mask_instance
+from utils.try_on_evaluation import TryOnEvaluator
+from utils.cancellation import CancellationToken
 from config.config import STATIC_FOLDER, MAX_FLUX_VTON_ITERATIONS, VTON_GUIDANCE_SCALE
 
 class VirtualTryOnAgent:
     def __init__(self):
         # 初始化虚拟试穿和评估组件
-        self.vqa_score = VQAScore()
         self.clip_score = ClipScore()
+        # VQA的本地备选评分复用同一个CLIP评分器
+        self.vqa_score = VQAScore(clip_scorer=self.clip_score)
+        # 批量评估器与试穿共用同一组评分器
+        self.evaluator = TryOnEvaluator(self.vqa_score, self.clip_score, human_mask_instance)
 
     def try_on_clothing(self, person_image_path: str, clothing_image_path: str, 
                        clothing_description: str = "", iterations: int = None, 
-                       guidance_scale: float = None) -> Dict:
+                       guidance_scale: float = None,
+                       cancel_token: Optional[CancellationToken] = None) -> Dict:
         """执行虚拟试穿"""
         try:
             # 使用配置中的参数，如果未提供
@@ -40,7 +46,8 @@ class VirtualTryOnAgent:
             result = run_vton(
                 garment_info=garment_info,
                 human_image_path=person_image_path,
-                gender="female"  # 默认性别，可以根据实际情况调整
+                gender="female",  # 默认性别，可以根据实际情况调整
+                cancel_token=cancel_token
             )
 
             # 检查结果
@@ -59,7 +66,8 @@ class VirtualTryOnAgent:
                 "result_image": result_image_path,
                 "iteration_results": [result_image_path],  # 简化处理，只返回最佳结果
                 "clip_scores": [score],  # 简化处理，只返回最佳评分
-                "best_iteration": 0
+                "best_iteration": 0,
+                "clothing_description": clothing_description
             }
         except Exception as e:
             print(f"执行虚拟试穿时出错: {e}")
@@ -69,51 +77,30 @@ class VirtualTryOnAgent:
                               try_on_result_image: str, clothing_description: str = "") -> Dict:
         """评估虚拟试穿结果"""
         try:
-            # 读取图像
-            person_image = Image.open(person_image_path)
-            clothing_image = Image.open(clothing_image_path)
-            result_image = Image.open(try_on_result_image)
-
-            # 生成评估描述
-            if not clothing_description:
-                clothing_description = "一件服装"
-
-            # 使用VQA评分器评估结果
-            vqa_prompt = f"这件{clothing_description}穿在模特身上看起来自然吗？整体效果如何？"
-            vqa_result = self.vqa_score.score_image(try_on_result_image, vqa_prompt)
-
-            # 使用CLIP评分器评估结果
-            clip_score = self.clip_score.score(try_on_result_image, clothing_description)
-
-            # 人体检测和分割评估
-            human_detection = human_mask_instance.detect_human(result_image)
-            human_segmentation = human_mask_instance.segment_human(result_image)
-
-            # 构建评估结果
-            evaluation = {
-                "vqa_evaluation": vqa_result,
-                "clip_score": float(clip_score),  # 转换为Python原生浮点数
-                "human_detection": {
-                    "has_human": human_detection["has_human"],
-                    "confidence": human_detection["confidence"]
-                },
-                "segmentation_quality": {
-                    "has_segmentation": len(human_segmentation["mask"]) > 0,
-                    "area_percentage": human_segmentation["area_percentage"]
-                }
-            }
-
-            # 添加总体评分（1-10分）
-            # 这是一个简化的评分逻辑，实际应用中可能需要更复杂的评分算法
-            overall_score = min(10, max(1, int(clip_score * 5 + 5)))
-            evaluation["overall_score"] = overall_score
-
-            print(f"虚拟试穿结果评估完成，总体评分: {overall_score}/10")
+            evaluation = self.evaluator.evaluate_batch([try_on_result_image], [clothing_description])[0]
+            print(f"虚拟试穿结果评估完成，总体评分: {evaluation['overall_score']}/10")
             return evaluation
         except Exception as e:
             print(f"评估虚拟试穿结果时出错: {e}")
             return {"error": str(e)}
 
+    def evaluate_try_on_results(self, results: List[Dict], clothing_descriptions: List[str] = None,
+                                category: Optional[str] = None,
+                                cancel_token: Optional[CancellationToken] = None) -> List[Dict]:
+        """批量评估多个成功的试穿结果，返回每个结果一行的指标表（含result_index，对应results中的位置）"""
+        indices = [i for i, r in enumerate(results) if r.get("success", False) and r.get("result_image")]
+        if clothing_descriptions is None:
+            clothing_descriptions = [r.get("clothing_description", "") for r in results]
+        table = self.evaluator.evaluate_batch(
+            [results[i]["result_image"] for i in indices],
+            [clothing_descriptions[i] if i < len(clothing_descriptions) else "" for i in indices],
+            category=category, cancel_token=cancel_token
+        )
+        for index, row in zip(indices, table):
+            row["result_index"] = index
+        print(f"批量评估完成，共评估 {len(table)} 个试穿结果")
+        return table
+
     def refine_try_on_result(self, try_on_result: Dict, feedback: str) -> Dict:
         """根据反馈优化虚拟试穿结果"""
         try:
@@ -192,8 +179,12 @@ class VirtualTryOnAgent:
             print(f"批量执行虚拟试穿时出错: {e}")
             return []
 
-    def compare_try_on_results(self, results: List[Dict]) -> Dict:
-        """比较多个虚拟试穿结果"""
+    def compare_try_on_results(self, results: List[Dict], metrics_table: List[Dict] = None) -> Dict:
+        """比较多个虚拟试穿结果
+
+        传入evaluate_try_on_results得到的指标表时按总体评分排序；未传入时按结果中已有的CLIP评分
+        （试穿迭代时计算的校准分数）排序，不发起远程评估。
+        """
         try:
             # 筛选成功的结果
             successful_results = [r for r in results if r.get("success", False)]
@@ -202,34 +193,33 @@ class VirtualTryOnAgent:
                 print(f"比较失败: 没有成功的试穿结果")
                 return {"error": "没有成功的试穿结果"}
 
-            # 计算每个结果的总体评分
-            scored_results = []
-            for result in successful_results:
-                # 获取CLIP评分
-                if "clip_scores" in result and result["clip_scores"]:
-                    clip_scores = result["clip_scores"]
-                    avg_clip_score = sum(clip_scores) / len(clip_scores) if clip_scores else 0
-                else:
-                    avg_clip_score = 0
-
-                scored_results.append({
-                    "result": result,
-                    "score": avg_clip_score
-                })
-
-            # 按评分排序
-            scored_results.sort(key=lambda x: x["score"], reverse=True)
-
-            # 构建比较结果
             comparison = {
                 "total_results": len(results),
-                "successful_results": len(successful_results),
-                "sorted_results": [sr["result"] for sr in scored_results],
-                "best_result": scored_results[0]["result"] if scored_results else None,
-                "worst_result": scored_results[-1]["result"] if scored_results else None
+                "successful_results": len(successful_results)
             }
+            if metrics_table is not None:
+                # 按总体评分排序
+                ranked = sorted(metrics_table, key=lambda row: row["overall_score"], reverse=True)
+                sorted_results = [results[row["result_index"]] for row in ranked]
+                comparison["metrics_table"] = ranked
+            else:
+                # 按平均CLIP评分排序
+                scored_results = []
+                for result in successful_results:
+                    clip_scores = result.get("clip_scores") or []
+                    avg_clip_score = sum(clip_scores) / len(clip_scores) if clip_scores else 0
+                    scored_results.append({"result": result, "score": avg_clip_score})
+                scored_results.sort(key=lambda x: x["score"], reverse=True)
+                sorted_results = [sr["result"] for sr in scored_results]
+
+            # 构建比较结果
+            comparison.update({
+                "sorted_results": sorted_results,
+                "best_result": sorted_results[0] if sorted_results else None,
+                "worst_result": sorted_results[-1] if sorted_results else None
+            })
 
-            print(f"比较虚拟试穿结果完成，成功比较了 {len(successful_results)} 个结果")
+            print(f"比较虚拟试穿结果完成，成功比较了 {len(sorted_results)} 个结果")
             return comparison
         except Exception as e:
             print(f"比较虚拟试穿结果时出错: {e}")
@@ -15,6 +15,7 @@ from utils.flux_vton import run_vton
 from utils.metrics import VQAScore, ClipScore
 from utils.image_process import image_process
 from utils.search import search_clothing_items
+from utils.cancellation import CancellationToken
 from config.config import STATIC_FOLDER, OUTPUT_FOLDER
 
 # 初始化各个Agent
@@ -38,10 +39,28 @@ class PersonalStyleAgentApp:
         
         # 存储用户输入历史
         self.user_input_history = []
+        
+        # 当前进行中的生成/试穿任务的取消令牌
+        self.cancel_token = None
+
+    def _start_new_task(self) -> CancellationToken:
+        """取消上一个进行中的任务，并为新任务创建取消令牌"""
+        self.cancel_current_task("新的任务已开始")
+        self.cancel_token = CancellationToken()
+        return self.cancel_token
+
+    def cancel_current_task(self, reason: str = "") -> None:
+        """取消进行中的生成或试穿任务"""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel(reason)
+            self.cancel_token = None
 
     def analyze_style(self, user_input: str) -> str:
         """分析用户风格需求"""
         try:
+            # 提交新的风格需求时，之前的生成和试穿结果将被丢弃，立即取消
+            self.cancel_current_task("用户提交了新的风格需求")
+            
             # 保存用户输入
             self.user_input_history.append({
                 "type": "style_input",
@@ -97,7 +116,11 @@ class PersonalStyleAgentApp:
 
             # 调用StyleAgent生成服装图像
             print("调用style_agent.generate_clothing_images...")
-            results = style_agent.generate_clothing_images(garment_dict)
+            cancel_token = self._start_new_task()
+            results = style_agent.generate_clothing_images(garment_dict, cancel_token)
+            if cancel_token.cancelled:
+                print("服装生成已取消，丢弃结果")
+                return []
             
             # 检查results的类型
             if not isinstance(results, dict):
@@ -176,11 +199,15 @@ class PersonalStyleAgentApp:
                 return {"error": "找不到选定的服装图像"}
 
             # 调用VirtualTryOnAgent执行虚拟试穿
+            cancel_token = self._start_new_task()
             result = virtual_try_on_agent.try_on_clothing(
                 person_image_path=person_image_path,
                 clothing_image_path=clothing_image_path,
-                clothing_description=self.selected_clothing.get("description", "")
+                clothing_description=self.selected_clothing.get("description", ""),
+                cancel_token=cancel_token
             )
+            if cancel_token.cancelled:
+                return {"error": "虚拟试穿已取消"}
             
             # 如果成功，添加到试穿结果列表
             if result.get("success", False):
@@ -245,6 +272,9 @@ class PersonalStyleAgentApp:
     def reset_session(self) -> tuple:
         """重置会话状态"""
         try:
+            # 立即取消进行中的生成和试穿任务
+            self.cancel_current_task("会话已重置")
+            
             # 保存当前会话历史
             session_history = {
                 "user_input": self.user_input_history,
@@ -0,0 +1,69 @@
+"""
+基准测试：比较逐张CLIP评分与不同批大小的批量评分吞吐量
+
+用法: python benchmarks/benchmark_clip_batch.py [--images static/garments] [--batch-sizes 1,4,8,16,32] [--limit 64]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_common import collect_images
+from utils.metrics import ClipScore
+from config.config import STATIC_FOLDER, OUTPUT_FOLDER
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLIP批量评分基准测试")
+    parser.add_argument("--images", default=os.path.join(STATIC_FOLDER, "garments"), help="测试图像目录")
+    parser.add_argument("--batch-sizes", default="1,4,8,16,32", help="逗号分隔的批大小")
+    parser.add_argument("--limit", type=int, default=64, help="测试图像数量")
+    parser.add_argument("--output", default=os.path.join(OUTPUT_FOLDER, "benchmarks", "clip_batch.json"))
+    args = parser.parse_args()
+
+    clip_scorer = ClipScore()
+    if clip_scorer.model is None:
+        print("CLIP模型未加载，无法运行基准测试")
+        return
+
+    image_paths = collect_images(args.images, args.limit)
+    text = "a photo of a garment"
+    # 预热，排除首次调用的初始化开销
+    clip_scorer.score_batch(image_paths[:2], text)
+
+    start_time = time.perf_counter()
+    sequential_scores = [clip_scorer.score(path, text) for path in image_paths]
+    sequential_time = time.perf_counter() - start_time
+    report = {
+        "num_images": len(image_paths),
+        "device": str(clip_scorer.device),
+        "sequential": {"seconds": sequential_time, "images_per_second": len(image_paths) / sequential_time},
+        "batched": {}
+    }
+    print(f"逐张评分: {report['sequential']['images_per_second']:.1f} 张/秒")
+
+    for batch_size in [int(x) for x in args.batch_sizes.split(",") if x.strip()]:
+        start_time = time.perf_counter()
+        scores = clip_scorer.score_batch(image_paths, text, batch_size=batch_size)
+        elapsed = time.perf_counter() - start_time
+        report["batched"][str(batch_size)] = {
+            "seconds": elapsed,
+            "images_per_second": len(image_paths) / elapsed,
+            "speedup": sequential_time / elapsed,
+            "max_abs_diff": float(np.max(np.abs(np.array(scores) - np.array(sequential_scores))))
+        }
+        print(f"批大小 {batch_size}: {len(image_paths) / elapsed:.1f} 张/秒, 加速 {sequential_time / elapsed:.2f}x")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
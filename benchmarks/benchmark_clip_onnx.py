@@ -0,0 +1,95 @@
+"""
+基准测试：比较CLIP评分的PyTorch后端与ONNX Runtime后端的数值一致性和CPU延迟
+
+用法: python benchmarks/benchmark_clip_onnx.py [--images static/garments] [--limit 32] [--batch-sizes 1,8,16]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_common import collect_images
+from utils.metrics import ClipScore
+from config.config import STATIC_FOLDER, OUTPUT_FOLDER
+
+TEXTS = [
+    "a white cotton t-shirt with a round neck",
+    "a floral summer dress with a high waist",
+    "dark blue straight-leg jeans",
+    "white low-top canvas sneakers"
+]
+# 归一化特征逐元素的最大允许误差
+TOLERANCE = 1e-3
+
+
+def encode_all(clip_scorer: ClipScore, image_paths: list) -> tuple:
+    image_features = np.stack([f.float().cpu().numpy() for f in clip_scorer._encode_images(image_paths)])
+    text_features = clip_scorer._encode_texts(TEXTS).float().cpu().numpy()
+    return image_features, text_features
+
+
+def measure_latency(clip_scorer: ClipScore, image_paths: list, batch_size: int) -> float:
+    """返回每张图像的平均评分耗时（毫秒）"""
+    clip_scorer.score_batch(image_paths[:batch_size], TEXTS[0], batch_size=batch_size)  # 预热
+    start_time = time.perf_counter()
+    clip_scorer.score_batch(image_paths, TEXTS[0], batch_size=batch_size)
+    return (time.perf_counter() - start_time) / len(image_paths) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLIP ONNX Runtime后端基准测试")
+    parser.add_argument("--images", default=os.path.join(STATIC_FOLDER, "garments"), help="测试图像目录")
+    parser.add_argument("--limit", type=int, default=32, help="测试图像数量")
+    parser.add_argument("--batch-sizes", default="1,8,16", help="逗号分隔的批大小")
+    parser.add_argument("--output", default=os.path.join(OUTPUT_FOLDER, "benchmarks", "clip_onnx.json"))
+    args = parser.parse_args()
+
+    torch_scorer = ClipScore(backend="torch")
+    onnx_scorer = ClipScore(backend="onnx")
+    if torch_scorer.model is None or onnx_scorer.onnx_encoder is None:
+        print("CLIP模型或ONNX Runtime后端不可用，无法运行基准测试")
+        return
+    # 关闭特征缓存，保证每次都实际运行模型
+    torch_scorer.embedding_cache = None
+    onnx_scorer.embedding_cache = None
+
+    image_paths = collect_images(args.images, args.limit)
+    torch_images, torch_texts = encode_all(torch_scorer, image_paths)
+    onnx_images, onnx_texts = encode_all(onnx_scorer, image_paths)
+    max_diff = float(max(np.abs(torch_images - onnx_images).max(), np.abs(torch_texts - onnx_texts).max()))
+    similarity_diff = float(np.abs(torch_images @ torch_texts.T - onnx_images @ onnx_texts.T).max())
+
+    report = {
+        "num_images": len(image_paths),
+        "max_feature_diff": max_diff,
+        "max_similarity_diff": similarity_diff,
+        "equivalent": max_diff <= TOLERANCE,
+        "latency_ms_per_image": {}
+    }
+    print(f"特征最大误差: {max_diff:.2e}, 相似度最大误差: {similarity_diff:.2e}, "
+          f"{'在' if report['equivalent'] else '超出'}容差 {TOLERANCE} 内")
+
+    for batch_size in [int(x) for x in args.batch_sizes.split(",") if x.strip()]:
+        torch_latency = measure_latency(torch_scorer, image_paths, batch_size)
+        onnx_latency = measure_latency(onnx_scorer, image_paths, batch_size)
+        report["latency_ms_per_image"][str(batch_size)] = {
+            "torch": torch_latency,
+            "onnx": onnx_latency,
+            "speedup": torch_latency / onnx_latency if onnx_latency else 0.0
+        }
+        print(f"批大小 {batch_size}: torch {torch_latency:.1f} ms/张, onnx {onnx_latency:.1f} ms/张, "
+              f"加速 {torch_latency / onnx_latency:.2f}x")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
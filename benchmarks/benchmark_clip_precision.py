@@ -0,0 +1,110 @@
+"""
+精度检查：在固定的图像/文本集合上比较bf16和动态int8量化的CLIP模型与fp32的排序一致性、延迟和模型大小
+
+对每条文本按相似度对图像排序，报告与fp32排序的Spearman相关系数和top-1一致率。
+
+用法: python benchmarks/benchmark_clip_precision.py [--images static/garments] [--limit 32]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import torch
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_common import collect_images
+from utils.metrics import ClipScore
+from config.config import STATIC_FOLDER, OUTPUT_FOLDER
+
+TEXTS = [
+    "a white cotton t-shirt with a round neck",
+    "a floral summer dress with a high waist",
+    "dark blue straight-leg jeans",
+    "white low-top canvas sneakers",
+    "a black leather belt",
+    "a red wool scarf"
+]
+MODES = ("fp32", "bf16", "int8")
+
+
+def similarity_matrix(clip_scorer: ClipScore, image_paths: list) -> np.ndarray:
+    """返回图像×文本的余弦相似度矩阵"""
+    image_features = np.stack([f.float().cpu().numpy() for f in clip_scorer._encode_images(image_paths)])
+    text_features = clip_scorer._encode_texts(TEXTS).float().cpu().numpy()
+    return image_features @ text_features.T
+
+
+def spearman(a: np.ndarray, b: np.ndarray) -> float:
+    """Spearman秩相关系数（相似度为连续值，不考虑并列）"""
+    rank_a = np.argsort(np.argsort(a)).astype(np.float64)
+    rank_b = np.argsort(np.argsort(b)).astype(np.float64)
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+def model_size_mb(clip_scorer: ClipScore) -> float:
+    """估算模型参数和缓冲区（含量化权重）的大小"""
+    state = clip_scorer.model.state_dict()
+    total = 0
+    for value in state.values():
+        if isinstance(value, torch.Tensor):
+            total += value.numel() * value.element_size()
+        elif isinstance(value, tuple):
+            total += sum(v.numel() * v.element_size() for v in value if isinstance(v, torch.Tensor))
+    return total / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLIP精度模式排序一致性检查")
+    parser.add_argument("--images", default=os.path.join(STATIC_FOLDER, "garments"), help="测试图像目录")
+    parser.add_argument("--limit", type=int, default=32, help="测试图像数量")
+    parser.add_argument("--output", default=os.path.join(OUTPUT_FOLDER, "benchmarks", "clip_precision.json"))
+    args = parser.parse_args()
+
+    image_paths = collect_images(args.images, args.limit)
+    results = {}
+    reference = None
+    for mode in MODES:
+        clip_scorer = ClipScore(backend="torch", precision=mode)
+        if clip_scorer.model is None:
+            print("CLIP模型未加载，无法运行精度检查")
+            return
+        if clip_scorer.precision != mode:
+            print(f"{mode} 模式不可用，跳过")
+            continue
+        # 关闭特征缓存，保证每种精度都实际运行模型
+        clip_scorer.embedding_cache = None
+
+        similarity_matrix(clip_scorer, image_paths[:2])  # 预热
+        start_time = time.perf_counter()
+        similarities = similarity_matrix(clip_scorer, image_paths)
+        elapsed = time.perf_counter() - start_time
+        if reference is None:
+            reference = similarities
+
+        correlations = [spearman(reference[:, t], similarities[:, t]) for t in range(len(TEXTS))]
+        top1 = [int(np.argmax(reference[:, t]) == np.argmax(similarities[:, t])) for t in range(len(TEXTS))]
+        results[mode] = {
+            "spearman_mean": float(np.mean(correlations)),
+            "spearman_min": float(np.min(correlations)),
+            "top1_agreement": float(np.mean(top1)),
+            "max_similarity_diff": float(np.abs(reference - similarities).max()),
+            "ms_per_image": elapsed / len(image_paths) * 1000,
+            "model_size_mb": model_size_mb(clip_scorer)
+        }
+        print(f"{mode}: Spearman {results[mode]['spearman_mean']:.4f} (最低 {results[mode]['spearman_min']:.4f}), "
+              f"top-1一致率 {results[mode]['top1_agreement']:.0%}, {results[mode]['ms_per_image']:.1f} ms/张, "
+              f"模型 {results[mode]['model_size_mb']:.0f} MB")
+
+    report = {"num_images": len(image_paths), "texts": TEXTS, "modes": results}
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
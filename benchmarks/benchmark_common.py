@@ -0,0 +1,91 @@
+"""
+基准测试共用的测试用例和辅助函数
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from PIL import Image
+from contextlib import contextmanager
+from typing import Dict, List
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+# 固定的服装生成测试用例，覆盖常见类别
+BENCHMARK_CASES = [
+    {"category": "upper_body", "prompt": "简约风格的白色T恤，棉质面料，圆领设计，短袖款式"},
+    {"category": "dresses", "prompt": "夏季碎花连衣裙，轻盈面料，高腰设计，A字裙摆"},
+    {"category": "lower_body", "prompt": "深蓝色直筒牛仔裤，中腰设计，经典五袋款式"},
+    {"category": "shoes", "prompt": "白色低帮帆布鞋，圆头设计，橡胶鞋底"},
+]
+
+
+def collect_images(image_dir: str, limit: int, synthesize: bool = True) -> List[str]:
+    """收集目录下的测试图像，synthesize为True且数量不足时生成随机图像补齐"""
+    image_paths = []
+    for root, _, files in os.walk(image_dir):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                image_paths.append(os.path.join(root, name))
+    image_paths = image_paths[:limit]
+
+    if synthesize and len(image_paths) < limit:
+        synthetic_dir = tempfile.mkdtemp(prefix="benchmark_images_")
+        rng = np.random.default_rng(0)
+        for i in range(limit - len(image_paths)):
+            path = os.path.join(synthetic_dir, f"synthetic_{i}.png")
+            Image.fromarray(rng.integers(0, 256, (768, 512, 3), dtype=np.uint8)).save(path)
+            image_paths.append(path)
+    return image_paths
+
+
+@contextmanager
+def isolated_garment_generation(generator):
+    """运行期间关闭服装生成的持久化副作用，结束后恢复
+
+    不写入服装库、VQA分数存储和尝试记录，评分级联的分数对记录写入临时文件，
+    避免基准测试的运行污染线上数据（分数存储命中还会使各组测试的评分次数不可比）。
+    """
+    import utils.metrics as metrics
+    import utils.garment_library as garment_library
+    import utils.model_based_text2garment as model_based_text2garment
+
+    cascade = generator.scoring_cascade
+    saved = (metrics.vqa_score_store, garment_library.garment_library_instance,
+             model_based_text2garment.attempt_log_instance, cascade.log_path)
+    work_dir = tempfile.mkdtemp(prefix="garment_benchmark_")
+    metrics.vqa_score_store = None
+    garment_library.garment_library_instance = None
+    model_based_text2garment.attempt_log_instance = None
+    cascade.log_path = os.path.join(work_dir, "score_pairs.jsonl")
+    try:
+        yield work_dir
+    finally:
+        (metrics.vqa_score_store, garment_library.garment_library_instance,
+         model_based_text2garment.attempt_log_instance, cascade.log_path) = saved
+
+
+def run_garment_cases(generator, label: str, repeats: int, max_iterations: int, output_root: str,
+                      **produce_kwargs) -> List[Dict]:
+    """以相同参数对每个测试用例重复运行produce_garment，返回每次运行的用例、统计信息和耗时"""
+    runs = []
+    with isolated_garment_generation(generator):
+        for case_index, case in enumerate(BENCHMARK_CASES):
+            for repeat in range(repeats):
+                output_dir = os.path.join(output_root, label, f"case_{case_index}_{repeat}")
+                stats = {}
+                start_time = time.perf_counter()
+                generator.produce_garment(case["prompt"], case["category"], output_dir,
+                                          max_iterations=max_iterations, stats=stats, **produce_kwargs)
+                runs.append({
+                    "case_index": case_index,
+                    "repeat": repeat,
+                    "category": case["category"],
+                    "stats": stats,
+                    "elapsed": time.perf_counter() - start_time
+                })
+    return runs
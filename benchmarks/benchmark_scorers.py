@@ -0,0 +1,166 @@
+"""
+评分器基准测试：在生成的图像集上测量VQAScore和ClipScore的吞吐量、p50/p95/p99延迟和并发扩展性
+
+VQAScore请求发往本地启动的OpenAI兼容桩服务（见fake_vision_server.py），可配置延迟和错误率，
+测试期间不使用持久化分数存储、客户端限流和远程服务熔断器（否则错误率较高时熔断后的请求不再到达桩服务，
+且熔断探测会访问真实的BASE_URL），结果以JSON格式写入输出文件。
+
+用法: python benchmarks/benchmark_scorers.py [--images 64] [--concurrency 1,2,4,8] [--latency 0.3] [--error-rate 0.05]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from openai import OpenAI
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_vision_server import FakeVisionServer
+import utils.metrics as metrics
+from utils.metrics import VQAScore, ClipScore, is_fallback_score
+from utils.rate_limit import TokenBucket
+from utils.circuit_breaker import remote_api_breaker
+from config.config import OUTPUT_FOLDER
+
+DESCRIPTION = "简约风格的白色T恤，棉质面料，圆领设计，短袖款式"
+CLIP_TEXT = "a white cotton t-shirt with a round neck"
+
+
+def generate_corpus(num_images: int, width: int = 768, height: int = 1024) -> list:
+    """生成随机图像集，尺寸与服装生成结果一致"""
+    corpus_dir = tempfile.mkdtemp(prefix="scorer_benchmark_")
+    rng = np.random.default_rng(0)
+    image_paths = []
+    for i in range(num_images):
+        # 低频随机色块，编码大小更接近真实照片
+        blocks = rng.integers(0, 256, (height // 32, width // 32, 3), dtype=np.uint8)
+        image = Image.fromarray(blocks).resize((width, height), Image.BILINEAR)
+        path = os.path.join(corpus_dir, f"image_{i}.png")
+        image.save(path)
+        image_paths.append(path)
+    return image_paths
+
+
+def summarize(latencies: list, wall_time: float, num_items: int) -> dict:
+    """计算吞吐量和延迟分位数（毫秒）"""
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "items": num_items,
+        "wall_seconds": wall_time,
+        "throughput_per_second": num_items / wall_time if wall_time else 0.0,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "mean_ms": float(latencies_ms.mean())
+    }
+
+
+def run_concurrent(fn, items: list, concurrency: int) -> tuple:
+    """以指定并发度对每个输入调用fn，返回（每次调用耗时，结果，总耗时）"""
+    def timed(item):
+        start_time = time.perf_counter()
+        result = fn(item)
+        return time.perf_counter() - start_time, result
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outputs = list(executor.map(timed, items))
+    wall_time = time.perf_counter() - start_time
+    return [latency for latency, _ in outputs], [result for _, result in outputs], wall_time
+
+
+def benchmark_vqa(image_paths: list, levels: list, server: FakeVisionServer, max_retries: int) -> dict:
+    vqa_scorer = VQAScore()
+    vqa_scorer.client = OpenAI(api_key="fake", base_url=server.base_url, max_retries=max_retries)
+    results = {}
+    for concurrency in levels:
+        latencies, scores, wall_time = run_concurrent(
+            lambda path: vqa_scorer.score(path, DESCRIPTION), image_paths, concurrency)
+        summary = summarize(latencies, wall_time, len(image_paths))
+        # 请求失败时改用本地备选评分；桩服务返回的分数保留两位小数，恰好为0.5的分数来自响应解析失败
+        summary["fallback_scores"] = sum(1 for score in scores if is_fallback_score(score))
+        summary["default_scores"] = sum(1 for score in scores if not is_fallback_score(score) and score == 0.5)
+        results[str(concurrency)] = summary
+        print(f"VQA 并发 {concurrency}: {summary['throughput_per_second']:.1f} 张/秒, "
+              f"p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms, p99 {summary['p99_ms']:.0f} ms")
+    return results
+
+
+def benchmark_clip(image_paths: list, levels: list, batch_sizes: list) -> dict:
+    clip_scorer = ClipScore()
+    if clip_scorer.model is None:
+        print("CLIP模型未加载，跳过ClipScore基准测试")
+        return {}
+    # 关闭特征缓存，保证每次都实际运行模型
+    clip_scorer.embedding_cache = None
+    clip_scorer.score(image_paths[0], CLIP_TEXT)  # 预热
+
+    results = {"single_call": {}, "batched": {}}
+    for concurrency in levels:
+        latencies, _, wall_time = run_concurrent(
+            lambda path: clip_scorer.score(path, CLIP_TEXT), image_paths, concurrency)
+        summary = summarize(latencies, wall_time, len(image_paths))
+        results["single_call"][str(concurrency)] = summary
+        print(f"CLIP 并发 {concurrency}: {summary['throughput_per_second']:.1f} 张/秒, "
+              f"p50 {summary['p50_ms']:.0f} ms, p99 {summary['p99_ms']:.0f} ms")
+
+    for batch_size in batch_sizes:
+        batches = [image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)]
+        latencies, _, wall_time = run_concurrent(
+            lambda batch: clip_scorer.score_batch(batch, CLIP_TEXT, batch_size=batch_size), batches, 1)
+        summary = summarize(latencies, wall_time, len(image_paths))
+        results["batched"][str(batch_size)] = summary
+        print(f"CLIP 批大小 {batch_size}: {summary['throughput_per_second']:.1f} 张/秒, "
+              f"每批 p50 {summary['p50_ms']:.0f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VQAScore和ClipScore基准测试")
+    parser.add_argument("--images", type=int, default=64, help="生成的测试图像数量")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="逗号分隔的并发度")
+    parser.add_argument("--batch-sizes", default="1,8,16,32", help="CLIP批量评分的批大小")
+    parser.add_argument("--latency", type=float, default=0.3, help="桩服务平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="桩服务延迟波动（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="桩服务错误率")
+    parser.add_argument("--max-retries", type=int, default=0, help="OpenAI客户端的重试次数")
+    parser.add_argument("--skip-clip", action="store_true", help="只测试VQAScore")
+    parser.add_argument("--output", default=os.path.join(OUTPUT_FOLDER, "benchmarks", "scorers.json"))
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    batch_sizes = [int(x) for x in args.batch_sizes.split(",") if x.strip()]
+
+    # 测试期间不使用持久化分数存储、限流和熔断器，测量评分器本身的开销
+    metrics.vqa_score_store = None
+    metrics.vqa_rate_limiter = TokenBucket(0)
+    remote_api_breaker.enabled = False
+    remote_api_breaker.probe = None
+
+    image_paths = generate_corpus(args.images)
+    server = FakeVisionServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate).start()
+    try:
+        report = {
+            "config": vars(args),
+            "vqa": benchmark_vqa(image_paths, levels, server, args.max_retries),
+            "server": {"requests": server.requests, "errors": server.errors}
+        }
+    finally:
+        server.stop()
+    if not args.skip_clip:
+        report["clip"] = benchmark_clip(image_paths, levels, batch_sizes)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
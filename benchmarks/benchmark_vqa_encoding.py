@@ -0,0 +1,76 @@
+"""
+基准测试：比较上传原始图像与缩小重编码后的VQA请求字节数、端到端耗时和分数差异
+
+用法: python benchmarks/benchmark_vqa_encoding.py [--images static/garments] [--limit 20]
+"""
+import os
+import sys
+import json
+import argparse
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_common import collect_images
+import utils.metrics as metrics
+from utils.metrics import VQAScore
+from utils.rate_limit import TokenBucket
+from utils.circuit_breaker import remote_api_breaker
+from config.config import STATIC_FOLDER, OUTPUT_FOLDER
+
+DESCRIPTION = "简约风格的白色T恤，棉质面料，圆领设计，短袖款式"
+
+
+def run_mode(compact: bool, image_paths: list) -> dict:
+    """在指定编码方式下对全部图像评分"""
+    vqa_scorer = VQAScore()
+    vqa_scorer.image_encoder.compact = compact
+    scores = [vqa_scorer.score(path, DESCRIPTION) for path in image_paths]
+    stats = vqa_scorer.get_stats()
+    return {
+        "scores": scores,
+        "avg_raw_bytes": stats["avg_raw_bytes"],
+        "avg_request_bytes": stats["avg_request_bytes"],
+        "avg_latency": stats["avg_latency"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VQA图像编码基准测试")
+    parser.add_argument("--images", default=os.path.join(STATIC_FOLDER, "garments"), help="测试图像目录")
+    parser.add_argument("--limit", type=int, default=20, help="测试图像数量")
+    parser.add_argument("--output", default=os.path.join(OUTPUT_FOLDER, "benchmarks", "vqa_encoding.json"))
+    args = parser.parse_args()
+
+    image_paths = collect_images(args.images, args.limit, synthesize=False)
+    if not image_paths:
+        print(f"目录中没有测试图像: {args.images}")
+        return
+
+    # 测试期间不使用持久化分数存储、限流和熔断器：否则raw模式写入的分数会让compact模式全部命中存储、不发出请求
+    metrics.vqa_score_store = None
+    metrics.vqa_rate_limiter = TokenBucket(0)
+    remote_api_breaker.enabled = False
+    remote_api_breaker.probe = None
+
+    report = {
+        "num_images": len(image_paths),
+        "raw": run_mode(False, image_paths),
+        "compact": run_mode(True, image_paths)
+    }
+    diffs = [abs(a - b) for a, b in zip(report["raw"]["scores"], report["compact"]["scores"])]
+    report["mean_abs_score_diff"] = sum(diffs) / len(diffs)
+
+    for mode in ("raw", "compact"):
+        summary = report[mode]
+        print(f"{mode}: 平均请求 {summary['avg_request_bytes'] / 1024:.1f} KB, 平均耗时 {summary['avg_latency']:.2f} 秒")
+    print(f"平均分数差异: {report['mean_abs_score_diff']:.3f}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+本地OpenAI兼容的视觉模型桩服务，用于在无网络、无配额消耗的情况下测试评分器的吞吐量和延迟
+
+支持 POST /v1/chat/completions：按配置的延迟和错误率响应，单图请求返回一个0-1的分数，
+多图请求（消息中包含多个image_url）返回 {"scores": [...]} 格式的JSON。
+
+单独运行: python benchmarks/fake_vision_server.py [--port 8765] [--latency 0.5] [--jitter 0.2] [--error-rate 0.05]
+"""
+import json
+import time
+import math
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeVisionServer:
+    """在后台线程中运行的桩服务"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.5,
+                 jitter: float = 0.2, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                # 不输出每个请求的访问日志
+                pass
+
+            def _send_json(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": {"message": "invalid json"}})
+                    return
+                server.requests += 1
+
+                # 模拟推理延迟：均匀分布在 latency ± jitter 之间
+                delay = max(0.0, server.latency + (server._random() * 2 - 1) * server.jitter)
+                time.sleep(delay)
+
+                if server._random() < server.error_rate:
+                    server.errors += 1
+                    self._send_json(500, {"error": {"message": "simulated server error", "type": "server_error"}})
+                    return
+
+                self._send_json(200, server.build_response(request))
+
+        return Handler
+
+    def build_response(self, request: dict) -> dict:
+        """根据请求中图像的数量构建chat completion响应"""
+        num_images = 0
+        for message in request.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, list):
+                num_images += sum(1 for part in content if part.get("type") == "image_url")
+
+        logprobs = None
+        if num_images > 1:
+            content = json.dumps({"scores": [round(self._random(), 2) for _ in range(num_images)]})
+        elif request.get("max_tokens") == 1:
+            # 单数字评分模式：输出一个0-9的数字，请求logprobs时附带各数字的对数概率
+            digit = min(9, int(self._random() * 10))
+            content = str(digit)
+            if request.get("logprobs"):
+                weights = [math.exp(-abs(d - digit)) for d in range(10)]
+                total = sum(weights)
+                top_logprobs = [{"token": str(d), "logprob": math.log(w / total), "bytes": None}
+                                for d, w in sorted(enumerate(weights), key=lambda x: -x[1])]
+                top_logprobs = top_logprobs[:request.get("top_logprobs", 10)]
+                logprobs = {"content": [{"token": content, "logprob": top_logprobs[0]["logprob"],
+                                         "bytes": None, "top_logprobs": top_logprobs}]}
+        else:
+            content = f"{self._random():.2f}"
+
+        return {
+            "id": f"chatcmpl-fake-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake-vision"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "logprobs": logprobs,
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 1, "total_tokens": 1}
+        }
+
+    def start(self) -> "FakeVisionServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake_vision_server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地视觉模型桩服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="平均响应延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.2, help="延迟的随机波动范围（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回HTTP 500的概率")
+    args = parser.parse_args()
+
+    server = FakeVisionServer(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    print(f"桩服务已启动: {server.base_url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
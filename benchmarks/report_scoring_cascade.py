@@ -0,0 +1,99 @@
+"""
+评分级联报告：根据记录的CLIP/VQA分数对重新校准各类别的CLIP初筛阈值，
+并统计节省的VQA调用比例以及初筛对最终筛选（前3张VQA分数）的影响
+
+用法: python benchmarks/report_scoring_cascade.py [--target-recall 0.95] [--write]
+"""
+import os
+import sys
+import json
+import argparse
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.scoring_cascade import calibrate_cutoffs, load_score_pairs
+from config.config import OUTPUT_FOLDER, SCORING_CASCADE_LOG, SCORING_CASCADE_CALIBRATION
+from config.config import SCORING_CASCADE_MIN_SAMPLES, GARMENT_VQA_LOW_THRESHOLD
+
+
+def top3_mean(scores: list) -> float:
+    top = sorted(scores, reverse=True)[:3]
+    return sum(top) / len(top) if top else 0.0
+
+
+def selection_impact(records: list, calibration: dict) -> dict:
+    """对完整记录了VQA分数的运行，比较初筛前后前3张图像的平均VQA分数"""
+    runs = {}
+    for record in records:
+        runs.setdefault(record["run_id"], []).append(record)
+
+    per_category = {}
+    for run_records in runs.values():
+        # on模式下被拒候选没有VQA分数，这样的运行无法比较
+        if any(r.get("vqa_score") is None for r in run_records):
+            continue
+        category = run_records[0]["category"]
+        cutoff = calibration.get(category, {}).get("cutoff")
+        if cutoff is None:
+            continue
+        all_scores = [r["vqa_score"] for r in run_records]
+        kept_scores = [r["vqa_score"] for r in run_records if r["clip_score"] >= cutoff]
+        entry = per_category.setdefault(category, {"runs": 0, "top3_delta": 0.0, "top3_changed": 0})
+        entry["runs"] += 1
+        entry["top3_delta"] += top3_mean(kept_scores) - top3_mean(all_scores)
+        entry["top3_changed"] += int(sorted(all_scores, reverse=True)[:3] != sorted(kept_scores, reverse=True)[:3])
+
+    for entry in per_category.values():
+        entry["avg_top3_delta"] = entry.pop("top3_delta") / entry["runs"]
+        entry["top3_changed_rate"] = entry.pop("top3_changed") / entry["runs"]
+    return per_category
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评分级联校准与报告")
+    parser.add_argument("--log", default=SCORING_CASCADE_LOG, help="CLIP/VQA分数对记录文件")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="要求保留的VQA合格候选比例")
+    parser.add_argument("--min-samples", type=int, default=SCORING_CASCADE_MIN_SAMPLES, help="每个类别最少合格样本数")
+    parser.add_argument("--write", action="store_true", help="将校准结果写入SCORING_CASCADE_CALIBRATION")
+    parser.add_argument("--output", default=os.path.join(OUTPUT_FOLDER, "benchmarks", "scoring_cascade.json"))
+    args = parser.parse_args()
+
+    records = load_score_pairs(args.log)
+    if not records:
+        print(f"没有分数对记录: {args.log}，请先以shadow模式运行一段时间")
+        return
+
+    calibration = calibrate_cutoffs(records, args.target_recall, args.min_samples)
+
+    # on模式下实际被拒绝（未调用VQA）的候选数量
+    live_rejected = sum(1 for r in records if r.get("mode") == "on" and r.get("vqa_score") is None)
+    report = {
+        "records": len(records),
+        "live_vqa_calls_saved": live_rejected,
+        "calibration": calibration,
+        "selection_impact": selection_impact(records, calibration)
+    }
+
+    for category, entry in calibration.items():
+        low_threshold = GARMENT_VQA_LOW_THRESHOLD.get(category, 0.65)
+        impact = report["selection_impact"].get(category, {})
+        print(f"{category}: 阈值 {entry['cutoff']:.3f} (VQA合格线 {low_threshold}), "
+              f"预计节省VQA调用 {entry['expected_reject_rate']:.0%}, "
+              f"前3平均分变化 {impact.get('avg_top3_delta', 0.0):+.3f}, "
+              f"前3变化比例 {impact.get('top3_changed_rate', 0.0):.0%}")
+    print(f"on模式下实际节省VQA调用: {live_rejected} 次")
+
+    if args.write:
+        with open(SCORING_CASCADE_CALIBRATION, "w", encoding="utf-8") as f:
+            json.dump(calibration, f, ensure_ascii=False, indent=2)
+        print(f"校准结果已写入: {SCORING_CASCADE_CALIBRATION}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"报告已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+阈值调优：回放记录的每次尝试分数，为各类别推荐提前结束迭代的高评分阈值
+
+在合格率（最终结果的分数不低于类别低评分阈值的运行比例）不低于目标值的前提下，
+选择平均生成次数最少的阈值，并输出可直接应用到config/config.py的diff。
+
+用法: python benchmarks/tune_thresholds.py [--target-acceptance 0.9] [--stage garment|vton|all]
+应用: git apply static/outputs/benchmarks/thresholds.diff
+"""
+import os
+import sys
+import json
+import argparse
+
+# 添加项目根目录到Python路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from utils.attempt_log import load_attempt_runs
+from utils.threshold_tuning import STAGES, tune_stage, config_diff
+from config.config import OUTPUT_FOLDER, ATTEMPT_LOG_PATH, THRESHOLD_TUNING_TARGET_ACCEPTANCE, THRESHOLD_TUNING_MIN_RUNS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按记录的尝试分数调优各类别阈值")
+    parser.add_argument("--log", default=ATTEMPT_LOG_PATH, help="尝试记录文件")
+    parser.add_argument("--stage", default="all", choices=["all", *STAGES.keys()])
+    parser.add_argument("--target-acceptance", type=float, default=THRESHOLD_TUNING_TARGET_ACCEPTANCE,
+                        help="要求的合格率")
+    parser.add_argument("--min-runs", type=int, default=THRESHOLD_TUNING_MIN_RUNS, help="每个类别最少运行数")
+    parser.add_argument("--output-dir", default=os.path.join(OUTPUT_FOLDER, "benchmarks"))
+    args = parser.parse_args()
+
+    runs = load_attempt_runs(args.log)
+    if not runs:
+        print(f"没有尝试记录: {args.log}，请先启用ATTEMPT_LOG_ENABLED运行一段时间")
+        return
+
+    stages = list(STAGES) if args.stage == "all" else [args.stage]
+    report = {}
+    updates = {}
+    for stage in stages:
+        recommendations = tune_stage(runs, stage, args.target_acceptance, args.min_runs)
+        report[stage] = recommendations
+        config_name = STAGES[stage]["config_name"]
+        print(f"[{stage}] {config_name}")
+        if not recommendations:
+            print(f"  没有运行数达到 {args.min_runs} 的类别")
+        for category, entry in sorted(recommendations.items()):
+            flag = "" if entry["target_met"] else "（未达到目标合格率）"
+            print(f"  {category}: {entry['current']:.2f} -> {entry['recommended']:.2f}, "
+                  f"平均生成次数 {entry['current_expected_generations']:.1f} -> {entry['expected_generations']:.1f}, "
+                  f"合格率 {entry['current_acceptance_rate']:.0%} -> {entry['acceptance_rate']:.0%}, "
+                  f"截断回放 {entry['censored_rate']:.0%}, 运行数 {entry['runs']}{flag}")
+            if round(entry["recommended"], 2) != round(entry["current"], 2):
+                updates.setdefault(config_name, {})[category] = entry["recommended"]
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    report_path = os.path.join(args.output_dir, "thresholds.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"报告已保存到: {report_path}")
+
+    diff = config_diff(os.path.join(PROJECT_ROOT, "config", "config.py"), updates, label="config/config.py")
+    if not diff:
+        print("推荐阈值与当前配置一致，无需修改")
+        return
+    diff_path = os.path.join(args.output_dir, "thresholds.diff")
+    with open(diff_path, "w", encoding="utf-8") as f:
+        f.write(diff)
+    print(diff)
+    print(f"配置diff已保存到: {diff_path}")
+
+
+if __name__ == "__main__":
+    main()
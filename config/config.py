@@ -32,6 +32,11 @@ VTON_GUIDANCE_SCALE = 2.5
 VTON_WIDTH = 768
 VTON_HEIGHT = 1024
 VTON_NUM_IMAGES = 3
+VTON_MAX_PARALLEL_GARMENTS = 3  # 单次请求中同时进行试穿的服装数量上限，管道并发另受GENERATION_PIPELINE_SLOTS限制
+# 试穿结果批量评估：总体评分为VQA分数与CLIP分数的加权和（映射到0-10分），未检测到人体时乘以惩罚系数
+TRY_ON_EVAL_VQA_WEIGHT = 0.6
+TRY_ON_EVAL_CLIP_WEIGHT = 0.4
+TRY_ON_EVAL_NO_HUMAN_PENALTY = 0.5
 
 # 评分阈值配置
 GARMENT_VQA_HIGH_THRESHOLD = {
@@ -56,32 +61,201 @@ GARMENT_VQA_LOW_THRESHOLD = {
     "scarf": 0.6
 }
 
+# 试穿CLIP分数阈值，对应CLIP_SCORE_MODE="single"的尺度（余弦相似度按CLIP_SIMILARITY_RANGE映射到0-1），
+# 如0.7对应余弦相似度0.29；配件在图像中占比小，相似度普遍偏低，阈值相应放宽
 VTON_CLIP_SCORE_HIGH_THRESHOLD = {
-    "upper_body": 0.8,
-    "lower_body": 0.8,
-    "dresses": 0.85,
-    "shoes": 0.75,
-    "hat": 0.75,
-    "glasses": 0.75,
-    "belt": 0.75,
-    "scarf": 0.75
-}
-
-VTON_CLIP_SCORE_LOW_THRESHOLD = {
     "upper_body": 0.7,
     "lower_body": 0.7,
     "dresses": 0.75,
-    "shoes": 0.65,
-    "hat": 0.65,
-    "glasses": 0.65,
-    "belt": 0.65,
-    "scarf": 0.65
+    "shoes": 0.6,
+    "hat": 0.6,
+    "glasses": 0.6,
+    "belt": 0.6,
+    "scarf": 0.6
+}
+
+VTON_CLIP_SCORE_LOW_THRESHOLD = {
+    "upper_body": 0.55,
+    "lower_body": 0.55,
+    "dresses": 0.6,
+    "shoes": 0.45,
+    "hat": 0.45,
+    "glasses": 0.45,
+    "belt": 0.45,
+    "scarf": 0.45
 }
 
 # 迭代次数配置
 MAX_TEXT2GARMENT_ITERATIONS = 3
 MAX_FLUX_VTON_ITERATIONS = 3
 
+# 阈值调优配置
+# 启用后逐条记录服装生成和虚拟试穿每个候选的分数以及每次运行的结果，
+# 由benchmarks/tune_thresholds.py离线回放，推荐各类别的高评分阈值并输出配置diff
+ATTEMPT_LOG_ENABLED = True
+ATTEMPT_LOG_PATH = os.path.join(OUTPUT_FOLDER, "attempts.jsonl")
+THRESHOLD_TUNING_TARGET_ACCEPTANCE = 0.9  # 要求的合格率：最终结果的分数不低于类别低评分阈值的运行比例
+THRESHOLD_TUNING_MIN_RUNS = 20  # 每个类别最少运行数，不足时不推荐阈值
+
+# 服装预览筛选配置
+# 启用后先用轻量VAE解码低成本预览图并在本地用CLIP打分，只有top-k候选才进行完整VAE解码和远程VQA评分
+GARMENT_PREVIEW_ENABLED = False
+GARMENT_PREVIEW_VAE = "madebyollin/taef1"  # 与FLUX.1 latent空间兼容的轻量解码器
+GARMENT_PREVIEW_TOP_K = 2  # 每轮迭代进入完整解码和VQA评分的候选数量
+
+# 服装生成后端配置
+# 可选后端: flux（FLUX.1-schnell，GPU，质量最高）、sd_turbo（SD-Turbo单步蒸馏模型，适合CPU交互使用）
+# 后端选择优先级: 请求中的backend字段 > GARMENT_BACKEND_BY_CATEGORY > GARMENT_BACKEND_DEFAULT
+GARMENT_BACKEND_DEFAULT = "flux"
+GARMENT_BACKEND_BY_CATEGORY = {
+    # "shoes": "sd_turbo",
+}
+GENERATION_PIPELINE_SLOTS = 1  # 每个生成后端允许同时运行的任务数量
+
+# 服装来源配置
+# model: 模型生成；retrieval: DDG网络检索；hedged: 两者并发竞速，采用最先得到足够高分图像的来源
+GARMENT_SOURCE_MODE = "model"
+HEDGED_MIN_ACCEPTABLE_GARMENTS = 3  # 达到类别高评分阈值的图像数量要求
+HEDGED_TIMEOUT = 600  # 竞速模式的最长等待时间（秒）
+
+# 服装库配置
+# 启用后所有生成或检索的服装图像连同CLIP特征和VQA分数写入持久化服装库，
+# 新请求先按提示词特征相似度查询服装库，再用提示词与库中图像的CLIP相似度校验，命中足够数量时直接返回已有服装
+# 提示词相似度阈值需要按实际数据校准后再启用
+GARMENT_LIBRARY_ENABLED = False
+GARMENT_LIBRARY_MIN_HITS = 3  # 命中数量达到该值时跳过生成
+GARMENT_LIBRARY_SIMILARITY_THRESHOLD = {
+    "upper_body": 0.92,
+    "lower_body": 0.92,
+    "dresses": 0.93,
+    "shoes": 0.9,
+    "hat": 0.9,
+    "glasses": 0.9,
+    "belt": 0.9,
+    "scarf": 0.9
+}
+# 命中记录的提示词与库中图像的CLIP余弦相似度下限，低于该值的记录视为图文不符，不予复用
+GARMENT_LIBRARY_IMAGE_SIMILARITY_THRESHOLD = {
+    "upper_body": 0.25,
+    "lower_body": 0.25,
+    "dresses": 0.25,
+    "shoes": 0.24,
+    "hat": 0.24,
+    "glasses": 0.24,
+    "belt": 0.24,
+    "scarf": 0.24
+}
+
+# 服装生成种子搜索配置
+# random: 每次迭代独立随机采样；guided: 保留高分候选的种子和初始噪声，在后续迭代中围绕其局部扰动采样
+GARMENT_SEARCH_STRATEGY = "random"
+GARMENT_SEARCH_ELITE_SIZE = 2  # 保留的高分候选数量
+GARMENT_SEARCH_NOISE_STRENGTH = 0.35  # 扰动强度，0表示完全复用原噪声，1表示完全重新采样
+
+# 服装最终筛选配置
+# 启用后按最大边际相关性（MMR）在VQA分数和CLIP图像特征差异之间权衡选出最终的3张服装，
+# 并丢弃与已选服装过于相似的近重复图像，避免后续试穿在几乎相同的服装上重复计算
+GARMENT_DIVERSITY_ENABLED = True
+GARMENT_MMR_LAMBDA = 0.7  # 分数权重，1表示只按分数排序
+GARMENT_NEAR_DUPLICATE_THRESHOLD = 0.95  # CLIP图像特征余弦相似度达到该值视为近重复
+
+# CLIP评分配置
+CLIP_BATCH_SIZE = 16  # 每次前向计算的图像数量
+CLIP_PREPROCESS_WORKERS = 4  # 并行解码和预处理图像的线程数
+# CLIP推理后端：torch或onnx（ONNX Runtime，仅CPU，需要安装onnxruntime），onnx首次使用时自动导出模型
+CLIP_BACKEND = "torch"
+# 导出目录不放在模型目录内，否则导出文件会改变模型指纹，导致每次启动都重新导出并清除特征缓存
+CLIP_ONNX_DIR = os.path.join(OUTPUT_FOLDER, "clip_onnx")
+CLIP_ONNX_THREADS = 0  # ONNX Runtime算子内线程数，0表示按物理核心数自动选择
+# PyTorch后端的CLIP模型精度：fp32、bf16或int8（动态量化，仅CPU），与fp32的排序一致性见benchmarks/benchmark_clip_precision.py
+CLIP_PRECISION = "fp32"
+# CLIP评分模式
+# single: 目标文本的余弦相似度按CLIP_SIMILARITY_RANGE线性映射到0-1，不同图像的分数可直接与VTON_CLIP_SCORE_*_THRESHOLD比较；
+# contrastive: 目标文本与各类别对照提示词一起做softmax。对照提示词为英文，只在PROMPT_TRANSLATION_ENABLED时生效，
+# 否则退回single；分数尺度与single不同，启用后需用benchmarks/tune_thresholds.py重新调优VTON_CLIP_SCORE_*_THRESHOLD
+CLIP_SCORE_MODE = "single"
+# single模式下映射到0和1的余弦相似度，CLIP文本编码器只在英文上训练，中文提示词的相似度整体偏低，建议同时启用提示词翻译
+CLIP_SIMILARITY_RANGE = (0.15, 0.35)
+# 对照提示词，各类别的对照提示词与default合并使用，启动时编码一次
+CLIP_CONTRAST_PROMPTS = {
+    "default": [
+        "a blurry, distorted, low quality photo",
+        "a photo of a person with a deformed body and artifacts",
+        "a photo of a person wearing plain, unrelated clothes",
+        "an empty background without any person or clothing"
+    ],
+    "upper_body": ["a person wearing a plain gray sweatshirt", "a bare-chested person"],
+    "lower_body": ["a person wearing plain gray sweatpants", "a person wearing shorts of the wrong style"],
+    "dresses": ["a person wearing a shirt and trousers", "a person wearing a plain gray dress"],
+    "shoes": ["bare feet", "a person wearing plain gray slippers"],
+    "hat": ["a person with no hat", "a person wearing a plain gray cap"],
+    "glasses": ["a person with no glasses", "a person wearing plain black sunglasses"],
+    "belt": ["a person with no belt", "a plain black belt"],
+    "scarf": ["a person with no scarf", "a plain gray scarf"]
+}
+# 图像按文件内容摘要、文本按规范化字符串缓存CLIP特征，内存LRU缓存之外还持久化到磁盘，模型变化时自动失效
+CLIP_EMBEDDING_CACHE_ENABLED = True
+CLIP_EMBEDDING_CACHE_SIZE = 2048  # 内存中缓存的特征数量
+CLIP_EMBEDDING_CACHE_DIR = os.path.join(OUTPUT_FOLDER, "clip_embedding_cache")
+
+# VQA评分配置
+VQA_MAX_CONCURRENCY = 4  # 同时进行中的VQA请求数上限
+VQA_RATE_LIMIT_QPS = 2.0  # 客户端令牌桶限流：每秒请求数，0表示不限流
+VQA_RATE_LIMIT_BURST = 4  # 令牌桶容量，允许的突发请求数
+# 上传前将图像缩小到视觉模型的有效分辨率并重新编码，关闭时上传原始文件
+VQA_IMAGE_COMPACT = True
+VQA_IMAGE_MAX_SIDE = 768  # 长边最大像素数
+VQA_IMAGE_FORMAT = "JPEG"  # JPEG或WEBP
+VQA_IMAGE_QUALITY = 85  # 编码质量
+VQA_IMAGE_CACHE_SIZE = 256  # 内存中缓存的编码结果数量
+# 持久化的VQA分数存储，以（图像内容摘要，描述，视觉模型，模板版本）为键，命中时不再调用视觉模型
+VQA_SCORE_STORE_ENABLED = True
+VQA_SCORE_STORE_PATH = os.path.join(OUTPUT_FOLDER, "vqa_scores.sqlite3")
+# 多图评分：大于1时并发评分将描述相同的若干张图像合并为一次视觉模型请求，1表示逐张请求
+VQA_MULTI_IMAGE_BATCH_SIZE = 1
+# VQA评分模式
+# logprobs: 只生成一个0-9的数字，按数字token的对数概率计算期望分数（服务端不支持logprobs时直接解析数字）；
+# text: 输出0-1的分数文本
+VQA_SCORE_MODE = "logprobs"
+VQA_TEXT_MAX_TOKENS = 8  # text模式下的最大输出token数
+
+# 远程服务熔断配置（VQA评分和需求转描述共用BASE_URL，共享同一个熔断器）
+# 连续失败或慢调用达到阈值后熔断，熔断期间VQA评分改用本地ClipScore，需求转描述改用本地关键词规则，
+# 后台定期探测服务，恢复后自动关闭熔断
+CIRCUIT_BREAKER_ENABLED = True
+REMOTE_API_TIMEOUT = 60.0  # 远程请求超时（秒）
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3  # 连续失败次数阈值
+CIRCUIT_BREAKER_SLOW_CALL_SECONDS = 30.0  # 超过该耗时的调用按失败计
+CIRCUIT_BREAKER_PROBE_INTERVAL = 15.0  # 熔断期间的探测间隔（秒）
+CIRCUIT_BREAKER_PROBE_TIMEOUT = 5.0  # 探测请求超时（秒）
+# 本地备选评分的CLIP余弦相似度区间，线性映射到0-1后与VQA分数同尺度比较；可参考SCORING_CASCADE_LOG中的CLIP/VQA分数对调整
+VQA_FALLBACK_CLIP_RANGE = (0.15, 0.35)
+
+# 远程请求对冲配置
+# 启用后请求超过该端点近期延迟的HEDGING_PERCENTILE百分位数仍未返回时，再发出一个相同请求，采用先返回的结果
+HEDGING_ENABLED = False
+HEDGING_PERCENTILE = 95.0  # 触发对冲的延迟百分位数
+HEDGING_MAX_RATIO = 0.1  # 对冲请求数占总请求数的比例上限，用于控制额外费用
+HEDGING_MIN_SAMPLES = 20  # 延迟样本数达到该值后才开始对冲
+HEDGING_WINDOW = 200  # 计算百分位数使用的最近请求数
+HEDGING_MIN_DELAY = 0.5  # 对冲等待时间的下限（秒）
+HEDGING_WORKERS = 16  # 每个端点执行请求的线程数
+
+# 评分级联配置：先用本地CLIP初筛，明显不合格的候选不再调用远程VQA
+# off: 不初筛；shadow: 记录CLIP/VQA分数对用于校准，但所有候选仍送入VQA；on: 按各类别校准的阈值拒绝候选
+SCORING_CASCADE_MODE = "off"
+SCORING_CASCADE_TARGET_RECALL = 0.95  # 校准阈值时要求保留的VQA合格候选比例
+SCORING_CASCADE_MIN_SAMPLES = 30  # 类别至少积累该数量的VQA合格样本才设置阈值
+SCORING_CASCADE_EXPLORATION_RATE = 0.1  # on模式下被拒候选仍送入VQA的概率，用于持续校准
+SCORING_CASCADE_LOG = os.path.join(OUTPUT_FOLDER, "score_pairs.jsonl")
+SCORING_CASCADE_CALIBRATION = os.path.join(OUTPUT_FOLDER, "cascade_calibration.json")
+
+# 提示词翻译配置
+# 启用后中文服装描述先由LANGUAGE_MODEL翻译为英文提示词，再按CLIP tokenizer精确截断后送入生成模型和ClipScore，
+# VQA评分仍使用原始中文描述。翻译结果持久化缓存，重复的提示词不会再次调用语言模型
+PROMPT_TRANSLATION_ENABLED = False
+PROMPT_TRANSLATION_CACHE = os.path.join(OUTPUT_FOLDER, "prompt_translation_cache.json")
+
 # 搜索配置
 SEARCH_TIMEOUT = 30  # 搜索超时时间（秒）
 SEARCH_RESULT_LIMIT = 50  # 搜索结果限制
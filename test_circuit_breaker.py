@@ -0,0 +1,127 @@
+import os
+import sys
+import shutil
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+from PIL import Image
+from openai import BadRequestError
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.circuit_breaker import CircuitBreaker, remote_api_breaker, OPEN, CLOSED
+from utils.metrics import VQAScore, is_fallback_score
+from utils.need2text import Need2Text
+from config.config import VQA_FALLBACK_CLIP_RANGE
+
+# 配置日志
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("test_circuit_breaker")
+
+
+class FakeClipScorer:
+    """返回固定余弦相似度的CLIP评分器，避免加载CLIP模型"""
+    model = True
+    processor = True
+
+    def __init__(self, similarity):
+        self.similarity = similarity
+        self.calls = 0
+
+    def similarity_batch(self, images, text):
+        self.calls += 1
+        return [self.similarity] * len(images)
+
+
+class FakeBadRequestError(BadRequestError):
+    """不依赖HTTP响应对象构造的BadRequestError"""
+
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
+
+def test_breaker_opens_and_recovers():
+    """连续失败达到阈值后熔断，成功调用后恢复"""
+    breaker = CircuitBreaker("test", failure_threshold=3, slow_call_seconds=1.0, probe_interval=60.0)
+    for _ in range(2):
+        breaker.record_failure("timeout")
+    assert breaker.state == CLOSED and breaker.allow_request(), "未达到阈值时不应熔断"
+    breaker.record_failure("timeout")
+    assert breaker.state == OPEN and not breaker.allow_request(), "达到阈值后应熔断并拒绝请求"
+    assert breaker.get_stats()["rejected"] == 1
+
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED and breaker.allow_request(), "成功调用后应恢复"
+    # 慢调用按失败计
+    for _ in range(3):
+        breaker.record_success(2.0)
+    assert breaker.state == OPEN, "连续慢调用应触发熔断"
+    logger.info("熔断器状态测试通过")
+
+
+def test_bad_request_not_counted():
+    """请求本身有误的BadRequestError不计入失败，其他异常计入"""
+    breaker = CircuitBreaker("test", failure_threshold=1, probe_interval=60.0)
+    breaker.record_exception(FakeBadRequestError("提示词格式错误"))
+    assert breaker.state == CLOSED and breaker.get_stats()["failures"] == 0, "BadRequestError不应触发熔断"
+    breaker.record_exception(TimeoutError("timeout"))
+    assert breaker.state == OPEN, "其他异常应计入失败"
+    logger.info("请求错误分类测试通过")
+
+
+@contextmanager
+def _open_remote_breaker():
+    """使共享熔断器进入熔断状态，探测替换为始终失败，避免测试期间访问真实服务；结束后恢复"""
+    original = (remote_api_breaker.probe, remote_api_breaker.enabled)
+
+    def failing_probe():
+        raise ConnectionError("测试中不探测")
+    remote_api_breaker.probe = failing_probe
+    remote_api_breaker.enabled = True
+    try:
+        for _ in range(remote_api_breaker.failure_threshold):
+            remote_api_breaker.record_failure("测试")
+        assert not remote_api_breaker.allow_request(), "达到阈值后应熔断"
+        yield
+    finally:
+        remote_api_breaker.probe, remote_api_breaker.enabled = original
+        remote_api_breaker.record_success(0.0)
+
+
+def test_vqa_fallback_when_open():
+    """熔断期间VQA评分使用注入的CLIP评分器，分数映射到VQA尺度并标记为备选分数"""
+    work_dir = tempfile.mkdtemp()
+    try:
+        image_path = os.path.join(work_dir, "garment.png")
+        Image.new("RGB", (8, 8), (255, 255, 255)).save(image_path)
+        low, high = VQA_FALLBACK_CLIP_RANGE
+        clip_scorer = FakeClipScorer((low + high) / 2)
+        vqa_scorer = VQAScore(clip_scorer=clip_scorer)
+
+        with _open_remote_breaker():
+            score = vqa_scorer.score(image_path, "白色T恤")
+        assert is_fallback_score(score), "熔断期间应返回备选分数"
+        assert np.isclose(float(score), 0.5), f"区间中点应映射为0.5，实际为{score}"
+        assert clip_scorer.calls == 1, "应使用注入的CLIP评分器"
+        assert vqa_scorer.get_stats()["fallback_scores"] == 1
+        logger.info("熔断备选评分测试通过")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def test_need2text_fallback_ignores_negative_feedback():
+    """熔断期间的本地备选描述只根据用户需求生成，负面反馈不参与提示词和类别推断"""
+    with _open_remote_breaker():
+        result = Need2Text().get_addition_need2text("想要一条夏天穿的连衣裙", "不要帽子", "白色连衣裙")
+    assert result["category"] == "dresses", result
+    assert "帽子" not in result["prompt"], result
+    logger.info("需求转描述备选测试通过")
+
+
+if __name__ == "__main__":
+    test_breaker_opens_and_recovers()
+    test_bad_request_not_counted()
+    test_vqa_fallback_when_open()
+    test_need2text_fallback_ignores_negative_feedback()
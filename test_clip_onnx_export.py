@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.digest import directory_fingerprint
+from config.config import CLIP_ONNX_DIR, PROJECT_ROOT
+
+# 配置日志
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("test_clip_onnx_export")
+
+
+def _write_export(onnx_dir, fingerprint):
+    """模拟export_clip_onnx写入的文件"""
+    os.makedirs(onnx_dir, exist_ok=True)
+    for name in ["vision.onnx", "text.onnx"]:
+        with open(os.path.join(onnx_dir, name), "wb") as f:
+            f.write(os.urandom(64))
+    with open(os.path.join(onnx_dir, "export.json"), "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "opset": 17}, f)
+
+
+def test_export_does_not_change_fingerprint():
+    """导出目录位于模型目录内时，导出文件不改变模型指纹，下次启动不会重新导出"""
+    model_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(model_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"model_type": "clip"}, f)
+        onnx_dir = os.path.join(model_dir, "onnx")
+
+        before = directory_fingerprint(model_dir, exclude_dirs=[onnx_dir])
+        _write_export(onnx_dir, before)
+        after = directory_fingerprint(model_dir, exclude_dirs=[onnx_dir])
+        assert before == after, "导出文件不应改变模型指纹"
+        assert directory_fingerprint(model_dir) != before, "未排除导出目录时指纹会变化"
+
+        # 模型文件变化时指纹仍会改变
+        with open(os.path.join(model_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"model_type": "clip", "projection_dim": 512}, f)
+        assert directory_fingerprint(model_dir, exclude_dirs=[onnx_dir]) != before
+        logger.info("导出目录指纹测试通过")
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+
+
+def test_default_export_dir_outside_model():
+    """默认导出目录不在模型目录内"""
+    model_dir = os.path.abspath(os.path.join(PROJECT_ROOT, "utils", "clip-vit-base-patch32"))
+    assert not os.path.abspath(CLIP_ONNX_DIR).startswith(model_dir + os.sep), f"导出目录位于模型目录内: {CLIP_ONNX_DIR}"
+    logger.info("默认导出目录测试通过")
+
+
+if __name__ == "__main__":
+    test_export_does_not_change_fingerprint()
+    test_default_export_dir_outside_model()
@@ -0,0 +1,54 @@
+import os
+import sys
+import torch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import ClipScore, calibrate_similarity
+from config.config import CLIP_SIMILARITY_RANGE
+
+# 配置日志
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("test_clip_score")
+
+
+class FakeClipModel:
+    logit_scale = torch.tensor(4.6052)
+
+
+def make_scorer(image_features, score_mode="single", prompt_bank=None):
+    """构造不加载CLIP模型的评分器，图像按名称返回给定的归一化特征，文本特征固定为第一个坐标轴"""
+    scorer = ClipScore.__new__(ClipScore)
+    scorer.model = FakeClipModel()
+    scorer.processor = object()
+    scorer.score_mode = score_mode
+    scorer.prompt_bank = prompt_bank or {}
+    features = {name: torch.nn.functional.normalize(torch.tensor(vector, dtype=torch.float32), dim=0)
+                for name, vector in image_features.items()}
+    scorer._encode_images = lambda images, batch_size=None: [features.get(image) for image in images]
+    scorer._encode_texts = lambda texts: torch.tensor([[1.0, 0.0, 0.0]] * len(texts))
+    return scorer
+
+
+def test_single_mode_varies_per_image():
+    """单文本评分的分数随图像变化，等于校准后的余弦相似度"""
+    scorer = make_scorer({"close.png": [0.32, 0.9474, 0.0], "far.png": [0.18, 0.9837, 0.0]})
+    close, far, missing = scorer.score_batch(["close.png", "far.png", "missing.png"], "a white t-shirt")
+    assert close > far, f"相似度高的图像分数应更高: {close} <= {far}"
+    assert abs(close - calibrate_similarity(0.32, CLIP_SIMILARITY_RANGE)) < 1e-3
+    assert 0.0 <= far < 1.0 and missing == 0.5
+    logger.info("单文本评分测试通过")
+
+
+def test_calibrate_similarity_clamps():
+    assert calibrate_similarity(0.1, (0.15, 0.35)) == 0.0
+    assert calibrate_similarity(0.5, (0.15, 0.35)) == 1.0
+    assert abs(calibrate_similarity(0.25, (0.15, 0.35)) - 0.5) < 1e-9
+    logger.info("相似度校准测试通过")
+
+
+if __name__ == "__main__":
+    test_single_mode_varies_per_image()
+    test_calibrate_similarity_clamps()
@@ -0,0 +1,53 @@
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embedding_cache import EmbeddingCache
+
+# 配置日志
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("test_embedding_cache")
+
+
+def test_variants_coexist():
+    """同一模型不同精度、后端的实例不会清除彼此的磁盘缓存"""
+    cache_dir = tempfile.mkdtemp()
+    try:
+        fp32 = EmbeddingCache(cache_dir, "model_a", variant="cpu-torch-fp32")
+        fp32.put("abcd", np.ones(4))
+        int8 = EmbeddingCache(cache_dir, "model_a", variant="cpu-torch-int8")
+        int8.put("abcd", np.zeros(4))
+
+        reopened = EmbeddingCache(cache_dir, "model_a", max_memory_items=0, variant="cpu-torch-fp32")
+        value = reopened.get("abcd")
+        assert value is not None and np.allclose(value, 1.0), "其他变体的实例不应清除fp32缓存"
+        assert np.allclose(EmbeddingCache(cache_dir, "model_a", variant="cpu-torch-int8").get("abcd"), 0.0)
+        logger.info("变体共存测试通过")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def test_model_change_evicts():
+    """模型指纹变化时清除旧模型的全部缓存"""
+    cache_dir = tempfile.mkdtemp()
+    try:
+        EmbeddingCache(cache_dir, "model_a", variant="cpu-torch-fp32").put("abcd", np.ones(4))
+        EmbeddingCache(cache_dir, "model_a", variant="cpu-onnx-fp32").put("abcd", np.ones(4))
+
+        updated = EmbeddingCache(cache_dir, "model_b", variant="cpu-torch-fp32")
+        assert not os.path.exists(os.path.join(cache_dir, "model_a")), "旧模型的缓存目录应被清除"
+        assert updated.get("abcd") is None
+        logger.info("模型变化清除缓存测试通过")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_variants_coexist()
+    test_model_change_evicts()
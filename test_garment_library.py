@@ -0,0 +1,94 @@
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+from PIL import Image
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.garment_library import GarmentLibrary
+
+# 配置日志
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("test_garment_library")
+
+
+class FakeClipScorer:
+    """按图像平均颜色和文本内容生成确定的特征，避免加载CLIP模型"""
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def image_embedding(self, image_path):
+        with Image.open(image_path) as image:
+            mean = np.asarray(image.convert("RGB"), dtype=np.float32).mean(axis=(0, 1)) / 255.0
+        return self._normalize(np.concatenate([mean, [0.1]]))
+
+    def text_embedding(self, text):
+        if "白色" in text:
+            return self._normalize([1.0, 1.0, 1.0, 0.1])
+        return self._normalize([1.0, 0.0, 0.0, 0.1])
+
+
+def _save_image(path, color):
+    Image.new("RGB", (8, 8), color).save(path)
+    return path
+
+
+def test_dedup_by_content():
+    """相同内容的图像只记录一次，生成目录中的文件被覆盖后库中的图像不受影响"""
+    work_dir = tempfile.mkdtemp()
+    try:
+        library = GarmentLibrary(os.path.join(work_dir, "library"), clip_scorer=FakeClipScorer())
+        output_path = _save_image(os.path.join(work_dir, "garment_0_0.png"), (250, 250, 250))
+        copy_path = shutil.copyfile(output_path, os.path.join(work_dir, "copy.png"))
+
+        record = library.add(output_path, "白色T恤", "upper_body", 0.8)
+        assert record is not None, "首次写入应成功"
+        assert library.add(copy_path, "白色T恤", "upper_body", 0.8) is None, "相同内容的图像不应重复写入"
+        assert record["path"] != output_path and os.path.exists(record["path"]), "图像应复制到库目录"
+
+        # 重复运行覆盖了同名文件，新内容应作为新记录写入，旧记录仍指向原来的图像
+        _save_image(output_path, (200, 20, 20))
+        second = library.add(output_path, "红色T恤", "upper_body", 0.7)
+        assert second is not None and second["digest"] != record["digest"], "覆盖后的新内容应写入新记录"
+        with Image.open(record["path"]) as image:
+            assert image.getpixel((0, 0)) == (250, 250, 250), "库中的旧图像不应被覆盖"
+
+        # 重新加载后按摘要去重，不出现重复记录
+        reloaded = GarmentLibrary(os.path.join(work_dir, "library"), clip_scorer=FakeClipScorer())
+        assert len(reloaded.records) == 2, f"重新加载后应有2条记录，实际为{len(reloaded.records)}"
+        assert reloaded.add(copy_path, "白色T恤", "upper_body", 0.8) is None
+        logger.info("服装库去重测试通过")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def test_query_verifies_image():
+    """提示词相近的记录还需通过提示词与图像的相似度校验才会命中"""
+    work_dir = tempfile.mkdtemp()
+    try:
+        library = GarmentLibrary(os.path.join(work_dir, "library"), clip_scorer=FakeClipScorer())
+        white_path = _save_image(os.path.join(work_dir, "white.png"), (250, 250, 250))
+        # 提示词为白色T恤，但图像实际是红色的
+        red_path = _save_image(os.path.join(work_dir, "red.png"), (200, 20, 20))
+        library.add(white_path, "白色T恤", "upper_body", 0.8)
+        library.add(red_path, "白色T恤", "upper_body", 0.9)
+
+        matches = library.query("白色T恤", "upper_body", threshold=0.9, image_threshold=0.9)
+        assert [m["path"] for m in matches] == [library.records[0]["path"]], f"只有图文相符的记录应命中: {matches}"
+        assert all(m["image_similarity"] >= 0.9 for m in matches)
+        assert library.query("白色T恤", "lower_body", threshold=0.9, image_threshold=0.9) == [], "类别不同不应命中"
+        logger.info("服装库命中校验测试通过")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_dedup_by_content()
+    test_query_verifies_image()
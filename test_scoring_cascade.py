@@ -0,0 +1,62 @@
+import os
+import sys
+import random
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.scoring_cascade import calibrate_cutoffs
+
+# 配置日志
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("test_scoring_cascade")
+
+
+def _population(rng, size):
+    """CLIP分数在[0, 1)均匀分布，VQA合格率随CLIP分数升高"""
+    population = []
+    for _ in range(size):
+        clip_score = rng.random()
+        population.append((clip_score, 0.8 if rng.random() < 0.2 + 0.6 * clip_score else 0.3))
+    return population
+
+
+def test_calibrate_weights_exploration():
+    """on模式的记录按探索概率加权后，校准结果与shadow模式全量记录一致"""
+    rng = random.Random(0)
+    population = _population(rng, 20000)
+    shadow = [{"mode": "shadow", "category": "upper_body", "clip_score": c, "vqa_score": v, "would_reject": False}
+              for c, v in population]
+    expected = calibrate_cutoffs(shadow, target_recall=0.95, min_samples=30)["upper_body"]["cutoff"]
+
+    # on模式：阈值0.3以下的候选只有10%送入VQA
+    on_records = []
+    for clip_score, vqa_score in population:
+        rejected = clip_score < 0.3
+        sent = not rejected or rng.random() < 0.1
+        on_records.append({"mode": "on", "category": "upper_body", "clip_score": clip_score,
+                           "vqa_score": vqa_score if sent else None, "would_reject": rejected,
+                           "exploration_rate": 0.1})
+    calibration = calibrate_cutoffs(on_records, target_recall=0.95, min_samples=30)["upper_body"]
+    assert abs(calibration["cutoff"] - expected) < 0.03, f"加权后的阈值{calibration['cutoff']:.3f}应接近{expected:.3f}"
+    assert abs(calibration["expected_reject_rate"] - expected) < 0.05, "加权后的拒绝率应接近全量记录"
+
+    # 不加权（探索概率视为1）时阈值明显偏高
+    for record in on_records:
+        record["exploration_rate"] = 1.0
+    biased = calibrate_cutoffs(on_records, target_recall=0.95, min_samples=30)["upper_body"]["cutoff"]
+    assert biased > expected + 0.03, "未加权的探索样本会使阈值偏高"
+    logger.info(f"评分级联校准测试通过: 全量 {expected:.3f}, 加权 {calibration['cutoff']:.3f}, 未加权 {biased:.3f}")
+
+
+def test_min_samples():
+    """合格样本不足时不设阈值"""
+    records = [{"mode": "shadow", "category": "hat", "clip_score": 0.5, "vqa_score": 0.9, "would_reject": False}] * 5
+    assert calibrate_cutoffs(records, min_samples=30) == {}
+    logger.info("最少样本数测试通过")
+
+
+if __name__ == "__main__":
+    test_calibrate_weights_exploration()
+    test_min_samples()
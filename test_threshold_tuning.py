@@ -0,0 +1,69 @@
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.attempt_log import AttemptLog, load_attempt_runs
+from utils.threshold_tuning import replay_run, tune_category, tune_stage
+
+# 配置日志
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("test_threshold_tuning")
+
+
+def test_log_roundtrip():
+    """尝试记录按运行汇总，取消的运行被忽略，备选分数被计数"""
+    log_dir = tempfile.mkdtemp()
+    try:
+        log = AttemptLog(os.path.join(log_dir, "attempts.jsonl"))
+        log.log_attempts("vton", "run_a", "upper_body", 0, [0.5, 0.6, 0.7, 0.4])
+        log.log_attempts("vton", "run_a", "upper_body", 1, [0.9, 0.2, 0.3, 0.1])
+        log.log_run("vton", "run_a", "upper_body", 0.8, 3, 4, 2, True)
+        log.log_attempts("garment", "run_b", "upper_body", 0, [0.8, 0.7], [True, False])
+        log.log_run("garment", "run_b", "upper_body", 0.75, 3, 2, 1, False)
+        log.log_attempts("garment", "run_c", "upper_body", 0, [0.8])
+        log.log_run("garment", "run_c", "upper_body", 0.75, 3, 1, 1, False, cancelled=True)
+
+        runs = {run["run_id"]: run for run in load_attempt_runs(log.log_path)}
+        assert set(runs) == {"run_a", "run_b"}, "取消的运行不应返回"
+        assert runs["run_a"]["iteration_scores"] == [[0.5, 0.6, 0.7, 0.4], [0.9, 0.2, 0.3, 0.1]]
+        assert runs["run_a"]["per_iteration"] == 4, "每轮生成数应为实际的变体数"
+        assert runs["run_a"]["fallback_attempts"] == 0 and runs["run_b"]["fallback_attempts"] == 1
+        logger.info("尝试记录汇总测试通过")
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+def test_replay():
+    """按新阈值回放：提前结束时少生成，阈值过高时截断回放按最大迭代次数计算"""
+    run = {"iteration_scores": [[0.72, 0.5, 0.6], [0.85, 0.3, 0.4]], "per_iteration": 3,
+           "max_iterations": 3, "stopped_early": True}
+    assert replay_run(run, 0.7, 0.65, 1) == {"generations": 3, "accepted": True, "censored": False}
+    assert replay_run(run, 0.8, 0.65, 1) == {"generations": 6, "accepted": True, "censored": False}
+    assert replay_run(run, 0.9, 0.65, 1) == {"generations": 9, "accepted": True, "censored": True}
+    logger.info("阈值回放测试通过")
+
+
+def test_tune_prefers_cheaper_threshold():
+    """合格率满足要求时选择平均生成数最少的阈值，含备选分数的运行不参与调优"""
+    runs = [{"stage": "vton", "category": "upper_body", "iteration_scores": [[0.72, 0.5, 0.6], [0.85, 0.3, 0.4]],
+             "per_iteration": 3, "max_iterations": 3, "stopped_early": True, "fallback_attempts": 0}
+            for _ in range(5)]
+    result = tune_category(runs, 0.8, 0.7, 1, target_acceptance=0.9)
+    assert result["recommended"] == 0.72 and result["expected_generations"] == 3, result
+    assert result["current_expected_generations"] == 6
+
+    for run in runs:
+        run["fallback_attempts"] = 1
+    assert tune_stage(runs, "vton", target_acceptance=0.9, min_runs=1) == {}, "含备选分数的运行不应参与调优"
+    logger.info("阈值调优测试通过")
+
+
+if __name__ == "__main__":
+    test_log_roundtrip()
+    test_replay()
+    test_tune_prefers_cheaper_threshold()
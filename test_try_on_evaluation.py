@@ -0,0 +1,58 @@
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+from PIL import Image
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.try_on_evaluation import TryOnEvaluator
+from test_clip_score import make_scorer
+
+# 配置日志
+import logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("test_try_on_evaluation")
+
+
+class FakeVQAScorer:
+    def score_many(self, image_paths, descriptions, cancel_token=None):
+        return [0.8] * len(image_paths)
+
+
+class FakeHumanMask:
+    def segment_human(self, bgr):
+        return np.ones(bgr.shape[:2], dtype=np.uint8)
+
+    def detect_human(self, bgr):
+        return True
+
+
+def test_clip_score_distinguishes_results():
+    """VQA分数相同时，与描述更相符的试穿结果得到更高的clip_score和overall_score"""
+    work_dir = tempfile.mkdtemp()
+    try:
+        close_path = os.path.join(work_dir, "close.png")
+        far_path = os.path.join(work_dir, "far.png")
+        Image.new("RGB", (8, 8), (250, 250, 250)).save(close_path)
+        Image.new("RGB", (8, 8), (200, 20, 20)).save(far_path)
+
+        # 评分器按解码后的图像颜色返回特征
+        clip_scorer = make_scorer({"close": [0.32, 0.9474, 0.0], "far": [0.18, 0.9837, 0.0]})
+        encode_by_name = clip_scorer._encode_images
+        clip_scorer._encode_images = lambda images, batch_size=None: encode_by_name(
+            ["close" if image.getpixel((0, 0))[1] > 100 else "far" for image in images])
+
+        evaluator = TryOnEvaluator(vqa_scorer=FakeVQAScorer(), clip_scorer=clip_scorer, human_mask=FakeHumanMask())
+        close, far = evaluator.evaluate_batch([close_path, far_path], ["白色T恤", "白色T恤"], category="upper_body")
+        assert close["clip_score"] > far["clip_score"], f"CLIP分数应区分试穿结果: {close} {far}"
+        assert close["overall_score"] > far["overall_score"], f"总体评分应区分试穿结果: {close} {far}"
+        logger.info("试穿结果评估测试通过")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_clip_score_distinguishes_results()
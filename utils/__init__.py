@@ -6,7 +6,7 @@ hf_mirror = "https://hf-mirror.com"
 os.environ["HF_ENDPOINT"] = hf_mirror
 os.environ["HF_HUB_OFFLINE"] = "0"
 
-from .model_based_text2garment import description_to_garment
+from .garment_source import description_to_garment, get_garment_source_stats
 from .need2text import get_need2text
 from .flux_vton import run_vton
 from .image_process import image_process
@@ -16,6 +16,7 @@ from .human_mask import human_mask_instance
 
 __all__ = [
     "description_to_garment",
+    "get_garment_source_stats",
     "get_need2text",
     "run_vton",
     "image_process",
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import threading
+from typing import Dict, List, Optional
+from config.config import ATTEMPT_LOG_ENABLED, ATTEMPT_LOG_PATH
+
+
+class AttemptLog:
+    """按行追加记录每次生成尝试的分数和每次运行的结果，供离线阈值调优回放
+
+    attempt记录: stage（garment或vton）、run_id、category、iteration、score，以及分数是否来自本地备选评分（fallback）；
+    run记录: 运行使用的阈值、最大迭代次数、每轮生成数、实际迭代次数以及是否因达到阈值提前结束。
+    """
+
+    def __init__(self, log_path: str = ATTEMPT_LOG_PATH):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+
+    def _append(self, records: List[Dict]) -> None:
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"写入尝试记录时出错: {e}")
+
+    def log_attempts(self, stage: str, run_id: str, category: str, iteration: int, scores: List[float],
+                     fallback: Optional[List[bool]] = None) -> None:
+        """记录一轮迭代中各候选的分数，fallback标记由本地备选评分得到的分数"""
+        timestamp = time.time()
+        fallback = fallback or [False] * len(scores)
+        self._append([
+            {"event": "attempt", "stage": stage, "run_id": run_id, "category": category,
+             "iteration": iteration, "index": index, "score": round(float(score), 6),
+             "fallback": bool(is_fallback), "timestamp": timestamp}
+            for index, (score, is_fallback) in enumerate(zip(scores, fallback))
+        ])
+
+    def log_run(self, stage: str, run_id: str, category: str, threshold: float, max_iterations: int,
+                per_iteration: int, iterations: int, stopped_early: bool, cancelled: bool = False) -> None:
+        """记录一次运行的结果"""
+        self._append([{
+            "event": "run", "stage": stage, "run_id": run_id, "category": category,
+            "threshold": threshold, "max_iterations": max_iterations, "per_iteration": per_iteration,
+            "iterations": iterations, "stopped_early": stopped_early, "cancelled": cancelled,
+            "timestamp": time.time()
+        }])
+
+
+def load_attempt_runs(log_path: str = ATTEMPT_LOG_PATH, stage: Optional[str] = None) -> List[Dict]:
+    """读取尝试记录并按运行汇总，返回包含各轮迭代分数列表（iteration_scores）的运行记录
+
+    只返回有run记录且未被取消的运行；fallback_attempts为该运行中由本地备选评分得到的分数个数。
+    """
+    attempts: Dict[str, Dict[int, List[float]]] = {}
+    fallback_counts: Dict[str, int] = {}
+    runs: Dict[str, Dict] = {}
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if stage is not None and record.get("stage") != stage:
+                continue
+            if record.get("event") == "attempt":
+                attempts.setdefault(record["run_id"], {}).setdefault(record["iteration"], []).append(record["score"])
+                if record.get("fallback"):
+                    fallback_counts[record["run_id"]] = fallback_counts.get(record["run_id"], 0) + 1
+            elif record.get("event") == "run" and not record.get("cancelled"):
+                runs[record["run_id"]] = record
+
+    result = []
+    for run_id, run in runs.items():
+        iterations = attempts.get(run_id, {})
+        run = dict(run)
+        run["iteration_scores"] = [iterations.get(i, []) for i in range(run["iterations"])]
+        run["fallback_attempts"] = fallback_counts.get(run_id, 0)
+        result.append(run)
+    return result
+
+
+# 创建全局实例，未启用时为None
+attempt_log_instance = AttemptLog() if ATTEMPT_LOG_ENABLED else None
@@ -0,0 +1,81 @@
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+
+class OperationCancelledError(Exception):
+    """操作因取消令牌被触发而中止"""
+    pass
+
+
+class CancellationToken:
+    """协作式取消令牌
+
+    由界面事件创建并一路传递到生成和试穿循环中，循环在迭代之间、
+    Flux每一步去噪之后检查令牌状态。子令牌会随父令牌一起取消。
+    """
+
+    def __init__(self, parent: Optional["CancellationToken"] = None):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._children: List["CancellationToken"] = []
+        self.reason = ""
+        if parent is not None:
+            parent._add_child(self)
+
+    def _add_child(self, child: "CancellationToken") -> None:
+        with self._lock:
+            self._children.append(child)
+            cancelled = self._event.is_set()
+        if cancelled:
+            child.cancel(self.reason)
+
+    def child(self) -> "CancellationToken":
+        """创建随本令牌一起取消的子令牌"""
+        return CancellationToken(parent=self)
+
+    def cancel(self, reason: str = "") -> None:
+        """触发取消，并传递给所有子令牌"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            children = list(self._children)
+        for child in children:
+            child.cancel(reason)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise OperationCancelledError(self.reason or "操作已取消")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待取消，返回是否已被取消"""
+        return self._event.wait(timeout)
+
+
+def is_cancelled(cancel_token: Optional[CancellationToken]) -> bool:
+    """判断可选的取消令牌是否已被触发"""
+    return cancel_token is not None and cancel_token.cancelled
+
+
+class PipelineSlot:
+    """限制同时使用同一模型管道的任务数量，等待中的任务被取消时立即退出等待"""
+
+    def __init__(self, slots: int = 1):
+        self._semaphore = threading.Semaphore(max(1, slots))
+
+    @contextmanager
+    def acquire(self, cancel_token: Optional[CancellationToken] = None, poll_interval: float = 0.1):
+        while not self._semaphore.acquire(timeout=poll_interval):
+            if is_cancelled(cancel_token):
+                raise OperationCancelledError("等待管道时操作已取消")
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
@@ -0,0 +1,149 @@
+import time
+import threading
+from typing import Callable, Dict, Optional
+from openai import OpenAI, BadRequestError
+from config.config import API_KEY, BASE_URL
+from config.config import CIRCUIT_BREAKER_ENABLED, CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_SLOW_CALL_SECONDS
+from config.config import CIRCUIT_BREAKER_PROBE_INTERVAL, CIRCUIT_BREAKER_PROBE_TIMEOUT
+
+CLOSED = "closed"
+OPEN = "open"
+
+
+class CircuitBreaker:
+    """远程服务熔断器
+
+    连续failure_threshold次调用失败或耗时超过slow_call_seconds后熔断（open），熔断期间allow_request
+    直接返回False，调用方立即使用本地备选结果。熔断后由后台线程每隔probe_interval秒调用probe探测服务，
+    探测成功后恢复（closed）。未提供probe时，经过probe_interval秒后放行一次真实请求作为探测。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, slow_call_seconds: float = 30.0,
+                 probe_interval: float = 15.0, probe: Optional[Callable[[], None]] = None,
+                 enabled: bool = True):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.slow_call_seconds = slow_call_seconds
+        self.probe_interval = probe_interval
+        self.probe = probe
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_thread: Optional[threading.Thread] = None
+        self.stats = {"successes": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0,
+                      "probes": 0, "last_error": None}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        """服务可用时返回True；熔断期间返回False并计入rejected"""
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            # 没有后台探测时，熔断一段时间后放行一次请求，并重新计时
+            if self.probe is None and time.monotonic() - self._opened_at >= self.probe_interval:
+                self._opened_at = time.monotonic()
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self, latency: float) -> None:
+        """记录一次成功调用，耗时过长的调用按失败处理"""
+        if latency > self.slow_call_seconds:
+            with self._lock:
+                self.stats["slow_calls"] += 1
+            self.record_failure(f"调用耗时{latency:.1f}秒")
+            return
+        with self._lock:
+            self.stats["successes"] += 1
+            self._consecutive_failures = 0
+            if self._state == OPEN:
+                self._close()
+
+    def record_failure(self, error: Optional[str] = None) -> None:
+        """记录一次失败调用，连续失败达到阈值时熔断；未启用时只计数，不熔断也不启动探测"""
+        with self._lock:
+            self.stats["failures"] += 1
+            self.stats["last_error"] = error
+            self._consecutive_failures += 1
+            if self.enabled and self._state == CLOSED and self._consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def record_exception(self, error: Exception) -> None:
+        """记录远程调用抛出的异常；BadRequestError是请求本身有误（如提示词或参数不被接受），不说明服务异常，不计入失败"""
+        if isinstance(error, BadRequestError):
+            return
+        self.record_failure(str(error))
+
+    def _open(self) -> None:
+        """进入熔断状态并启动后台探测，调用方需持有锁"""
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.stats["opened"] += 1
+        print(f"熔断器 {self.name} 已熔断，连续失败 {self._consecutive_failures} 次，改用本地备选")
+        if self.probe is not None and (self._probe_thread is None or not self._probe_thread.is_alive()):
+            self._probe_thread = threading.Thread(target=self._probe_loop, name=f"{self.name}_probe", daemon=True)
+            self._probe_thread.start()
+
+    def _close(self) -> None:
+        """恢复为正常状态，调用方需持有锁"""
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        print(f"熔断器 {self.name} 已恢复")
+
+    def _probe_loop(self) -> None:
+        """熔断期间定期探测服务，探测成功后恢复"""
+        while self.state == OPEN:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                self.stats["probes"] += 1
+            try:
+                self.probe()
+            except Exception as e:
+                with self._lock:
+                    self.stats["last_error"] = f"探测失败: {e}"
+                continue
+            with self._lock:
+                if self._state == OPEN:
+                    self._close()
+
+    def get_stats(self) -> Dict:
+        """返回熔断器状态和调用统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({
+                "name": self.name,
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "open_seconds": time.monotonic() - self._opened_at if self._state == OPEN else 0.0
+            })
+        return stats
+
+
+def _probe_remote_api() -> None:
+    """用短超时的模型列表请求探测BASE_URL是否恢复"""
+    client = OpenAI(api_key=API_KEY, base_url=BASE_URL, timeout=CIRCUIT_BREAKER_PROBE_TIMEOUT, max_retries=0)
+    client.models.list()
+
+
+# VQA评分和需求转描述共用同一个远程服务，因此共享同一个熔断器
+remote_api_breaker = CircuitBreaker(
+    "remote_api",
+    failure_threshold=CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    slow_call_seconds=CIRCUIT_BREAKER_SLOW_CALL_SECONDS,
+    probe_interval=CIRCUIT_BREAKER_PROBE_INTERVAL,
+    probe=_probe_remote_api,
+    enabled=CIRCUIT_BREAKER_ENABLED
+)
+
+
+def get_circuit_breaker_stats() -> Dict:
+    """返回远程服务熔断器的状态指标"""
+    return remote_api_breaker.get_stats()
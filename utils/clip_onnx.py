@@ -0,0 +1,112 @@
+import os
+import json
+import torch
+import numpy as np
+from typing import Dict, Optional
+
+# onnxruntime为可选依赖，只有CLIP_BACKEND = "onnx"时才需要
+try:
+    import onnxruntime as ort
+    HAS_ONNXRUNTIME = True
+except ImportError:
+    ort = None
+    HAS_ONNXRUNTIME = False
+
+ONNX_OPSET = 17
+
+
+class _VisionTower(torch.nn.Module):
+    """导出用的视觉塔：pixel_values -> 未归一化的图像特征"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model.get_image_features(pixel_values=pixel_values)
+
+
+class _TextTower(torch.nn.Module):
+    """导出用的文本塔：input_ids, attention_mask -> 未归一化的文本特征"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+
+def export_clip_onnx(model, output_dir: str, fingerprint: str) -> None:
+    """将CLIP的视觉塔和文本塔分别导出为ONNX模型，批大小和文本长度为动态维度"""
+    os.makedirs(output_dir, exist_ok=True)
+    model = model.float().to("cpu").eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            _VisionTower(model),
+            (torch.zeros(1, 3, 224, 224),),
+            os.path.join(output_dir, "vision.onnx"),
+            input_names=["pixel_values"],
+            output_names=["image_features"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_features": {0: "batch"}},
+            opset_version=ONNX_OPSET
+        )
+        torch.onnx.export(
+            _TextTower(model),
+            (torch.ones(1, 8, dtype=torch.long), torch.ones(1, 8, dtype=torch.long)),
+            os.path.join(output_dir, "text.onnx"),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["text_features"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "text_features": {0: "batch"}
+            },
+            opset_version=ONNX_OPSET
+        )
+    # 记录导出时的模型指纹，模型变化后重新导出
+    with open(os.path.join(output_dir, "export.json"), "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "opset": ONNX_OPSET}, f, indent=2)
+
+
+def _exported_fingerprint(output_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(output_dir, "export.json"), "r", encoding="utf-8") as f:
+            return json.load(f).get("fingerprint")
+    except Exception:
+        return None
+
+
+class OnnxClipEncoder:
+    """通过ONNX Runtime运行CLIP视觉塔和文本塔，首次使用或模型变化时从PyTorch模型导出"""
+
+    def __init__(self, model, onnx_dir: str, fingerprint: str, num_threads: int = 0):
+        if not HAS_ONNXRUNTIME:
+            raise ImportError("未安装onnxruntime，无法使用ONNX后端")
+
+        if _exported_fingerprint(onnx_dir) != fingerprint:
+            print(f"导出CLIP模型到ONNX: {onnx_dir}")
+            export_clip_onnx(model, onnx_dir, fingerprint)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # 0表示由ONNX Runtime按物理核心数决定
+        options.intra_op_num_threads = max(0, num_threads)
+        options.inter_op_num_threads = 1
+        providers = ["CPUExecutionProvider"]
+        self.vision_session = ort.InferenceSession(os.path.join(onnx_dir, "vision.onnx"), options, providers=providers)
+        self.text_session = ort.InferenceSession(os.path.join(onnx_dir, "text.onnx"), options, providers=providers)
+
+    def image_features(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        """计算未归一化的图像特征"""
+        outputs = self.vision_session.run(None, {"pixel_values": pixel_values.cpu().numpy().astype(np.float32)})
+        return torch.from_numpy(outputs[0])
+
+    def text_features(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """计算未归一化的文本特征"""
+        outputs = self.text_session.run(None, {
+            "input_ids": inputs["input_ids"].cpu().numpy().astype(np.int64),
+            "attention_mask": inputs["attention_mask"].cpu().numpy().astype(np.int64)
+        })
+        return torch.from_numpy(outputs[0])
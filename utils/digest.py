@@ -0,0 +1,71 @@
+import os
+import hashlib
+from PIL import Image
+from typing import Iterable, Union
+
+# 读取文件计算摘要时的分块大小
+CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    """按文件内容计算SHA-256摘要，内容相同的文件即使路径不同也得到相同摘要"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pil_digest(image: Image.Image) -> str:
+    """按像素内容计算内存中PIL图像的摘要"""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def image_digest(image: Union[str, Image.Image]) -> str:
+    """计算文件路径或PIL图像的内容摘要"""
+    if isinstance(image, str):
+        return file_digest(image)
+    return pil_digest(image)
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：合并连续空白并转为小写（CLIP tokenizer本身不区分大小写）"""
+    return " ".join((text or "").split()).lower()
+
+
+def text_digest(text: str) -> str:
+    """按规范化后的文本计算摘要"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def directory_fingerprint(path: str, extra: Iterable[str] = (), exclude_dirs: Iterable[str] = ()) -> str:
+    """计算模型目录的指纹：配置文件按内容计入，权重文件按名称、大小和修改时间计入
+
+    extra中的字符串（如设备、精度）一并计入，任一变化都会得到不同的指纹。
+    exclude_dirs中的目录（如位于模型目录内的导出目录）不计入，避免派生文件改变指纹。
+    """
+    digest = hashlib.sha256()
+    excluded = {os.path.abspath(directory) for directory in exclude_dirs}
+    if os.path.isdir(path):
+        for root, dirs, files in sorted(os.walk(path)):
+            dirs[:] = [name for name in dirs if os.path.abspath(os.path.join(root, name)) not in excluded]
+            if os.path.abspath(root) in excluded:
+                continue
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                relative_path = os.path.relpath(file_path, path)
+                digest.update(relative_path.encode("utf-8"))
+                if name.endswith((".json", ".txt")):
+                    with open(file_path, "rb") as f:
+                        digest.update(f.read())
+                else:
+                    stat = os.stat(file_path)
+                    digest.update(f"{stat.st_size}:{int(stat.st_mtime)}".encode("utf-8"))
+    else:
+        digest.update(path.encode("utf-8"))
+    for item in extra:
+        digest.update(str(item).encode("utf-8"))
+    return digest.hexdigest()[:16]
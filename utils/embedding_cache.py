@@ -0,0 +1,108 @@
+import os
+import shutil
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class EmbeddingCache:
+    """两级特征缓存：内存中的LRU缓存和磁盘上的.npy文件
+
+    磁盘缓存按"模型指纹/变体"两级目录存放。变体区分同一模型的不同推理配置（设备、后端、精度），
+    多个配置的实例可以共存；只有模型文件变化（模型指纹改变）时，旧模型的目录才在初始化时被清除。
+    """
+
+    def __init__(self, cache_dir: str, fingerprint: str, max_memory_items: int = 2048, variant: str = "default"):
+        self.root_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.variant = variant
+        self.cache_dir = os.path.join(cache_dir, fingerprint, variant)
+        self.max_memory_items = max(0, max_memory_items)
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._remove_stale()
+        except Exception as e:
+            print(f"初始化特征缓存目录时出错: {e}")
+
+    def _remove_stale(self) -> None:
+        """删除其他模型指纹的缓存目录，同一模型其他变体的目录保留"""
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if name != self.fingerprint and os.path.isdir(path):
+                print(f"模型已变化，清除过期的特征缓存: {path}")
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _disk_path(self, key: str) -> str:
+        # 按键的前两位分子目录，避免单个目录文件过多
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def _remember(self, key: str, value: np.ndarray) -> None:
+        """写入内存LRU缓存，调用方需持有锁"""
+        if self.max_memory_items == 0:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """依次查询内存和磁盘缓存，未命中时返回None"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+
+        path = self._disk_path(key)
+        try:
+            if os.path.exists(path):
+                value = np.load(path)
+                with self._lock:
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                return value
+        except Exception as e:
+            print(f"读取特征缓存时出错: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: np.ndarray) -> None:
+        """写入内存和磁盘缓存"""
+        value = np.asarray(value, dtype=np.float32)
+        with self._lock:
+            self._remember(key, value)
+
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再替换，避免并发读取到不完整的文件
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, value)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入特征缓存时出错: {e}")
+
+    def get_stats(self) -> Dict:
+        """返回缓存命中统计"""
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "fingerprint": self.fingerprint,
+                "variant": self.variant,
+                "memory_items": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / total if total else 0.0
+            }
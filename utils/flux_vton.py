@@ -1,14 +1,22 @@
 import os
 import json
+import uuid
 import torch
 import numpy as np
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Optional, Union
 from diffusers import FluxPipeline
 from .image_process import image_process
 from .metrics import ClipScore
 from .human_mask import human_mask_instance
+from .prompt_translation import prompt_translator_instance
+from .attempt_log import attempt_log_instance
+from .digest import text_digest
+from .cancellation import CancellationToken, OperationCancelledError, PipelineSlot, is_cancelled
 from config.config import STATIC_FOLDER, MAX_FLUX_VTON_ITERATIONS, VTON_CLIP_SCORE_HIGH_THRESHOLD, VTON_CLIP_SCORE_LOW_THRESHOLD
+from config.config import GENERATION_PIPELINE_SLOTS, PROMPT_TRANSLATION_ENABLED, VTON_MAX_PARALLEL_GARMENTS
+from config.config import VTON_NUM_IMAGES
 from jinja2 import Template
 
 class FluxVTON:
@@ -19,6 +27,8 @@ class FluxVTON:
         
         # 初始化Flux管道
         self.pipeline = None
+        # 限制同时使用管道的试穿任务数量，被取消的任务立即释放占用
+        self.slot = PipelineSlot(GENERATION_PIPELINE_SLOTS)
         try:
             # 首先尝试加载本地模型（如果存在）
             # local_model_path = os.path.join(os.path.dirname(__file__), "black-forest-labs", "FLUX.1-schnell")
@@ -79,7 +89,8 @@ class FluxVTON:
             return image1_path
 
     def edit_vton_once(self, garment_image_path: str, human_image_path: str, prompt: str, 
-                       output_path: str, gender: str = "female") -> str:
+                       output_path: str, gender: str = "female",
+                       cancel_token: Optional[CancellationToken] = None) -> str:
         """单次虚拟试穿编辑"""
         try:
             # 如果Flux管道未初始化，返回原始图像
@@ -87,6 +98,20 @@ class FluxVTON:
                 print("Flux管道未初始化，无法进行虚拟试穿")
                 return garment_image_path
             
+            with self.slot.acquire(cancel_token):
+                return self._edit_vton_with_pipeline(garment_image_path, human_image_path, prompt,
+                                                     output_path, gender)
+        except OperationCancelledError:
+            print("虚拟试穿已取消")
+            return None
+        except Exception as e:
+            print(f"虚拟试穿时出错: {e}")
+            return garment_image_path
+
+    def _edit_vton_with_pipeline(self, garment_image_path: str, human_image_path: str, prompt: str,
+                                 output_path: str, gender: str = "female") -> str:
+        """持有管道占用时执行的试穿编辑"""
+        try:
             # 读取图像
             garment_image = Image.open(garment_image_path).convert("RGB")
             human_image = Image.open(human_image_path).convert("RGB")
@@ -124,8 +149,12 @@ class FluxVTON:
 
     def pick_vton_once(self, garment_image_path: str, human_image_path: str, prompt: str, 
                       output_dir: str, category: str, gender: str = "female", 
-                      num_variations: int = 3) -> List[Dict]:
-        """单次试穿与评分筛选"""
+                      num_variations: int = 3, cancel_token: Optional[CancellationToken] = None,
+                      stats: Optional[Dict] = None, iteration: int = 0) -> List[Dict]:
+        """单次试穿与评分筛选，stats用于回传全部变体的分数（variation_scores）
+
+        输出文件名包含迭代序号，后续迭代不会覆盖之前迭代中被选为最佳的结果。
+        """
         # 确保输出目录存在
         os.makedirs(output_dir, exist_ok=True)
         
@@ -133,7 +162,9 @@ class FluxVTON:
         
         # 进行多次试穿以生成变体
         for i in range(num_variations):
-            output_path = os.path.join(output_dir, f"vton_{i}.png")
+            if is_cancelled(cancel_token):
+                return []
+            output_path = os.path.join(output_dir, f"vton_{iteration}_{i}.png")
             
             # 进行虚拟试穿
             vton_image_path = self.edit_vton_once(
@@ -141,24 +172,33 @@ class FluxVTON:
                 human_image_path=human_image_path,
                 prompt=prompt,
                 output_path=output_path,
-                gender=gender
+                gender=gender,
+                cancel_token=cancel_token
             )
+            if vton_image_path is None:
+                return []
             
-            # 计算CLIP分数
-            score = self.clip_scorer.score(vton_image_path, prompt)
-            
-            # 记录结果
+            # 记录结果，CLIP分数在全部变体生成后批量计算
             vton_result = {
                 "path": vton_image_path,
-                "score": score,
+                "score": 0.0,
                 "prompt": prompt
             }
             
             vton_results.append(vton_result)
         
+        # 批量计算CLIP分数，启用翻译时使用英文提示词
+        clip_prompt = prompt_translator_instance.translate(prompt) if PROMPT_TRANSLATION_ENABLED else prompt
+        scores = self.clip_scorer.score_batch([result["path"] for result in vton_results], clip_prompt,
+                                              category=category)
+        for vton_result, score in zip(vton_results, scores):
+            vton_result["score"] = score
+        if stats is not None:
+            stats["variation_scores"] = list(scores)
+        
         # 获取类别对应的评分阈值
-        high_threshold = VTON_CLIP_SCORE_HIGH_THRESHOLD.get(category, 0.8)
-        low_threshold = VTON_CLIP_SCORE_LOW_THRESHOLD.get(category, 0.7)
+        high_threshold = VTON_CLIP_SCORE_HIGH_THRESHOLD.get(category, 0.7)
+        low_threshold = VTON_CLIP_SCORE_LOW_THRESHOLD.get(category, 0.55)
         
         # 筛选高评分结果
         high_score_results = [result for result in vton_results if result["score"] >= high_threshold]
@@ -174,15 +214,90 @@ class FluxVTON:
         
         return high_score_results
 
-    def run_vton(self, garment_info: Dict, human_image_path: str, gender: str = "female") -> Dict:
-        """虚拟试穿主函数"""
+    def _run_garment(self, garment: Dict, human_image_path: str, prompt: str, category: str, gender: str,
+                     output_dir: str, cancel_token: Optional[CancellationToken] = None) -> Optional[Dict]:
+        """对单件服装进行多轮试穿迭代，返回该服装的最佳结果，没有结果时返回None"""
+        garment_image_path = garment.get("path")
+        if not garment_image_path or not os.path.exists(garment_image_path):
+            return None
+        
+        # 创建服装专属输出目录，目录名带运行ID，重复运行不会覆盖之前的结果
+        run_id = uuid.uuid4().hex
+        garment_output_dir = os.path.join(output_dir, f"garment_{garment.get('id', 0)}_{run_id[:8]}")
+        os.makedirs(garment_output_dir, exist_ok=True)
+        
+        # 进行多轮迭代优化
+        best_result = None
+        current_iteration = 0
+        stopped_early = False
+        
+        while current_iteration < MAX_FLUX_VTON_ITERATIONS and not is_cancelled(cancel_token):
+            print(f"服装 {garment.get('id', 0)} 虚拟试穿迭代 {current_iteration + 1}/{MAX_FLUX_VTON_ITERATIONS}...")
+            
+            # 进行单次试穿
+            iteration_stats = {}
+            vton_results = self.pick_vton_once(
+                garment_image_path=garment_image_path,
+                human_image_path=human_image_path,
+                prompt=prompt,
+                output_dir=garment_output_dir,
+                category=category,
+                gender=gender,
+                num_variations=VTON_NUM_IMAGES,
+                cancel_token=cancel_token,
+                stats=iteration_stats,
+                iteration=current_iteration
+            )
+            if attempt_log_instance is not None and "variation_scores" in iteration_stats:
+                attempt_log_instance.log_attempts("vton", run_id, category, current_iteration,
+                                                  iteration_stats["variation_scores"])
+            
+            # 更新最佳结果
+            if vton_results:
+                # 选择评分最高的结果
+                vton_results.sort(key=lambda x: x["score"], reverse=True)
+                current_best = vton_results[0]
+                
+                if best_result is None or current_best["score"] > best_result["score"]:
+                    best_result = current_best
+                
+                # 如果达到高评分阈值，可以提前结束迭代
+                if current_best["score"] >= VTON_CLIP_SCORE_HIGH_THRESHOLD.get(category, 0.7):
+                    stopped_early = True
+                    current_iteration += 1
+                    break
+            
+            current_iteration += 1
+        
+        if attempt_log_instance is not None:
+            attempt_log_instance.log_run("vton", run_id, category, VTON_CLIP_SCORE_HIGH_THRESHOLD.get(category, 0.7),
+                                         MAX_FLUX_VTON_ITERATIONS, VTON_NUM_IMAGES, current_iteration, stopped_early,
+                                         cancelled=is_cancelled(cancel_token))
+        
+        if best_result is None:
+            return None
+        return {
+            "garment_id": garment.get("id", 0),
+            "vton_path": best_result["path"],
+            "score": best_result["score"],
+            "relative_path": os.path.relpath(best_result["path"], STATIC_FOLDER)
+        }
+
+    def run_vton(self, garment_info: Dict, human_image_path: str, gender: str = "female",
+                 cancel_token: Optional[CancellationToken] = None) -> Dict:
+        """虚拟试穿主函数，取消令牌被触发时尽快停止
+
+        各件服装并发试穿，同时进行的服装数不超过VTON_MAX_PARALLEL_GARMENTS，管道本身的并发由PipelineSlot限制，
+        因此一件服装占用管道时，其他服装的CLIP评分等本地计算可以同时进行。
+        单件服装出错不影响其他服装，结果按服装的输入顺序合并。
+        """
         # 获取服装信息
         category = garment_info.get("category", "upper_body")
         prompt = garment_info.get("prompt", "简约风格的白色T恤")
         garments = garment_info.get("garments", [])
         
         # 创建输出目录
-        output_dir = os.path.join(STATIC_FOLDER, "vton", f"{category}_{hash(prompt)[:8]}")
+        output_dir = os.path.join(STATIC_FOLDER, "vton", f"{category}_{text_digest(prompt)[:8]}")
         os.makedirs(output_dir, exist_ok=True)
         
         # 初始化结果
@@ -191,64 +306,35 @@ class FluxVTON:
             "prompt": prompt,
             "vton_results": []
         }
+        if not garments:
+            return result
         
-        # 为每件服装进行虚拟试穿
-        for garment in garments:
-            garment_image_path = garment.get("path")
-            if not garment_image_path or not os.path.exists(garment_image_path):
-                continue
-            
-            # 创建服装专属输出目录
-            garment_output_dir = os.path.join(output_dir, f"garment_{garment.get('id', 0)}")
-            os.makedirs(garment_output_dir, exist_ok=True)
-            
-            # 进行多轮迭代优化
-            best_result = None
-            current_iteration = 0
-            
-            while current_iteration < MAX_FLUX_VTON_ITERATIONS:
-                print(f"虚拟试穿迭代 {current_iteration + 1}/{MAX_FLUX_VTON_ITERATIONS}...")
-                
-                # 进行单次试穿
-                vton_results = self.pick_vton_once(
-                    garment_image_path=garment_image_path,
-                    human_image_path=human_image_path,
-                    prompt=prompt,
-                    output_dir=garment_output_dir,
-                    category=category,
-                    gender=gender
-                )
-                
-                # 更新最佳结果
-                if vton_results:
-                    # 选择评分最高的结果
-                    vton_results.sort(key=lambda x: x["score"], reverse=True)
-                    current_best = vton_results[0]
-                    
-                    if best_result is None or current_best["score"] > best_result["score"]:
-                        best_result = current_best
-                    
-                    # 如果达到高评分阈值，可以提前结束迭代
-                    if current_best["score"] >= VTON_CLIP_SCORE_HIGH_THRESHOLD.get(category, 0.8):
-                        break
-                
-                current_iteration += 1
-            
-            # 如果有最佳结果，添加到返回结果中
-            if best_result:
-                result["vton_results"].append({
-                    "garment_id": garment.get("id", 0),
-                    "vton_path": best_result["path"],
-                    "score": best_result["score"],
-                    "relative_path": os.path.relpath(best_result["path"], STATIC_FOLDER)
-                })
+        # 为每件服装并发进行虚拟试穿
+        garment_results: List[Optional[Dict]] = [None] * len(garments)
+        max_workers = max(1, min(VTON_MAX_PARALLEL_GARMENTS, len(garments)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vton_garment") as executor:
+            futures = {
+                executor.submit(self._run_garment, garment, human_image_path, prompt, category, gender,
+                                output_dir, cancel_token): index
+                for index, garment in enumerate(garments)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    garment_results[index] = future.result()
+                except Exception as e:
+                    print(f"服装 {garments[index].get('id', index)} 虚拟试穿时出错: {e}")
         
+        if is_cancelled(cancel_token):
+            print("虚拟试穿已取消")
+        result["vton_results"] = [garment_result for garment_result in garment_results if garment_result]
         return result
 
 # 创建全局实例
 flux_vton_instance = FluxVTON()
 
 # 导出函数
-def run_vton(garment_info: Dict, human_image_path: str, gender: str = "female") -> Dict:
+def run_vton(garment_info: Dict, human_image_path: str, gender: str = "female",
+             cancel_token: Optional[CancellationToken] = None) -> Dict:
     """虚拟试穿主函数"""
-    return flux_vton_instance.run_vton(garment_info, human_image_path, gender)
\ No newline at end of file
+    return flux_vton_instance.run_vton(garment_info, human_image_path, gender, cancel_token)
\ No newline at end of file
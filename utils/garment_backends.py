@@ -0,0 +1,332 @@
+import os
+import math
+import threading
+import torch
+import logging
+from PIL import Image
+from typing import Dict, Optional
+from diffusers import FluxPipeline, AutoPipelineForText2Image, AutoencoderTiny
+from .cancellation import CancellationToken, OperationCancelledError, PipelineSlot, is_cancelled
+from config.config import GARMENT_PREVIEW_ENABLED, GARMENT_PREVIEW_VAE, GARMENT_SEARCH_NOISE_STRENGTH
+from config.config import GENERATION_PIPELINE_SLOTS
+
+logger = logging.getLogger(__name__)
+
+
+class GarmentBackend:
+    """服装图像生成后端基类
+
+    每个后端声明预计的单张生成耗时（秒）和内存占用（MB），
+    供配置选择和调度参考。模型在首次使用时才加载。
+    """
+    name = "base"
+    description = ""
+    expected_latency = 0.0  # 单张图像预计耗时（秒）
+    expected_memory = 0  # 预计内存/显存占用（MB）
+    default_width = 768
+    default_height = 1024
+    supports_latents = False  # 是否支持传入初始噪声latent（用于种子搜索）
+    supports_preview = False  # 是否支持轻量VAE预览解码
+
+    def __init__(self):
+        self.pipeline = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        # 限制同时使用管道的任务数量，被取消的任务立即释放占用
+        self.slot = PipelineSlot(GENERATION_PIPELINE_SLOTS)
+
+    def load(self) -> bool:
+        """加载模型，返回是否可用"""
+        with self._load_lock:
+            if not self._loaded:
+                self._loaded = True
+                try:
+                    self.pipeline = self._load_pipeline()
+                except Exception as e:
+                    logger.error(f"加载生成后端 {self.name} 时出错: {e}")
+                    self.pipeline = None
+        return self.pipeline is not None
+
+    def _load_pipeline(self):
+        raise NotImplementedError
+
+    def is_available(self) -> bool:
+        return self.load()
+
+    def info(self) -> Dict:
+        """返回后端的声明信息"""
+        return {
+            "name": self.name,
+            "description": self.description,
+            "expected_latency": self.expected_latency,
+            "expected_memory": self.expected_memory,
+            "default_size": (self.default_width, self.default_height),
+            "loaded": self.pipeline is not None
+        }
+
+    def generate(self, prompt: str, negative_prompt: str, output_path: str,
+                 width: Optional[int] = None, height: Optional[int] = None,
+                 latents: Optional[torch.Tensor] = None,
+                 cancel_token: Optional[CancellationToken] = None) -> Optional[str]:
+        """生成单张图像并保存，失败或取消时返回None"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _make_step_callback(cancel_token: Optional[CancellationToken]):
+        """构造每步去噪后检查取消令牌的回调，取消时中止管道调用"""
+        def step_callback(pipe, step, timestep, callback_kwargs):
+            if is_cancelled(cancel_token):
+                raise OperationCancelledError(f"第 {step} 步去噪后取消生成")
+            return callback_kwargs
+        return step_callback
+
+    def make_initial_latents(self, seed: int, width: Optional[int] = None,
+                             height: Optional[int] = None) -> Optional[torch.Tensor]:
+        """根据种子构造去噪起点的噪声latent，不支持时返回None"""
+        return None
+
+    def perturb_latents(self, base_latents: torch.Tensor, seed: int,
+                        strength: float = GARMENT_SEARCH_NOISE_STRENGTH) -> torch.Tensor:
+        """在给定噪声附近局部重采样：按球面插值混入新噪声，保持噪声方差不变"""
+        generator = torch.Generator(device="cpu").manual_seed(seed)
+        fresh = torch.randn(base_latents.shape, generator=generator, dtype=torch.float32)
+        theta = max(0.0, min(1.0, strength)) * math.pi / 2
+        mixed = math.cos(theta) * base_latents.float().cpu() + math.sin(theta) * fresh
+        return mixed.to(device=base_latents.device, dtype=base_latents.dtype)
+
+
+class FluxGarmentBackend(GarmentBackend):
+    """FLUX.1-schnell生成后端，适合GPU环境，质量最高"""
+    name = "flux"
+    description = "FLUX.1-schnell, 768x1024"
+    expected_latency = 90.0
+    expected_memory = 24000
+    supports_latents = True
+    supports_preview = True
+
+    def __init__(self):
+        super().__init__()
+        self.preview_vae = None
+
+    def _load_pipeline(self):
+        # 首先尝试加载本地模型
+        local_model_path = os.path.join(os.path.dirname(__file__), "FLUX.1-schnell")
+        if os.path.exists(local_model_path):
+            logger.info(f"尝试从本地路径加载Flux模型: {local_model_path}")
+            pipeline = FluxPipeline.from_pretrained(local_model_path, torch_dtype=torch.float16, local_files_only=True)
+        else:
+            # 尝试从Hugging Face加载（使用镜像）
+            logger.info("尝试从Hugging Face加载Flux模型")
+            pipeline = FluxPipeline.from_pretrained("black-forest-labs/FLUX.1-schnell", torch_dtype=torch.float16)
+
+        # 启用模型CPU卸载以节省内存
+        pipeline.enable_model_cpu_offload()
+        logger.info("Flux模型加载成功，已启用CPU卸载")
+
+        # 加载轻量VAE，用于低成本解码预览图
+        if GARMENT_PREVIEW_ENABLED:
+            self._load_preview_vae()
+        return pipeline
+
+    def _load_preview_vae(self) -> None:
+        """加载与Flux latent空间兼容的轻量VAE"""
+        try:
+            local_vae_path = os.path.join(os.path.dirname(__file__), "taef1")
+            if os.path.exists(local_vae_path):
+                logger.info(f"尝试从本地路径加载预览VAE: {local_vae_path}")
+                self.preview_vae = AutoencoderTiny.from_pretrained(local_vae_path, torch_dtype=torch.float16, local_files_only=True)
+            else:
+                logger.info(f"尝试从Hugging Face加载预览VAE: {GARMENT_PREVIEW_VAE}")
+                self.preview_vae = AutoencoderTiny.from_pretrained(GARMENT_PREVIEW_VAE, torch_dtype=torch.float16)
+            self.preview_vae.to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
+            logger.info("预览VAE加载成功")
+        except Exception as e:
+            logger.error(f"加载预览VAE时出错，将回退到完整解码: {e}")
+            self.preview_vae = None
+
+    def has_preview(self) -> bool:
+        return self.pipeline is not None and self.preview_vae is not None
+
+    def _call_pipeline(self, prompt: str, negative_prompt: str, width: int, height: int,
+                       latents: Optional[torch.Tensor], output_type: str = "pil",
+                       cancel_token: Optional[CancellationToken] = None):
+        with self.slot.acquire(cancel_token):
+            return self.pipeline(
+                prompt=prompt,
+                negative_prompt=negative_prompt,
+                width=width,
+                height=height,
+                guidance_scale=3.0,
+                num_inference_steps=28,
+                latents=latents,
+                output_type=output_type,
+                callback_on_step_end=self._make_step_callback(cancel_token)
+            ).images
+
+    def generate(self, prompt: str, negative_prompt: str, output_path: str,
+                 width: Optional[int] = None, height: Optional[int] = None,
+                 latents: Optional[torch.Tensor] = None,
+                 cancel_token: Optional[CancellationToken] = None) -> Optional[str]:
+        try:
+            if not self.load():
+                logger.warning("Flux模型未初始化，无法生成图像")
+                return None
+
+            image = self._call_pipeline(prompt, negative_prompt, width or self.default_width,
+                                        height or self.default_height, latents, cancel_token=cancel_token)[0]
+            image.save(output_path)
+            return output_path
+        except OperationCancelledError as e:
+            logger.info(f"Flux生成已取消: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Flux生成图像时出错: {e}")
+            return None
+
+    def generate_latents(self, prompt: str, negative_prompt: str,
+                         width: Optional[int] = None, height: Optional[int] = None,
+                         latents: Optional[torch.Tensor] = None,
+                         cancel_token: Optional[CancellationToken] = None) -> Optional[torch.Tensor]:
+        """只运行去噪过程，返回未解码的打包latent"""
+        try:
+            if not self.load():
+                logger.warning("Flux模型未初始化，无法生成latent")
+                return None
+            return self._call_pipeline(prompt, negative_prompt, width or self.default_width,
+                                       height or self.default_height, latents, output_type="latent",
+                                       cancel_token=cancel_token)
+        except OperationCancelledError as e:
+            logger.info(f"Flux生成已取消: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"生成latent时出错: {e}")
+            return None
+
+    def _decode_latents(self, vae, latents: torch.Tensor, width: int, height: int) -> Image.Image:
+        """将Flux打包latent解包并用指定VAE解码为PIL图像"""
+        latents = self.pipeline._unpack_latents(latents, height, width, self.pipeline.vae_scale_factor)
+        scaling_factor = getattr(vae.config, "scaling_factor", 1.0)
+        shift_factor = getattr(vae.config, "shift_factor", None) or 0.0
+        latents = latents / scaling_factor + shift_factor
+        latents = latents.to(device=vae.device, dtype=vae.dtype)
+        with torch.no_grad():
+            image = vae.decode(latents, return_dict=False)[0]
+        return self.pipeline.image_processor.postprocess(image, output_type="pil")[0]
+
+    def decode_preview(self, latents: torch.Tensor, width: Optional[int] = None,
+                       height: Optional[int] = None) -> Optional[Image.Image]:
+        """使用轻量VAE解码预览图，预览图只在内存中用于本地打分"""
+        try:
+            return self._decode_latents(self.preview_vae, latents, width or self.default_width,
+                                        height or self.default_height)
+        except Exception as e:
+            logger.error(f"解码预览图时出错: {e}")
+            return None
+
+    def decode_full(self, latents: torch.Tensor, output_path: str, width: Optional[int] = None,
+                    height: Optional[int] = None) -> Optional[str]:
+        """使用Flux自带VAE完整解码并保存图像"""
+        try:
+            with self.slot.acquire():
+                image = self._decode_latents(self.pipeline.vae, latents, width or self.default_width,
+                                             height or self.default_height)
+            image.save(output_path)
+            logger.info(f"成功解码图像并保存至: {output_path}")
+            return output_path
+        except Exception as e:
+            logger.error(f"完整解码图像时出错: {e}")
+            return None
+
+    def make_initial_latents(self, seed: int, width: Optional[int] = None,
+                             height: Optional[int] = None) -> Optional[torch.Tensor]:
+        try:
+            if not self.load():
+                return None
+            generator = torch.Generator(device="cpu").manual_seed(seed)
+            num_channels_latents = self.pipeline.transformer.config.in_channels // 4
+            latents, _ = self.pipeline.prepare_latents(
+                1, num_channels_latents, height or self.default_height, width or self.default_width,
+                torch.float16, self.pipeline._execution_device, generator
+            )
+            return latents
+        except Exception as e:
+            logger.error(f"构造初始噪声时出错: {e}")
+            return None
+
+
+class SDTurboGarmentBackend(GarmentBackend):
+    """SD-Turbo蒸馏模型生成后端，单步推理，适合CPU环境的交互式使用"""
+    name = "sd_turbo"
+    description = "stabilityai/sd-turbo, 1 step, 384x512"
+    expected_latency = 4.0
+    expected_memory = 3500
+    default_width = 384
+    default_height = 512
+    supports_latents = True
+
+    def _load_pipeline(self):
+        # CPU上使用float32，GPU上使用float16
+        use_cuda = torch.cuda.is_available()
+        dtype = torch.float16 if use_cuda else torch.float32
+        local_model_path = os.path.join(os.path.dirname(__file__), "sd-turbo")
+        if os.path.exists(local_model_path):
+            logger.info(f"尝试从本地路径加载SD-Turbo模型: {local_model_path}")
+            pipeline = AutoPipelineForText2Image.from_pretrained(local_model_path, torch_dtype=dtype, local_files_only=True)
+        else:
+            logger.info("尝试从Hugging Face加载SD-Turbo模型")
+            pipeline = AutoPipelineForText2Image.from_pretrained("stabilityai/sd-turbo", torch_dtype=dtype)
+        pipeline.to("cuda" if use_cuda else "cpu")
+        pipeline.set_progress_bar_config(disable=True)
+        logger.info("SD-Turbo模型加载成功")
+        return pipeline
+
+    def generate(self, prompt: str, negative_prompt: str, output_path: str,
+                 width: Optional[int] = None, height: Optional[int] = None,
+                 latents: Optional[torch.Tensor] = None,
+                 cancel_token: Optional[CancellationToken] = None) -> Optional[str]:
+        try:
+            if not self.load():
+                logger.warning("SD-Turbo模型未初始化，无法生成图像")
+                return None
+
+            # SD-Turbo为对抗蒸馏模型，不使用CFG和负面提示词
+            with self.slot.acquire(cancel_token):
+                image = self.pipeline(
+                    prompt=prompt,
+                    width=width or self.default_width,
+                    height=height or self.default_height,
+                    guidance_scale=0.0,
+                    num_inference_steps=1,
+                    latents=latents,
+                    callback_on_step_end=self._make_step_callback(cancel_token)
+                ).images[0]
+            image.save(output_path)
+            return output_path
+        except OperationCancelledError as e:
+            logger.info(f"SD-Turbo生成已取消: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"SD-Turbo生成图像时出错: {e}")
+            return None
+
+    def make_initial_latents(self, seed: int, width: Optional[int] = None,
+                             height: Optional[int] = None) -> Optional[torch.Tensor]:
+        try:
+            if not self.load():
+                return None
+            generator = torch.Generator(device="cpu").manual_seed(seed)
+            scale = self.pipeline.vae_scale_factor
+            shape = (1, self.pipeline.unet.config.in_channels,
+                     (height or self.default_height) // scale, (width or self.default_width) // scale)
+            latents = torch.randn(shape, generator=generator, dtype=torch.float32)
+            return latents.to(device=self.pipeline.device, dtype=self.pipeline.unet.dtype)
+        except Exception as e:
+            logger.error(f"构造初始噪声时出错: {e}")
+            return None
+
+
+# 可用的生成后端
+GARMENT_BACKEND_CLASSES = {
+    FluxGarmentBackend.name: FluxGarmentBackend,
+    SDTurboGarmentBackend.name: SDTurboGarmentBackend,
+}
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import shutil
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+from .metrics import ClipScore, get_shared_clip_scorer
+from .digest import file_digest
+from .prompt_translation import prompt_translator_instance
+from config.config import STATIC_FOLDER, GARMENT_VQA_LOW_THRESHOLD, PROMPT_TRANSLATION_ENABLED
+from config.config import GARMENT_LIBRARY_ENABLED, GARMENT_LIBRARY_SIMILARITY_THRESHOLD, GARMENT_LIBRARY_MIN_HITS
+from config.config import GARMENT_LIBRARY_IMAGE_SIMILARITY_THRESHOLD
+
+
+class GarmentLibrary:
+    """持久化的服装图像库
+
+    每张生成或检索得到的服装图像按文件内容摘要复制到images目录（内容寻址，生成目录中的文件被覆盖也不受影响），
+    连同CLIP图像特征、提示词特征、提示词、类别和VQA分数追加写入library.jsonl，相同内容的图像只记录一次。
+    查询时用提示词的CLIP文本特征与库中提示词特征计算余弦相似度，超过类别阈值的记录再用提示词与库中图像特征的
+    相似度校验，两者都满足的已有服装可以直接复用，无需重新生成。
+    启用提示词翻译时，提示词特征按翻译后的英文提示词计算（CLIP文本编码器只在英文上训练）。
+    """
+
+    def __init__(self, library_dir: Optional[str] = None, clip_scorer: Optional[ClipScore] = None):
+        self.library_dir = library_dir or os.path.join(STATIC_FOLDER, "garment_library")
+        self.index_path = os.path.join(self.library_dir, "library.jsonl")
+        self.images_dir = os.path.join(self.library_dir, "images")
+        # 默认与其他模块共享同一个CLIP模型和特征缓存
+        self.clip_scorer = clip_scorer or get_shared_clip_scorer()
+        self._lock = threading.Lock()
+        self.records: List[Dict] = []
+        self._digests = set()
+        self._prompt_matrix = np.zeros((0, 0), dtype=np.float32)
+        self._image_matrix = np.zeros((0, 0), dtype=np.float32)
+        os.makedirs(self.images_dir, exist_ok=True)
+        self.load()
+
+    def load(self) -> None:
+        """从磁盘加载服装库索引"""
+        records = []
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            print("跳过服装库中损坏的记录")
+                            continue
+                        # 旧格式记录按路径存储，文件可能已被覆盖，特征无法校验，不再使用
+                        if "digest" not in record:
+                            continue
+                        records.append(record)
+        except Exception as e:
+            print(f"加载服装库时出错: {e}")
+
+        with self._lock:
+            self.records = []
+            self._digests = set()
+            self._prompt_matrix = np.zeros((0, 0), dtype=np.float32)
+            self._image_matrix = np.zeros((0, 0), dtype=np.float32)
+            for record in records:
+                self._append_in_memory(record)
+        print(f"服装库已加载 {len(self.records)} 条记录")
+
+    def _append_in_memory(self, record: Dict) -> None:
+        """将记录加入内存索引，调用方需持有锁"""
+        prompt_embedding = np.asarray(record["prompt_embedding"], dtype=np.float32)[None, :]
+        image_embedding = np.asarray(record["image_embedding"], dtype=np.float32)[None, :]
+        if self._prompt_matrix.size == 0:
+            self._prompt_matrix = prompt_embedding
+            self._image_matrix = image_embedding
+        else:
+            self._prompt_matrix = np.vstack([self._prompt_matrix, prompt_embedding])
+            self._image_matrix = np.vstack([self._image_matrix, image_embedding])
+        self.records.append(record)
+        self._digests.add(record["digest"])
+
+    @staticmethod
+    def clip_prompt(prompt: str) -> str:
+        """计算CLIP文本特征使用的提示词"""
+        return prompt_translator_instance.translate(prompt) if PROMPT_TRANSLATION_ENABLED else prompt
+
+    def _store_image(self, image_path: str, digest: str) -> str:
+        """将图像按内容摘要复制到库目录，返回库中的路径"""
+        extension = os.path.splitext(image_path)[1].lower() or ".png"
+        stored_path = os.path.join(self.images_dir, digest[:2], f"{digest}{extension}")
+        if not os.path.exists(stored_path):
+            os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+            tmp_path = f"{stored_path}.tmp"
+            shutil.copyfile(image_path, tmp_path)
+            os.replace(tmp_path, stored_path)
+        return stored_path
+
+    def add(self, image_path: str, prompt: str, category: str, score: float, source: str = "model") -> Optional[Dict]:
+        """增量插入一张服装图像，内容相同的图像只记录一次"""
+        try:
+            if not os.path.exists(image_path):
+                return None
+            digest = file_digest(image_path)
+            if digest in self._digests:
+                return None
+            # 先复制再计算特征，保证记录中的特征与库中的文件一致
+            stored_path = self._store_image(image_path, digest)
+
+            image_embedding = self.clip_scorer.image_embedding(stored_path)
+            clip_prompt = self.clip_prompt(prompt)
+            prompt_embedding = self.clip_scorer.text_embedding(clip_prompt)
+            if image_embedding is None or prompt_embedding is None:
+                return None
+
+            record = {
+                "path": stored_path,
+                "digest": digest,
+                "prompt": prompt,
+                "clip_prompt": clip_prompt,
+                "category": category,
+                "score": float(score),
+                "source": source,
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "prompt_embedding": [round(float(x), 6) for x in prompt_embedding],
+                "image_embedding": [round(float(x), 6) for x in image_embedding]
+            }
+
+            with self._lock:
+                if digest in self._digests:
+                    return None
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._append_in_memory(record)
+            return record
+        except Exception as e:
+            print(f"写入服装库时出错: {e}")
+            return None
+
+    def query(self, prompt: str, category: str, top_k: int = 3,
+              threshold: Optional[float] = None, image_threshold: Optional[float] = None) -> List[Dict]:
+        """按提示词相似度查询同类别的已有服装，只返回超过相似度阈值、提示词与图像相符且VQA分数合格的记录"""
+        try:
+            if not self.records:
+                return []
+            query_embedding = self.clip_scorer.text_embedding(self.clip_prompt(prompt))
+            if query_embedding is None:
+                return []
+
+            if threshold is None:
+                threshold = GARMENT_LIBRARY_SIMILARITY_THRESHOLD.get(category, 0.92)
+            if image_threshold is None:
+                image_threshold = GARMENT_LIBRARY_IMAGE_SIMILARITY_THRESHOLD.get(category, 0.25)
+            min_score = GARMENT_VQA_LOW_THRESHOLD.get(category, 0.65)
+
+            with self._lock:
+                records = list(self.records)
+                similarities = self._prompt_matrix @ query_embedding
+                image_similarities = self._image_matrix @ query_embedding
+
+            matches = []
+            for index in np.argsort(-similarities):
+                similarity = float(similarities[index])
+                if similarity < threshold:
+                    break
+                record = records[index]
+                if record["category"] != category or record["score"] < min_score:
+                    continue
+                # 提示词相近但图像与当前提示词不符（例如颜色不同）的记录不复用
+                image_similarity = float(image_similarities[index])
+                if image_similarity < image_threshold:
+                    continue
+                if not os.path.exists(record["path"]):
+                    continue
+                matches.append({
+                    "path": record["path"],
+                    "score": record["score"],
+                    "prompt": record["prompt"],
+                    "category": record["category"],
+                    "similarity": similarity,
+                    "image_similarity": image_similarity
+                })
+
+            # 相似度满足要求的记录中优先返回VQA分数高的
+            matches.sort(key=lambda x: x["score"], reverse=True)
+            return matches[:top_k]
+        except Exception as e:
+            print(f"查询服装库时出错: {e}")
+            return []
+
+    def lookup_garments(self, garment_description: Dict) -> Optional[Dict]:
+        """查询服装库，命中数量足够时返回与description_to_garment相同格式的结果，否则返回None"""
+        category = garment_description.get("category", "upper_body")
+        prompt = garment_description.get("prompt", "简约风格的白色T恤")
+        matches = self.query(prompt, category, top_k=max(3, GARMENT_LIBRARY_MIN_HITS))
+        if len(matches) < GARMENT_LIBRARY_MIN_HITS:
+            return None
+
+        print(f"服装库命中 {len(matches)} 张图像，跳过生成")
+        return {
+            "category": category,
+            "prompt": prompt,
+            "garments": [
+                {
+                    "id": i,
+                    "path": match["path"],
+                    "score": match["score"],
+                    "relative_path": os.path.relpath(match["path"], STATIC_FOLDER),
+                    "similarity": match["similarity"]
+                }
+                for i, match in enumerate(matches)
+            ],
+            "source": "library"
+        }
+
+
+# 创建全局实例，未启用服装库时为None
+garment_library_instance = GarmentLibrary() if GARMENT_LIBRARY_ENABLED else None
+
+
+def add_to_garment_library(image_info: Dict, source: str = "model") -> None:
+    """将评分后的服装图像信息写入服装库（未启用时忽略），本地备选评分的图像没有真实的VQA分数，不写入"""
+    if garment_library_instance is None or image_info.get("vqa_fallback"):
+        return
+    garment_library_instance.add(
+        image_info["path"], image_info.get("prompt", ""), image_info.get("category", "upper_body"),
+        image_info.get("score", 0.0), source
+    )
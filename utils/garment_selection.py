@@ -0,0 +1,47 @@
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from .metrics import ClipScore
+
+
+def select_diverse_garments(images: List[Dict], clip_scorer: ClipScore, k: int = 3,
+                            mmr_lambda: float = 0.7,
+                            duplicate_threshold: float = 0.95) -> Tuple[List[Dict], int]:
+    """按最大边际相关性（MMR）从候选中选择k张服装图像，返回所选图像和被抑制的近重复图像数量
+
+    每一步选择 mmr_lambda * VQA分数 - (1 - mmr_lambda) * 与已选图像的最大CLIP图像特征相似度 最大的候选，
+    与已选图像相似度达到duplicate_threshold的候选视为近重复直接丢弃。无法计算特征的图像按与其他图像不相似处理。
+    """
+    if not images:
+        return [], 0
+
+    embeddings: List[Optional[np.ndarray]] = [clip_scorer.image_embedding(image["path"]) for image in images]
+
+    def similarity(i: int, j: int) -> float:
+        if embeddings[i] is None or embeddings[j] is None:
+            return 0.0
+        return float(np.dot(embeddings[i], embeddings[j]))
+
+    remaining = list(range(len(images)))
+    selected: List[int] = []
+    max_similarity = {i: 0.0 for i in remaining}
+    suppressed = 0
+
+    while remaining and len(selected) < k:
+        best = max(remaining, key=lambda i: (
+            mmr_lambda * images[i]["score"] - (1 - mmr_lambda) * max_similarity[i], images[i]["score"]))
+        remaining.remove(best)
+        selected.append(best)
+
+        # 更新剩余候选与已选集合的最大相似度，并丢弃近重复候选
+        kept = []
+        for i in remaining:
+            max_similarity[i] = max(max_similarity[i], similarity(i, best))
+            if max_similarity[i] >= duplicate_threshold:
+                suppressed += 1
+            else:
+                kept.append(i)
+        remaining = kept
+
+    for i in selected:
+        images[i]["max_similarity"] = max_similarity[i]
+    return [images[i] for i in selected], suppressed
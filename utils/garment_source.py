@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Optional
+from .model_based_text2garment import text2garment_generator_instance
+from .garment_library import garment_library_instance
+from .cancellation import CancellationToken
+from config.config import OUTPUT_FOLDER, GARMENT_VQA_HIGH_THRESHOLD
+from config.config import GARMENT_SOURCE_MODE, HEDGED_MIN_ACCEPTABLE_GARMENTS, HEDGED_TIMEOUT
+
+
+def get_retrieval_source():
+    """按需导入网络检索来源，默认的模型生成模式不加载检索依赖"""
+    from .text2garment import text2garment_instance
+    return text2garment_instance
+
+
+class HedgedGarmentSource:
+    """同时启动网络检索和模型生成两个服装来源，采用最先得到足够高分图像的结果"""
+
+    def __init__(self):
+        self.stats_path = os.path.join(OUTPUT_FOLDER, "garment_source_stats.json")
+        self._lock = threading.Lock()
+        self.stats = self._load_stats()
+
+    def _load_stats(self) -> Dict:
+        """加载历史胜出统计"""
+        try:
+            if os.path.exists(self.stats_path):
+                with open(self.stats_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"加载服装来源统计时出错: {e}")
+        return {}
+
+    def _record_win(self, category: str, winner: str, elapsed: float) -> None:
+        """记录每个类别中各来源的胜出次数和平均耗时"""
+        with self._lock:
+            category_stats = self.stats.setdefault(category, {})
+            source_stats = category_stats.setdefault(winner, {"wins": 0, "total_time": 0.0})
+            source_stats["wins"] += 1
+            source_stats["total_time"] += elapsed
+            source_stats["avg_time"] = source_stats["total_time"] / source_stats["wins"]
+            try:
+                with open(self.stats_path, "w", encoding="utf-8") as f:
+                    json.dump(self.stats, f, ensure_ascii=False, indent=2)
+            except Exception as e:
+                print(f"保存服装来源统计时出错: {e}")
+
+    @staticmethod
+    def get_sources() -> Dict:
+        """参与竞速的服装来源，检索来源在首次竞速时才导入"""
+        return {
+            "retrieval": get_retrieval_source(),
+            "model": text2garment_generator_instance
+        }
+
+    def get_stats(self) -> Dict:
+        """返回各类别的来源胜出统计"""
+        with self._lock:
+            return json.loads(json.dumps(self.stats))
+
+    def count_acceptable(self, result: Dict, category: str) -> int:
+        """统计结果中达到类别高评分阈值的图像数量"""
+        high_threshold = GARMENT_VQA_HIGH_THRESHOLD.get(category, 0.75)
+        return sum(1 for garment in result.get("garments", []) if garment.get("score", 0.0) >= high_threshold)
+
+    def description_to_garment(self, garment_description: Dict,
+                               cancel_token: Optional[CancellationToken] = None) -> Dict:
+        """并发运行两个来源，任一来源得到足够高分图像即返回并取消另一来源"""
+        category = garment_description.get("category", "upper_body")
+        # 子令牌既会被调用方取消，也会在决出胜者后被本方法取消
+        race_token = cancel_token.child() if cancel_token is not None else CancellationToken()
+        start_time = time.perf_counter()
+
+        sources = self.get_sources()
+        executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="hedged_garment")
+        futures = {
+            executor.submit(source.description_to_garment, garment_description, race_token): name
+            for name, source in sources.items()
+        }
+
+        winner = None
+        best_result = None
+        best_name = None
+        pending = set(futures)
+        deadline = start_time + HEDGED_TIMEOUT
+        try:
+            while pending and winner is None and not race_token.cancelled:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    print("服装来源竞速超时，使用已完成来源中的最佳结果")
+                    break
+                # 短间隔等待，以便及时响应调用方的取消
+                done, pending = wait(pending, timeout=min(remaining, 0.5), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"服装来源 {name} 出错: {e}")
+                        continue
+
+                    acceptable = self.count_acceptable(result, category)
+                    print(f"服装来源 {name} 完成，达标图像 {acceptable} 张，耗时 {time.perf_counter() - start_time:.1f} 秒")
+                    if acceptable >= HEDGED_MIN_ACCEPTABLE_GARMENTS:
+                        winner = name
+                        best_result, best_name = result, name
+                        break
+                    if best_result is None or acceptable > self.count_acceptable(best_result, category):
+                        best_result, best_name = result, name
+        finally:
+            # 取消较慢的来源，不等待其结束
+            race_token.cancel("其他服装来源已胜出")
+            executor.shutdown(wait=False)
+
+        elapsed = time.perf_counter() - start_time
+        if cancel_token is None or not cancel_token.cancelled:
+            self._record_win(category, winner or "none", elapsed)
+
+        if best_result is None:
+            return {
+                "category": category,
+                "prompt": garment_description.get("prompt", ""),
+                "garments": [],
+                "source": None
+            }
+        best_result["source"] = best_name
+        return best_result
+
+
+# 创建全局实例
+hedged_garment_source_instance = HedgedGarmentSource()
+
+
+# 导出函数
+def description_to_garment(garment_description: Dict, cancel_token: Optional[CancellationToken] = None) -> Dict:
+    """先查询服装库，未命中时按GARMENT_SOURCE_MODE选择服装来源：model（模型生成）、retrieval（网络检索）或hedged（两者竞速）"""
+    if garment_library_instance is not None and garment_description.get("use_library", True):
+        library_result = garment_library_instance.lookup_garments(garment_description)
+        if library_result is not None:
+            return library_result
+    
+    mode = garment_description.get("source_mode", GARMENT_SOURCE_MODE)
+    if mode == "hedged":
+        return hedged_garment_source_instance.description_to_garment(garment_description, cancel_token)
+    if mode == "retrieval":
+        return get_retrieval_source().description_to_garment(garment_description, cancel_token)
+    return text2garment_generator_instance.description_to_garment(garment_description, cancel_token)
+
+
+def get_garment_source_stats() -> Dict:
+    """返回竞速模式下各类别的来源胜出统计"""
+    return hedged_garment_source_instance.get_stats()
@@ -0,0 +1,155 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional
+from config.config import HEDGING_ENABLED, HEDGING_PERCENTILE, HEDGING_MAX_RATIO, HEDGING_MIN_SAMPLES
+from config.config import HEDGING_WINDOW, HEDGING_MIN_DELAY, HEDGING_WORKERS
+
+# 延迟直方图的桶上界（秒），最后一个桶收集其余所有请求
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0]
+
+
+class LatencyHistogram:
+    """记录最近window次成功请求的延迟用于计算分位数，并按固定桶累计全部请求的延迟分布"""
+
+    def __init__(self, window: int = 200):
+        self._recent = deque(maxlen=max(1, window))
+        self._bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._recent.append(latency)
+            index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound), len(LATENCY_BUCKETS))
+            self._bucket_counts[index] += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._recent)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """返回最近延迟的第p百分位数（最近邻法），没有样本时返回None"""
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))
+        return samples[index]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            buckets = list(self._bucket_counts)
+        labels = [f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        return {
+            "samples": len(self),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": dict(zip(labels, buckets))
+        }
+
+
+class RequestHedger:
+    """对冲请求：请求超过近期延迟的第percentile百分位数仍未返回时，再发出一个相同的请求，采用先返回的结果
+
+    对冲请求数占总请求数的比例不超过max_ratio；样本数不足min_samples时不对冲。
+    admit可以对每次对冲做额外的准入判断（例如限流），返回False时放弃本次对冲。
+    未启用时只记录延迟直方图，请求在调用线程中直接执行。
+    """
+
+    def __init__(self, name: str, enabled: bool = False, percentile: float = 95.0, max_ratio: float = 0.1,
+                 min_samples: int = 20, window: int = 200, min_delay: float = 0.5, max_workers: int = 16):
+        self.name = name
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.histogram = LatencyHistogram(window)
+        self._executor = ThreadPoolExecutor(max_workers=max(2, max_workers), thread_name_prefix=f"{name}_hedge") \
+            if enabled else None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+
+    def hedge_delay(self) -> Optional[float]:
+        """当前的对冲等待时间，样本不足时返回None"""
+        if len(self.histogram) < self.min_samples:
+            return None
+        return max(self.min_delay, self.histogram.percentile(self.percentile))
+
+    def _allow_hedge(self) -> bool:
+        """检查对冲比例上限，允许时计入对冲次数"""
+        with self._lock:
+            if self.stats["hedged"] + 1 > self.max_ratio * self.stats["requests"]:
+                return False
+            self.stats["hedged"] += 1
+            return True
+
+    def _timed(self, fn: Callable, args, kwargs):
+        start_time = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.histogram.record(time.perf_counter() - start_time)
+        return result
+
+    def call(self, fn: Callable, *args, admit: Optional[Callable[[], bool]] = None, **kwargs):
+        """执行fn(*args, **kwargs)，需要时发出对冲请求；两个请求都失败时抛出先完成请求的异常"""
+        with self._lock:
+            self.stats["requests"] += 1
+        if not self.enabled:
+            return self._timed(fn, args, kwargs)
+
+        primary = self._executor.submit(self._timed, fn, args, kwargs)
+        delay = self.hedge_delay()
+        if delay is None:
+            return primary.result()
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._allow_hedge():
+            return primary.result()
+        if admit is not None and not admit():
+            with self._lock:
+                self.stats["hedged"] -= 1
+            return primary.result()
+
+        # 无法中断已发出的网络请求，较慢的请求在后台完成后被丢弃
+        hedge = self._executor.submit(self._timed, fn, args, kwargs)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.stats["hedge_wins"] += 1
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            "name": self.name,
+            "enabled": self.enabled,
+            "hedge_ratio": stats["hedged"] / stats["requests"] if stats["requests"] else 0.0,
+            "hedge_delay": self.hedge_delay(),
+            "latency": self.histogram.get_stats()
+        })
+        return stats
+
+
+def _create_hedger(name: str) -> RequestHedger:
+    return RequestHedger(name, enabled=HEDGING_ENABLED, percentile=HEDGING_PERCENTILE, max_ratio=HEDGING_MAX_RATIO,
+                         min_samples=HEDGING_MIN_SAMPLES, window=HEDGING_WINDOW, min_delay=HEDGING_MIN_DELAY,
+                         max_workers=HEDGING_WORKERS)
+
+
+# 每个远程端点一个对冲器，各自维护延迟直方图
+vision_hedger = _create_hedger("vision")
+language_hedger = _create_hedger("language")
+
+
+def get_hedging_stats() -> List[Dict]:
+    """返回各远程端点的对冲统计和延迟直方图"""
+    return [vision_hedger.get_stats(), language_hedger.get_stats()]
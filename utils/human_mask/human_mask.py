@@ -17,11 +17,18 @@ class HumanMask:
         except Exception as e:
             print(f"加载人体检测模型时出错: {e}")
 
-    def detect_human(self, image_path: str, threshold: float = 0.5) -> bool:
-        """检测图像中是否包含人体"""
+    @staticmethod
+    def _read_image(image: Union[str, np.ndarray]) -> Optional[np.ndarray]:
+        """读取BGR图像，支持文件路径和已解码的BGR数组（批量评估时避免重复解码）"""
+        if isinstance(image, np.ndarray):
+            return image
+        return cv2.imread(image)
+
+    def detect_human(self, image_path: Union[str, np.ndarray], threshold: float = 0.5) -> bool:
+        """检测图像中是否包含人体，image_path可以是文件路径或BGR数组"""
         try:
             # 读取图像
-            image = cv2.imread(image_path)
+            image = self._read_image(image_path)
             if image is None:
                 return False
             
@@ -44,11 +51,11 @@ class HumanMask:
             print(f"人体检测时出错: {e}")
             return False
 
-    def segment_human(self, image_path: str, output_path: str = None) -> Optional[np.ndarray]:
-        """分割图像中的人体区域"""
+    def segment_human(self, image_path: Union[str, np.ndarray], output_path: str = None) -> Optional[np.ndarray]:
+        """分割图像中的人体区域，image_path可以是文件路径或BGR数组"""
         try:
             # 读取图像
-            image = cv2.imread(image_path)
+            image = self._read_image(image_path)
             if image is None:
                 return None
             
@@ -0,0 +1,87 @@
+import io
+import base64
+import mimetypes
+import threading
+from collections import OrderedDict
+from PIL import Image
+from typing import Dict, Optional
+from .digest import file_digest
+
+# PIL格式名与MIME类型的对应关系
+FORMAT_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png"
+}
+
+
+class ImagePayloadEncoder:
+    """将图像缩小到视觉模型的有效分辨率并重新编码为JPEG/WebP，生成用于上传的data URL
+
+    编码结果按文件内容摘要缓存，同一图像对不同描述重复评分时直接复用。
+    """
+
+    def __init__(self, max_side: int = 768, image_format: str = "JPEG", quality: int = 85,
+                 cache_size: int = 256, compact: bool = True):
+        self.max_side = max_side
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self.cache_size = max(0, cache_size)
+        self.compact = compact
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _encode_raw(self, image_path: str) -> Dict:
+        """直接上传原始文件字节"""
+        with open(image_path, "rb") as f:
+            data = f.read()
+        mime_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
+        return {
+            "data_url": f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}",
+            "raw_bytes": len(data),
+            "encoded_bytes": len(data)
+        }
+
+    def _encode_compact(self, image_path: str) -> Dict:
+        """缩小图像并按配置的格式和质量重新编码"""
+        with open(image_path, "rb") as f:
+            data = f.read()
+        image = Image.open(io.BytesIO(data))
+        # JPEG不支持透明通道，统一转为RGB
+        image = image.convert("RGB")
+        if self.max_side and max(image.size) > self.max_side:
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=self.image_format, quality=self.quality)
+        encoded = buffer.getvalue()
+        mime_type = FORMAT_MIME_TYPES.get(self.image_format, "image/jpeg")
+        return {
+            "data_url": f"data:{mime_type};base64,{base64.b64encode(encoded).decode('utf-8')}",
+            "raw_bytes": len(data),
+            "encoded_bytes": len(encoded)
+        }
+
+    def encode(self, image_path: str, digest: Optional[str] = None) -> Dict:
+        """返回包含data_url、原始字节数和编码后字节数的字典，digest为调用方已计算的文件内容摘要"""
+        if not self.compact:
+            return self._encode_raw(image_path)
+
+        key = f"{digest or file_digest(image_path)}:{self.max_side}:{self.image_format}:{self.quality}"
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+            self.cache_misses += 1
+
+        payload = self._encode_compact(image_path)
+        if self.cache_size:
+            with self._lock:
+                self._cache[key] = payload
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return payload
@@ -1,10 +1,34 @@
 import os
+import re
+import json
+import math
+import time
+import threading
 import torch
 import numpy as np
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple, Union
 from transformers import CLIPProcessor, CLIPModel
-from openai import OpenAI
-from config.config import API_KEY, BASE_URL, VISION_MODEL
+from openai import OpenAI, BadRequestError
+from config.config import API_KEY, BASE_URL, VISION_MODEL, CLIP_BATCH_SIZE, CLIP_PREPROCESS_WORKERS
+from config.config import CLIP_EMBEDDING_CACHE_ENABLED, CLIP_EMBEDDING_CACHE_DIR, CLIP_EMBEDDING_CACHE_SIZE
+from config.config import CLIP_BACKEND, CLIP_ONNX_DIR, CLIP_ONNX_THREADS, CLIP_PRECISION
+from config.config import CLIP_SCORE_MODE, CLIP_SIMILARITY_RANGE, CLIP_CONTRAST_PROMPTS, PROMPT_TRANSLATION_ENABLED
+from .digest import file_digest, image_digest, text_digest, directory_fingerprint
+from .embedding_cache import EmbeddingCache
+from .rate_limit import TokenBucket
+from .image_encoding import ImagePayloadEncoder
+from .score_store import VQAScoreStore
+from .clip_onnx import OnnxClipEncoder
+from .cancellation import CancellationToken, OperationCancelledError
+from .circuit_breaker import remote_api_breaker
+from .hedging import vision_hedger
+from .prompt_translation import prompt_translator_instance
+from config.config import VQA_MAX_CONCURRENCY, VQA_RATE_LIMIT_QPS, VQA_RATE_LIMIT_BURST
+from config.config import VQA_IMAGE_COMPACT, VQA_IMAGE_MAX_SIDE, VQA_IMAGE_FORMAT, VQA_IMAGE_QUALITY, VQA_IMAGE_CACHE_SIZE
+from config.config import VQA_SCORE_STORE_ENABLED, VQA_SCORE_STORE_PATH, VQA_MULTI_IMAGE_BATCH_SIZE
+from config.config import VQA_SCORE_MODE, VQA_TEXT_MAX_TOKENS, REMOTE_API_TIMEOUT, VQA_FALLBACK_CLIP_RANGE
 from jinja2 import Template
 
 # 检查base64模块是否可用
@@ -15,13 +39,63 @@ except ImportError:
     HAS_BASE64 = False
     print("警告: base64模块未找到，VQA评分功能可能受限")
 
+# 所有VQAScore实例共享同一个限流器，保证整个进程不超过服务商的QPS配额
+vqa_rate_limiter = TokenBucket(VQA_RATE_LIMIT_QPS, VQA_RATE_LIMIT_BURST)
+
+# 评分模板版本，修改vqa_template或分数解析方式后需要同步修改，使已存储的分数失效
+VQA_TEMPLATE_VERSION = "v1"
+# 多图评分模板的版本，多图请求的分数与单图请求分开存储
+VQA_MULTI_TEMPLATE_VERSION = "multi-v1"
+# 单数字logprobs评分模板的版本
+VQA_LOGPROBS_TEMPLATE_VERSION = "logprobs-v1"
+
+# 持久化的VQA分数存储，所有VQAScore实例共享
+try:
+    vqa_score_store = VQAScoreStore(VQA_SCORE_STORE_PATH) if VQA_SCORE_STORE_ENABLED else None
+except Exception as e:
+    print(f"打开VQA分数存储时出错，将不使用分数存储: {e}")
+    vqa_score_store = None
+
+
+class FallbackScore(float):
+    """本地备选评分得到的分数，数值已映射到VQA分数尺度，类型用于和真实的VQA分数区分（如尝试记录、分数对记录）"""
+    fallback = True
+
+
+def is_fallback_score(score) -> bool:
+    return getattr(score, "fallback", False)
+
+
+def calibrate_similarity(similarity: float, similarity_range: Tuple[float, float]) -> float:
+    """将CLIP余弦相似度按(low, high)区间线性映射到0-1，区间外截断"""
+    low, high = similarity_range
+    return max(0.0, min(1.0, (similarity - low) / (high - low)))
+
+
 class VQAScore:
-    def __init__(self):
+    def __init__(self, clip_scorer: Optional["ClipScore"] = None):
         # 初始化OpenAI客户端
         self.client = OpenAI(
             api_key=API_KEY,
-            base_url=BASE_URL
+            base_url=BASE_URL,
+            timeout=REMOTE_API_TIMEOUT
         )
+        # 并发评分使用的线程池，大小即同时进行中的请求数上限
+        self._executor = ThreadPoolExecutor(max_workers=max(1, VQA_MAX_CONCURRENCY), thread_name_prefix="vqa_score")
+        # 上传前缩小并重新编码图像，编码结果按图像缓存
+        self.image_encoder = ImagePayloadEncoder(VQA_IMAGE_MAX_SIDE, VQA_IMAGE_FORMAT, VQA_IMAGE_QUALITY,
+                                                 VQA_IMAGE_CACHE_SIZE, compact=VQA_IMAGE_COMPACT)
+        self._stats_lock = threading.Lock()
+        self.request_stats = {"requests": 0, "raw_bytes": 0, "request_bytes": 0, "total_latency": 0.0,
+                              "parse_failures": 0, "fallback_scores": 0}
+        # 远程服务熔断或请求失败时使用的本地CLIP评分器，未传入时首次需要时使用进程共享的实例
+        self._fallback_scorer = clip_scorer
+        self._fallback_lock = threading.Lock()
+        
+        # 评分模式：text为输出0-1分数文本；logprobs为只输出一个0-9数字，并按数字token的概率计算期望分数
+        self.score_mode = VQA_SCORE_MODE
+        # 服务端不支持logprobs参数时自动关闭，之后只解析输出的数字
+        self.logprobs_supported = True
         
         self.vqa_template = Template("""
 请评估这张图像与描述的匹配程度。
@@ -29,67 +103,138 @@ class VQAScore:
 描述: {{ description }}
 
 请从0到1的分数给出评估，其中0表示完全不匹配，1表示完全匹配。只需要输出分数，不要包含其他任何内容。
+""")
+        
+        self.vqa_digit_template = Template("""
+请评估这张图像与描述的匹配程度。
+
+描述: {{ description }}
+
+请用0到9之间的一个整数评分，其中0表示完全不匹配，9表示完全匹配。只输出这一个数字。
+""")
+        
+        self.vqa_multi_template = Template("""
+下面共有{{ num_images }}张图像，请分别评估每张图像与描述的匹配程度。
+
+描述: {{ description }}
+
+请按图像顺序给出0到1的分数，其中0表示完全不匹配，1表示完全匹配。
+只输出JSON，格式为 {"scores": [图像1的分数, 图像2的分数, ...]}，数组长度必须为{{ num_images }}，不要包含其他任何内容。
 """)
 
-    def score(self, image_path: str, description: str) -> float:
+    def score(self, image_path: str, description: str, cancel_token: Optional[CancellationToken] = None) -> float:
         """评估图像与描述的匹配程度"""
+        use_digits = self.score_mode == "logprobs"
+        template_version = VQA_LOGPROBS_TEMPLATE_VERSION if use_digits else VQA_TEMPLATE_VERSION
+        
+        # 先查询持久化分数存储，命中时不发起网络请求
+        image_key = None
+        if vqa_score_store is not None:
+            try:
+                image_key = file_digest(image_path)
+                stored_score = vqa_score_store.get(image_key, description, VISION_MODEL, template_version)
+                if stored_score is not None:
+                    return stored_score
+            except Exception as e:
+                print(f"查询VQA分数存储时出错: {e}")
+        
+        # 远程服务熔断时不发起请求，直接使用本地评分
+        if not remote_api_breaker.allow_request():
+            return self._fallback_score(image_path, description)
+        
+        # 等待限流令牌，等待期间被取消时抛出OperationCancelledError
+        vqa_rate_limiter.acquire(cancel_token)
         try:
             # 检查base64模块是否可用
             if not HAS_BASE64:
                 print("base64模块不可用，无法处理图像")
                 return 0.5
             
-            # 读取图像并转换为base64
+            # 读取图像，缩小并重新编码为base64
+            start_time = time.perf_counter()
             try:
-                with open(image_path, "rb") as f:
-                    image_data = base64.b64encode(f.read()).decode("utf-8")
+                payload = self.image_encoder.encode(image_path, digest=image_key)
             except Exception as e:
                 print(f"读取图像文件时出错: {e}")
                 return 0.5
             
             # 构建提示词
             try:
-                prompt = self.vqa_template.render(description=description)
+                template = self.vqa_digit_template if use_digits else self.vqa_template
+                prompt = template.render(description=description)
             except Exception as e:
                 print(f"渲染提示词模板时出错: {e}")
                 prompt = f"评估这张图像与描述的匹配程度: {description}"
             
-            # 调用视觉模型
-            try:
-                response = self.client.chat.completions.create(
-                    model=VISION_MODEL,
-                    messages=[
+            # 调用视觉模型，限制输出长度；数字模式只生成一个token并请求候选token的对数概率
+            messages = [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
                         {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": prompt},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/jpeg;base64,{image_data}"
-                                    }
-                                }
-                            ]
+                            "type": "image_url",
+                            "image_url": {
+                                "url": payload["data_url"]
+                            }
                         }
-                    ],
-                    temperature=0.0
-                )
+                    ]
+                }
+            ]
+            request_kwargs = {"max_tokens": 1 if use_digits else VQA_TEXT_MAX_TOKENS}
+            # score_many在多个线程中调用，logprobs开关的读写都持有_stats_lock
+            with self._stats_lock:
+                use_logprobs = use_digits and self.logprobs_supported
+            if use_logprobs:
+                request_kwargs.update({"logprobs": True, "top_logprobs": 10})
+            try:
+                response = self._create_completion(messages=messages, **request_kwargs)
             except Exception as e:
-                print(f"调用视觉模型时出错: {e}")
-                return 0.5
+                # 只有明确指向logprobs参数的请求错误才关闭logprobs，其他请求错误（如图像过大）按一般错误处理
+                if ("logprobs" not in request_kwargs or not isinstance(e, BadRequestError)
+                        or "logprobs" not in str(e).lower()):
+                    print(f"调用视觉模型时出错，改用本地评分: {e}")
+                    return self._fallback_score(image_path, description)
+                # 部分服务端不支持logprobs参数，关闭后重试一次；关闭前已发出的并发请求会各自收到同样的错误并各重试一次，
+                # 之后的请求不再携带logprobs
+                with self._stats_lock:
+                    first_failure = self.logprobs_supported
+                    self.logprobs_supported = False
+                if first_failure:
+                    print(f"视觉模型不支持logprobs，改为直接解析输出的数字: {e}")
+                request_kwargs.pop("logprobs")
+                request_kwargs.pop("top_logprobs")
+                try:
+                    response = self._create_completion(messages=messages, **request_kwargs)
+                except Exception as e:
+                    print(f"调用视觉模型时出错，改用本地评分: {e}")
+                    return self._fallback_score(image_path, description)
+            self._record_request(payload["raw_bytes"], len(payload["data_url"]), time.perf_counter() - start_time)
             
             # 解析分数，添加更严格的类型检查
             try:
                 if response and hasattr(response, 'choices') and response.choices and len(response.choices) > 0:
                     if hasattr(response.choices[0], 'message') and response.choices[0].message and hasattr(response.choices[0].message, 'content'):
-                        score_text = response.choices[0].message.content.strip()
-                        try:
-                            score = float(score_text)
-                            # 确保分数在0-1范围内
-                            return max(0.0, min(1.0, float(score)))
-                        except ValueError:
-                            print(f"无法将评分文本转换为浮点数: {score_text}")
-                            return 0.5
+                        if use_digits:
+                            score = self._parse_digit_score(response.choices[0])
+                            if score is None:
+                                print(f"无法从响应中解析数字评分: {response.choices[0].message.content}")
+                                self._record_parse_failure()
+                                return 0.5
+                        else:
+                            score_text = (response.choices[0].message.content or "").strip()
+                            try:
+                                score = float(score_text)
+                            except ValueError:
+                                print(f"无法将评分文本转换为浮点数: {score_text}")
+                                self._record_parse_failure()
+                                return 0.5
+                        # 确保分数在0-1范围内
+                        score = max(0.0, min(1.0, float(score)))
+                        # 只存储成功解析的分数，默认分数不写入存储
+                        if image_key is not None:
+                            vqa_score_store.put(image_key, description, VISION_MODEL, template_version, score)
+                        return score
                     else:
                         print("响应消息格式不正确")
                         return 0.5
@@ -104,14 +249,233 @@ class VQAScore:
             # 返回默认分数
             return 0.5
 
+    def _create_completion(self, **kwargs):
+        """调用视觉模型并向熔断器报告结果；请求参数错误说明服务正常，不计为失败
+
+        启用对冲时，慢请求的对冲副本需要取得限流令牌，令牌不足时不对冲。
+        """
+        start_time = time.perf_counter()
+        try:
+            response = vision_hedger.call(
+                self.client.chat.completions.create, model=VISION_MODEL, temperature=0.0,
+                admit=lambda: vqa_rate_limiter.try_acquire() == 0, **kwargs)
+        except Exception as e:
+            remote_api_breaker.record_exception(e)
+            raise
+        remote_api_breaker.record_success(time.perf_counter() - start_time)
+        return response
+
+    def _fallback_score(self, image_path: str, description: str) -> FallbackScore:
+        """使用本地CLIP评分，返回FallbackScore；备选分数不写入分数存储
+
+        CLIP余弦相似度按VQA_FALLBACK_CLIP_RANGE线性映射到0-1，使其能与VQA阈值比较；CLIP模型不可用时返回默认分数0.5。
+        """
+        with self._stats_lock:
+            self.request_stats["fallback_scores"] += 1
+        with self._fallback_lock:
+            if self._fallback_scorer is None:
+                self._fallback_scorer = get_shared_clip_scorer()
+        scorer = self._fallback_scorer
+        if not scorer.model or not scorer.processor:
+            return FallbackScore(0.5)
+        # CLIP文本编码器只在英文上训练，启用翻译时使用翻译后的描述
+        text = prompt_translator_instance.translate(description) if PROMPT_TRANSLATION_ENABLED else description
+        similarity = scorer.similarity_batch([image_path], text)[0]
+        return FallbackScore(calibrate_similarity(similarity, VQA_FALLBACK_CLIP_RANGE))
+
+    @staticmethod
+    def _parse_digit_score(choice) -> Optional[float]:
+        """从单数字响应中计算0-1分数
+
+        有logprobs时按候选数字token的概率计算期望值（归一化到0-1），否则直接解析输出的第一个数字。
+        无法解析时返回None。
+        """
+        logprobs = getattr(choice, "logprobs", None)
+        content = getattr(logprobs, "content", None) if logprobs is not None else None
+        if content:
+            digit_probs = {}
+            for candidate in content[0].top_logprobs or []:
+                token = (candidate.token or "").strip()
+                if len(token) == 1 and token.isdigit():
+                    digit_probs[int(token)] = digit_probs.get(int(token), 0.0) + math.exp(candidate.logprob)
+            total = sum(digit_probs.values())
+            if total > 0:
+                return sum(digit * prob for digit, prob in digit_probs.items()) / total / 9
+
+        match = re.search(r"\d", choice.message.content or "")
+        return int(match.group(0)) / 9 if match else None
+
+    def _record_parse_failure(self) -> None:
+        with self._stats_lock:
+            self.request_stats["parse_failures"] += 1
+
+    def _record_request(self, raw_bytes: int, request_bytes: int, latency: float) -> None:
+        """记录上传字节数和端到端耗时（含编码，不含限流等待）"""
+        with self._stats_lock:
+            self.request_stats["requests"] += 1
+            self.request_stats["raw_bytes"] += raw_bytes
+            self.request_stats["request_bytes"] += request_bytes
+            self.request_stats["total_latency"] += latency
+
+    @staticmethod
+    def _parse_multi_scores(content: str, num_images: int) -> Optional[List[float]]:
+        """解析多图评分的JSON响应，格式不符时返回None"""
+        try:
+            # 去掉模型可能添加的代码块标记
+            match = re.search(r"\{.*\}", content, re.S)
+            if not match:
+                return None
+            scores = json.loads(match.group(0)).get("scores")
+            if not isinstance(scores, list) or len(scores) != num_images:
+                return None
+            return [max(0.0, min(1.0, float(score))) for score in scores]
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def score_group(self, image_paths: List[str], description: str,
+                    cancel_token: Optional[CancellationToken] = None) -> List[float]:
+        """在一次视觉模型请求中评估多张图像与同一描述的匹配程度，结果与输入顺序一致
+
+        响应无法解析为与图像数量一致的分数列表时，回退为逐张评分。
+        """
+        if len(image_paths) <= 1:
+            return [self.score(image_path, description, cancel_token) for image_path in image_paths]
+
+        # 先查询持久化分数存储，只请求未命中的图像
+        scores: List[Optional[float]] = [None] * len(image_paths)
+        digests: List[Optional[str]] = [None] * len(image_paths)
+        if vqa_score_store is not None:
+            for i, image_path in enumerate(image_paths):
+                try:
+                    digests[i] = file_digest(image_path)
+                    scores[i] = vqa_score_store.get(digests[i], description, VISION_MODEL, VQA_MULTI_TEMPLATE_VERSION)
+                except Exception as e:
+                    print(f"查询VQA分数存储时出错: {e}")
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if len(missing) == 1:
+            scores[missing[0]] = self.score(image_paths[missing[0]], description, cancel_token)
+            missing = []
+        if not missing:
+            return scores
+        if not remote_api_breaker.allow_request():
+            for i in missing:
+                scores[i] = self._fallback_score(image_paths[i], description)
+            return scores
+
+        # 等待限流令牌，整组图像只消耗一个令牌
+        vqa_rate_limiter.acquire(cancel_token)
+        group_scores = None
+        try:
+            start_time = time.perf_counter()
+            content = [{"type": "text", "text": self.vqa_multi_template.render(
+                num_images=len(missing), description=description)}]
+            raw_bytes = request_bytes = 0
+            for number, i in enumerate(missing, start=1):
+                payload = self.image_encoder.encode(image_paths[i], digest=digests[i])
+                raw_bytes += payload["raw_bytes"]
+                request_bytes += len(payload["data_url"])
+                content.append({"type": "text", "text": f"图像{number}:"})
+                content.append({"type": "image_url", "image_url": {"url": payload["data_url"]}})
+
+            response = self._create_completion(
+                messages=[{"role": "user", "content": content}],
+                max_tokens=16 + 8 * len(missing)
+            )
+            self._record_request(raw_bytes, request_bytes, time.perf_counter() - start_time)
+            group_scores = self._parse_multi_scores(response.choices[0].message.content or "", len(missing))
+            if group_scores is None:
+                print("多图评分响应格式不正确，回退为逐张评分")
+        except Exception as e:
+            print(f"多图VQA评分时出错，回退为逐张评分: {e}")
+
+        if group_scores is None:
+            for i in missing:
+                scores[i] = self.score(image_paths[i], description, cancel_token)
+            return scores
+
+        for i, score in zip(missing, group_scores):
+            scores[i] = score
+            if digests[i] is not None:
+                vqa_score_store.put(digests[i], description, VISION_MODEL, VQA_MULTI_TEMPLATE_VERSION, score)
+        return scores
+
+    def get_stats(self) -> Dict:
+        """返回VQA请求的平均上传字节数、平均耗时、编码缓存命中情况和熔断器状态"""
+        with self._stats_lock:
+            stats = dict(self.request_stats)
+        requests = stats["requests"]
+        stats.update({
+            "avg_raw_bytes": stats["raw_bytes"] / requests if requests else 0.0,
+            "avg_request_bytes": stats["request_bytes"] / requests if requests else 0.0,
+            "avg_latency": stats["total_latency"] / requests if requests else 0.0,
+            "encode_cache_hits": self.image_encoder.cache_hits,
+            "encode_cache_misses": self.image_encoder.cache_misses,
+            "score_store": vqa_score_store.get_stats() if vqa_score_store is not None else {},
+            "circuit_breaker": remote_api_breaker.get_stats(),
+            "hedging": vision_hedger.get_stats()
+        })
+        return stats
+
+    def score_many(self, image_paths: List[str], descriptions: Union[str, List[str]],
+                   cancel_token: Optional[CancellationToken] = None, poll_interval: float = 0.1) -> List[float]:
+        """并发评估多张图像，descriptions为字符串时所有图像使用同一描述，结果与输入顺序一致
+
+        同时进行的请求数不超过VQA_MAX_CONCURRENCY，请求速率受共享令牌桶限制。
+        VQA_MULTI_IMAGE_BATCH_SIZE大于1时，描述相同的图像按该大小分组，每组合并为一次多图请求。
+        令牌被取消时放弃未完成的请求并抛出OperationCancelledError。
+        """
+        if isinstance(descriptions, str):
+            descriptions = [descriptions] * len(image_paths)
+        if len(descriptions) != len(image_paths):
+            raise ValueError(f"图像数量({len(image_paths)})与描述数量({len(descriptions)})不一致")
+
+        # 按描述分组，每组不超过批大小
+        batch_size = max(1, VQA_MULTI_IMAGE_BATCH_SIZE)
+        indices_by_description: Dict[str, List[int]] = {}
+        for i, description in enumerate(descriptions):
+            indices_by_description.setdefault(description, []).append(i)
+        groups = [
+            (description, indices[start:start + batch_size])
+            for description, indices in indices_by_description.items()
+            for start in range(0, len(indices), batch_size)
+        ]
+
+        futures = [self._executor.submit(self.score_group, [image_paths[i] for i in indices], description, cancel_token)
+                   for description, indices in groups]
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            if pending and cancel_token is not None and cancel_token.cancelled:
+                # 无法中断已发出的网络请求，取消排队中的请求并放弃其余结果
+                for future in pending:
+                    future.cancel()
+                raise OperationCancelledError(cancel_token.reason or "操作已取消")
+
+        scores = [0.5] * len(image_paths)
+        for future, (_, indices) in zip(futures, groups):
+            try:
+                for i, score in zip(indices, future.result()):
+                    scores[i] = score
+            except OperationCancelledError:
+                raise
+            except Exception as e:
+                print(f"VQA评分时出错: {e}")
+        return scores
+
 class ClipScore:
-    def __init__(self):
+    def __init__(self, backend: Optional[str] = None, precision: Optional[str] = None):
+        # 推理后端：torch（PyTorch）或onnx（ONNX Runtime，仅CPU），未指定时使用配置
+        self.backend = backend or CLIP_BACKEND
+        # PyTorch后端的模型精度：fp32、bf16或int8（动态量化，仅CPU），未指定时使用配置
+        self.precision = precision or CLIP_PRECISION
+        
         # 加载CLIP模型，如果本地没有会尝试下载
         try:
             # self.model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32", local_files_only=True)
             # self.processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32", local_files_only=True)
             # 使用本地目录路径而不是模型名称
             local_model_path = os.path.join(os.path.dirname(__file__), "clip-vit-base-patch32")
+            self.model_path = local_model_path
             print(f"尝试从本地路径加载CLIP模型: {local_model_path}")
             self.model = CLIPModel.from_pretrained(local_model_path, local_files_only=True)
             self.processor = CLIPProcessor.from_pretrained(local_model_path, local_files_only=True)
@@ -128,34 +492,315 @@ class ClipScore:
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         if self.model:
             self.model.to(self.device)
+        # 各后端和精度输出的特征统一转换为fp32
+        self.feature_dtype = torch.float32
+        
+        # 模型指纹只反映模型文件，导出目录即使位于模型目录内也不计入
+        model_fingerprint = directory_fingerprint(self.model_path, exclude_dirs=[CLIP_ONNX_DIR])
+        
+        # 可选的ONNX Runtime后端，首次使用时导出视觉塔和文本塔，导出或加载失败时回退到PyTorch
+        self.onnx_encoder = None
+        if self.model and self.backend == "onnx":
+            try:
+                self.onnx_encoder = OnnxClipEncoder(self.model, CLIP_ONNX_DIR, model_fingerprint, CLIP_ONNX_THREADS)
+                self.device = torch.device("cpu")
+                self.model.to(self.device)
+                print("CLIP评分使用ONNX Runtime后端")
+            except Exception as e:
+                print(f"无法使用ONNX Runtime后端，回退到PyTorch: {e}")
+                self.backend = "torch"
+        if self.model and self.onnx_encoder is None:
+            self._apply_precision()
+        else:
+            self.precision = "fp32"
+        
+        # 图像解码和预处理在线程池中并行进行，与模型前向计算重叠
+        self._preprocess_executor = ThreadPoolExecutor(max_workers=max(1, CLIP_PREPROCESS_WORKERS),
+                                                       thread_name_prefix="clip_preprocess")
+        
+        # 图像按内容摘要、文本按规范化字符串缓存归一化特征；设备、后端和精度作为变体分目录，
+        # 不同配置的实例互不影响，只有模型文件变化时缓存才失效
+        self.embedding_cache = None
+        if self.model and CLIP_EMBEDDING_CACHE_ENABLED:
+            variant = f"{str(self.device).replace(':', '_')}-{self.backend}-{self.precision}"
+            self.embedding_cache = EmbeddingCache(CLIP_EMBEDDING_CACHE_DIR, model_fingerprint,
+                                                  CLIP_EMBEDDING_CACHE_SIZE, variant=variant)
+        
+        # 对比评分使用的各类别对照提示词特征，启动时一次性计算；
+        # 对照提示词为英文，未启用提示词翻译时目标文本是中文，两者不可比，退回单文本评分
+        self.score_mode = CLIP_SCORE_MODE
+        if self.score_mode == "contrastive" and not PROMPT_TRANSLATION_ENABLED:
+            print("对比评分需要启用PROMPT_TRANSLATION_ENABLED，使用单文本评分")
+            self.score_mode = "single"
+        self.prompt_bank: Dict[str, torch.Tensor] = {}
+        if self.model and self.score_mode == "contrastive":
+            self._build_prompt_bank()
+
+    def _build_prompt_bank(self) -> None:
+        """为每个类别编码通用对照提示词与类别对照提示词，失败时退回单文本评分"""
+        try:
+            default_prompts = CLIP_CONTRAST_PROMPTS.get("default", [])
+            for category, prompts in CLIP_CONTRAST_PROMPTS.items():
+                bank_prompts = prompts if category == "default" else default_prompts + prompts
+                if bank_prompts:
+                    self.prompt_bank[category] = self._encode_texts(bank_prompts)
+            print(f"CLIP对照提示词库已构建，共 {len(self.prompt_bank)} 个类别")
+        except Exception as e:
+            print(f"构建CLIP对照提示词库时出错，使用单文本评分: {e}")
+            self.prompt_bank = {}
+            self.score_mode = "single"
+
+    def _apply_precision(self) -> None:
+        """按配置将PyTorch模型转换为bf16或动态int8量化，失败时保持fp32"""
+        try:
+            if self.precision == "bf16":
+                self.model.to(dtype=torch.bfloat16)
+                print("CLIP模型使用bf16精度")
+            elif self.precision == "int8":
+                # 动态量化只支持CPU，对全部Linear层的权重进行int8量化
+                self.device = torch.device("cpu")
+                self.model.to(self.device)
+                self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+                print("CLIP模型使用动态int8量化")
+            elif self.precision != "fp32":
+                print(f"未知的CLIP精度 {self.precision}，使用fp32")
+                self.precision = "fp32"
+        except Exception as e:
+            print(f"转换CLIP模型精度时出错，使用fp32: {e}")
+            self.model.to(dtype=torch.float32)
+            self.precision = "fp32"
+
+    @staticmethod
+    def _image_cache_key(image: Union[str, Image.Image]) -> Optional[str]:
+        """计算图像缓存键，无法读取时返回None"""
+        try:
+            return "image:" + image_digest(image)
+        except Exception:
+            return None
+
+    def _from_cache(self, value: np.ndarray) -> torch.Tensor:
+        return torch.from_numpy(value).to(device=self.device, dtype=self.feature_dtype)
+
+    def _image_tower(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        """计算未归一化的图像特征"""
+        if self.onnx_encoder is not None:
+            return self.onnx_encoder.image_features(pixel_values)
+        # bf16模型需要相同精度的输入
+        pixel_dtype = torch.bfloat16 if self.precision == "bf16" else torch.float32
+        with torch.no_grad():
+            return self.model.get_image_features(pixel_values=pixel_values.to(self.device, dtype=pixel_dtype)).float()
 
-    def score(self, image_path: str, text: str) -> float:
+    def _text_tower(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """计算未归一化的文本特征"""
+        if self.onnx_encoder is not None:
+            return self.onnx_encoder.text_features(inputs)
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            return self.model.get_text_features(**inputs).float()
+
+    def _load_pixel_values(self, image: Union[str, Image.Image]) -> Optional[torch.Tensor]:
+        """解码并预处理单张图像，失败时返回None"""
+        try:
+            if isinstance(image, str):
+                image = Image.open(image)
+            return self.processor(images=image.convert("RGB"), return_tensors="pt")["pixel_values"]
+        except Exception as e:
+            print(f"预处理图像时出错: {e}")
+            return None
+
+    def _encode_images(self, images: List[Union[str, Image.Image]],
+                       batch_size: Optional[int] = None) -> List[Optional[torch.Tensor]]:
+        """并行预处理图像并按批次计算L2归一化的图像特征，无法读取的图像对应位置为None"""
+        batch_size = max(1, batch_size or CLIP_BATCH_SIZE)
+        features: List[Optional[torch.Tensor]] = [None] * len(images)
+        batch_indices, batch_pixels = [], []
+        
+        # 先查询特征缓存，只对未命中的图像进行预处理和前向计算
+        keys: List[Optional[str]] = [None] * len(images)
+        pending = list(range(len(images)))
+        if self.embedding_cache is not None:
+            keys = list(self._preprocess_executor.map(self._image_cache_key, images))
+            pending = []
+            for index, key in enumerate(keys):
+                cached = self.embedding_cache.get(key) if key else None
+                if cached is not None:
+                    features[index] = self._from_cache(cached)
+                else:
+                    pending.append(index)
+
+        def flush():
+            batch_features = self._image_tower(torch.cat(batch_pixels))
+            batch_features = batch_features / batch_features.norm(dim=-1, keepdim=True)
+            for index, feature in zip(batch_indices, batch_features):
+                features[index] = feature
+                if self.embedding_cache is not None and keys[index]:
+                    self.embedding_cache.put(keys[index], feature.float().cpu().numpy())
+            batch_indices.clear()
+            batch_pixels.clear()
+
+        # executor.map按输入顺序返回结果，前一批计算特征时后续图像仍在预处理
+        pixel_iter = self._preprocess_executor.map(self._load_pixel_values, [images[i] for i in pending])
+        for index, pixel_values in zip(pending, pixel_iter):
+            if pixel_values is None:
+                continue
+            batch_indices.append(index)
+            batch_pixels.append(pixel_values)
+            if len(batch_pixels) >= batch_size:
+                flush()
+        if batch_pixels:
+            flush()
+        return features
+
+    def _encode_texts(self, texts: List[str]) -> torch.Tensor:
+        """批量计算L2归一化的文本特征，优先使用特征缓存"""
+        if self.embedding_cache is None:
+            return self._compute_text_features(texts)
+        
+        keys = ["text:" + text_digest(text) for text in texts]
+        features: List[Optional[torch.Tensor]] = []
+        missing = []
+        for index, key in enumerate(keys):
+            cached = self.embedding_cache.get(key)
+            features.append(self._from_cache(cached) if cached is not None else None)
+            if cached is None:
+                missing.append(index)
+        if missing:
+            computed = self._compute_text_features([texts[i] for i in missing])
+            for index, feature in zip(missing, computed):
+                features[index] = feature
+                self.embedding_cache.put(keys[index], feature.float().cpu().numpy())
+        return torch.stack(features)
+
+    def _compute_text_features(self, texts: List[str]) -> torch.Tensor:
+        """对文本进行前向计算得到L2归一化的特征"""
+        inputs = self.processor(text=texts, return_tensors="pt", padding=True, truncation=True)
+        features = self._text_tower(inputs)
+        return features / features.norm(dim=-1, keepdim=True)
+
+    def score(self, image_path: str, text: str, category: Optional[str] = None) -> float:
         """计算图像和文本的CLIP相似度分数"""
+        return self.score_batch([image_path], [text], category=category)[0]
+
+    def score_batch(self, image_paths: List[Union[str, Image.Image]], texts: Union[str, List[str]],
+                    batch_size: Optional[int] = None, category: Optional[str] = None) -> List[float]:
+        """批量计算图像与对应文本的CLIP分数，texts为字符串时所有图像使用同一文本；图像可以是文件路径或已解码的PIL图像
+
+        单文本评分模式下，分数为余弦相似度按CLIP_SIMILARITY_RANGE映射到0-1的值；对比评分模式下，
+        分数为目标文本在目标文本与该类别对照提示词之间的softmax概率。两种模式下不同图像的分数都具有可比性，
+        可直接与试穿评分阈值比较。
+        结果与输入顺序一致，无法评分的图像返回默认分数0.5。
+        """
+        if isinstance(texts, str):
+            texts = [texts] * len(image_paths)
+        if len(texts) != len(image_paths):
+            raise ValueError(f"图像数量({len(image_paths)})与文本数量({len(texts)})不一致")
+        if not image_paths:
+            return []
+
         try:
             # 如果没有成功加载CLIP模型，返回默认分数
             if not self.model or not self.processor:
-                return 0.5
-            
-            # 读取图像
-            image = Image.open(image_path).convert("RGB")
-            
-            # 预处理
-            inputs = self.processor(text=[text], images=image, return_tensors="pt", padding=True)
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            # 计算特征
-            outputs = self.model(**inputs)
-            logits_per_image = outputs.logits_per_image  # 图像到文本的logits
-            
-            # 归一化分数
-            score = torch.softmax(logits_per_image, dim=1)[0, 0].item()
-            
-            return score
+                return [0.5] * len(image_paths)
+
+            # 相同文本只编码一次
+            unique_texts = list(dict.fromkeys(texts))
+            text_features = self._encode_texts(unique_texts)
+            text_index = {text: i for i, text in enumerate(unique_texts)}
+
+            image_features = self._encode_images(image_paths, batch_size)
+            logit_scale = self.model.logit_scale.exp().float()
+            contrast_features = self.prompt_bank.get(category) if category else None
+            if contrast_features is None:
+                contrast_features = self.prompt_bank.get("default")
+
+            scores = []
+            for image_feature, text in zip(image_features, texts):
+                if image_feature is None:
+                    scores.append(0.5)
+                    continue
+                similarity = image_feature @ text_features[text_index[text]]
+                if self.score_mode != "contrastive" or contrast_features is None:
+                    # 只有一个logit时softmax恒为1，单文本评分直接使用校准后的余弦相似度
+                    scores.append(calibrate_similarity(similarity.item(), CLIP_SIMILARITY_RANGE))
+                    continue
+                # 图像到目标文本及对照提示词的logits，取目标文本的softmax概率
+                logits_per_image = torch.cat([(logit_scale * similarity).reshape(1, 1),
+                                              (logit_scale * (contrast_features @ image_feature)).reshape(1, -1)], dim=1)
+                scores.append(torch.softmax(logits_per_image, dim=1)[0, 0].item())
+            return scores
         except Exception as e:
             print(f"CLIP评分时出错: {e}")
             # 返回默认分数
-            return 0.5
+            return [0.5] * len(image_paths)
+
+    def similarity(self, image: Union[str, Image.Image], text: str) -> float:
+        """计算图像和文本CLIP特征的余弦相似度，可直接传入内存中的PIL图像"""
+        try:
+            if not self.model or not self.processor:
+                return 0.0
+
+            # 支持文件路径和PIL图像两种输入
+            image_feature = self._encode_images([image])[0]
+            if image_feature is None:
+                return 0.0
+            text_feature = self._encode_texts([text])[0]
+
+            # 特征已经过L2归一化，点积即余弦相似度
+            return float((image_feature * text_feature).sum().item())
+        except Exception as e:
+            print(f"计算CLIP相似度时出错: {e}")
+            return 0.0
+
+    def similarity_batch(self, images: List[Union[str, Image.Image]], text: str) -> List[float]:
+        """批量计算多张图像与同一文本的CLIP特征余弦相似度，无法评分的图像返回0.0"""
+        try:
+            if not self.model or not self.processor or not images:
+                return [0.0] * len(images)
+            text_feature = self._encode_texts([text])[0]
+            return [float((feature * text_feature).sum().item()) if feature is not None else 0.0
+                    for feature in self._encode_images(images)]
+        except Exception as e:
+            print(f"计算CLIP相似度时出错: {e}")
+            return [0.0] * len(images)
+
+    def cache_stats(self) -> Dict:
+        """返回CLIP特征缓存的命中统计，未启用缓存时返回空字典"""
+        return self.embedding_cache.get_stats() if self.embedding_cache is not None else {}
+
+    def image_embedding(self, image: Union[str, Image.Image]) -> Optional[np.ndarray]:
+        """计算L2归一化的CLIP图像特征，失败时返回None"""
+        try:
+            if not self.model or not self.processor:
+                return None
+            feature = self._encode_images([image])[0]
+            return feature.float().cpu().numpy() if feature is not None else None
+        except Exception as e:
+            print(f"计算CLIP图像特征时出错: {e}")
+            return None
+
+    def text_embedding(self, text: str) -> Optional[np.ndarray]:
+        """计算L2归一化的CLIP文本特征，失败时返回None"""
+        try:
+            if not self.model or not self.processor:
+                return None
+            return self._encode_texts([text])[0].float().cpu().numpy()
+        except Exception as e:
+            print(f"计算CLIP文本特征时出错: {e}")
+            return None
+
+
+# 未传入ClipScore的VQAScore实例共享的备选评分器，避免每个实例各自加载一份CLIP模型
+_shared_clip_scorer: Optional[ClipScore] = None
+_shared_clip_scorer_lock = threading.Lock()
+
 
+def get_shared_clip_scorer() -> ClipScore:
+    """返回进程共享的ClipScore实例，首次调用时加载"""
+    global _shared_clip_scorer
+    with _shared_clip_scorer_lock:
+        if _shared_clip_scorer is None:
+            _shared_clip_scorer = ClipScore()
+        return _shared_clip_scorer
 
 
 # 由于我们可能没有base64模块，这里添加一个简单的导入检查
@@ -1,12 +1,27 @@
 import os
+import time
+import uuid
+import random
 import torch
 import numpy as np
 from PIL import Image
 from typing import Dict, List, Optional, Union
-from diffusers import FluxPipeline
 from .image_process import image_process
-from .metrics import VQAScore
+from .metrics import VQAScore, ClipScore, is_fallback_score
+from .garment_backends import GarmentBackend, GARMENT_BACKEND_CLASSES
+from .garment_library import add_to_garment_library
+from .digest import text_digest
+from .prompt_translation import prompt_translator_instance
+from .garment_selection import select_diverse_garments
+from .scoring_cascade import ScoringCascade
+from .attempt_log import attempt_log_instance
+from .cancellation import CancellationToken, OperationCancelledError, is_cancelled
 from config.config import STATIC_FOLDER, MAX_TEXT2GARMENT_ITERATIONS, GARMENT_VQA_HIGH_THRESHOLD, GARMENT_VQA_LOW_THRESHOLD
+from config.config import GARMENT_PREVIEW_ENABLED, GARMENT_PREVIEW_TOP_K
+from config.config import GARMENT_SEARCH_STRATEGY, GARMENT_SEARCH_ELITE_SIZE
+from config.config import GARMENT_BACKEND_DEFAULT, GARMENT_BACKEND_BY_CATEGORY
+from config.config import PROMPT_TRANSLATION_ENABLED
+from config.config import GARMENT_DIVERSITY_ENABLED, GARMENT_MMR_LAMBDA, GARMENT_NEAR_DUPLICATE_THRESHOLD
 from jinja2 import Template
 import logging
 import os
@@ -21,28 +36,19 @@ CLIP_MAX_TOKENS = 77
 class Text2GarmentGenerator:
     def __init__(self):
         self.image_processor = image_process()
-        self.vqa_scorer = VQAScore()
-        self.pipeline = None
+        self.clip_scorer = ClipScore()
+        # VQA的本地备选评分复用同一个CLIP评分器
+        self.vqa_scorer = VQAScore(clip_scorer=self.clip_scorer)
+        # 本地CLIP初筛与远程VQA组成的评分级联，默认关闭
+        self.scoring_cascade = ScoringCascade(self.clip_scorer)
         
-        # 初始化Flux管道用于直接生成服装图像
-        try:
-            # 首先尝试加载本地模型
-            local_model_path = os.path.join(os.path.dirname(__file__), "FLUX.1-schnell")
-            if os.path.exists(local_model_path):
-                logger.info(f"尝试从本地路径加载Flux模型: {local_model_path}")
-                self.pipeline = FluxPipeline.from_pretrained(local_model_path, torch_dtype=torch.float16, local_files_only=True)
+        # 生成后端在首次使用时加载，默认后端和按类别配置的后端在启动时预加载
+        self.backends = {name: backend_class() for name, backend_class in GARMENT_BACKEND_CLASSES.items()}
+        for name in {GARMENT_BACKEND_DEFAULT, *GARMENT_BACKEND_BY_CATEGORY.values()}:
+            if name in self.backends:
+                self.backends[name].load()
             else:
-                # 尝试从Hugging Face加载（使用镜像）
-                logger.info("尝试从Hugging Face加载Flux模型")
-                self.pipeline = FluxPipeline.from_pretrained("black-forest-labs/FLUX.1-schnell", torch_dtype=torch.float16)
-                
-            # 启用模型CPU卸载以节省内存
-            if self.pipeline:
-                self.pipeline.enable_model_cpu_offload()
-                logger.info("Flux模型加载成功，已启用CPU卸载")
-        except Exception as e:
-            logger.error(f"初始化Flux管道时出错: {e}")
-            self.pipeline = None
+                logger.warning(f"配置中的生成后端不存在: {name}")
         
         # 加载提示词模板
         self.garment_prompt_template = Template("""
@@ -51,8 +57,34 @@ class Text2GarmentGenerator:
         
         self.negative_prompt = """low quality, blurry, distorted, asymmetrical, color distortion, bad crop, poor composition, unrealistic, pixelated, artifact, text, watermark"""
     
+    @property
+    def pipeline(self):
+        """默认后端的底层管道，未加载时为None"""
+        return self.get_backend().pipeline
+    
+    def get_backend(self, name: Optional[str] = None, category: Optional[str] = None) -> GarmentBackend:
+        """按请求指定、类别配置、全局默认的优先级选择生成后端"""
+        if not name and category:
+            name = GARMENT_BACKEND_BY_CATEGORY.get(category)
+        if name and name not in self.backends:
+            logger.warning(f"未知的生成后端 {name}，使用默认后端 {GARMENT_BACKEND_DEFAULT}")
+            name = None
+        return self.backends[name or GARMENT_BACKEND_DEFAULT]
+    
+    def list_backends(self) -> List[Dict]:
+        """列出所有生成后端的声明信息（预计耗时和内存占用）"""
+        return [backend.info() for backend in self.backends.values()]
+    
     def _truncate_prompt(self, prompt: str, max_tokens: int = CLIP_MAX_TOKENS) -> str:
         """限制提示词长度，确保不超过CLIP模型的最大token限制"""
+        # 优先使用CLIP tokenizer按真实token数截断
+        if prompt_translator_instance.tokenizer is not None:
+            truncated = prompt_translator_instance.truncate_to_tokens(prompt, max_tokens)
+            if truncated != prompt:
+                logger.info(f"提示词超过{max_tokens}个token，截断后的提示词: {truncated}")
+            return truncated
+        
+        # tokenizer不可用时按字符数截断
         # 对于中文和英文混合的情况，我们采取保守的策略
         # 中文每个字算一个token，英文按空格分割单词
         # 这是一个简化的处理方式，实际应用中可以使用更复杂的tokenizer
@@ -68,44 +100,236 @@ class Text2GarmentGenerator:
         
         return truncated
     
-    def generate_garment_image(self, prompt: str, output_path: str, width: int = 768, height: int = 1024) -> str:
-        """使用Flux模型直接生成服装图像"""
+    def _build_prompt(self, prompt: str) -> str:
+        """渲染并截断生成图像使用的提示词"""
+        # 渲染提示词
+        rendered_prompt = self.garment_prompt_template.render(garment_description=prompt)
+        
+        # 截断提示词以避免超过CLIP模型的限制
+        return self._truncate_prompt(rendered_prompt.strip())
+    
+    def generate_garment_image(self, prompt: str, output_path: str, width: Optional[int] = None,
+                               height: Optional[int] = None, latents: Optional[torch.Tensor] = None,
+                               backend: Optional[GarmentBackend] = None,
+                               cancel_token: Optional[CancellationToken] = None) -> str:
+        """使用指定后端（默认Flux）直接生成服装图像"""
         try:
-            # 如果模型未初始化，返回None
-            if self.pipeline is None:
-                logger.warning("Flux模型未初始化，无法生成图像")
-                return None
+            backend = backend or self.get_backend()
             
-            # 渲染提示词
-            rendered_prompt = self.garment_prompt_template.render(garment_description=prompt)
-            
-            # 截断提示词以避免超过CLIP模型的限制
-            truncated_prompt = self._truncate_prompt(rendered_prompt)
-            logger.info(f"生成图像的提示词: {truncated_prompt}")
-            
-            # 生成图像
-            image = self.pipeline(
-                prompt=truncated_prompt,
-                negative_prompt=self.negative_prompt,
-                width=width,
-                height=height,
-                guidance_scale=3.0,
-                num_inference_steps=28
-            ).images[0]
+            truncated_prompt = self._build_prompt(prompt)
+            logger.info(f"使用后端 {backend.name} 生成图像的提示词: {truncated_prompt}")
             
-            # 保存图像
-            image.save(output_path)
-            logger.info(f"成功生成图像并保存至: {output_path}")
+            # 生成并保存图像
+            generated_path = backend.generate(truncated_prompt, self.negative_prompt, output_path,
+                                              width=width, height=height, latents=latents,
+                                              cancel_token=cancel_token)
+            if generated_path:
+                logger.info(f"成功生成图像并保存至: {generated_path}")
             
-            return output_path
+            return generated_path
         except Exception as e:
             logger.error(f"生成图像时出错: {e}")
             return None
     
+    def _next_initial_latents(self, search_state: Dict, backend: GarmentBackend) -> Dict:
+        """按搜索策略选择下一个候选的种子和初始噪声"""
+        seed = search_state["rng"].randrange(2 ** 32)
+        if not backend.supports_latents:
+            return {"seed": seed, "parent_seed": None, "latents": None}
+        elites = search_state["elites"]
+        if search_state["strategy"] == "guided" and elites:
+            # 在高分候选之间轮流扰动，兼顾利用与探索
+            parent = elites[search_state["children"] % len(elites)]
+            search_state["children"] += 1
+            return {
+                "seed": seed,
+                "parent_seed": parent["seed"],
+                "latents": backend.perturb_latents(parent["latents"], seed)
+            }
+        return {"seed": seed, "parent_seed": None, "latents": backend.make_initial_latents(seed)}
+    
+    def _update_elites(self, search_state: Dict, image_info: Dict, candidate: Dict) -> None:
+        """记录高分候选的种子和初始噪声，只保留分数最高的若干个"""
+        if candidate.get("latents") is None:
+            return
+        elites = search_state["elites"]
+        elites.append({"seed": candidate["seed"], "latents": candidate["latents"], "score": image_info["score"]})
+        elites.sort(key=lambda x: x["score"], reverse=True)
+        del elites[max(1, GARMENT_SEARCH_ELITE_SIZE):]
+    
+    def _score_garments(self, image_paths: List[str], garment_prompt: str, category: str,
+                        cancel_token: Optional[CancellationToken] = None) -> List[Optional[Dict]]:
+        """并发计算多张服装图像的VQA分数并构建图像信息，结果与输入顺序一致"""
+        if not image_paths:
+            return []
+        try:
+            # 并发计算VQA分数，取消时放弃尚未返回的请求
+            scores = self.vqa_scorer.score_many(image_paths, garment_prompt, cancel_token=cancel_token)
+        except OperationCancelledError:
+            logger.info("服装图像评分已取消")
+            return [None] * len(image_paths)
+        except Exception as e:
+            logger.error(f"评分服装图像时出错: {e}")
+            return [None] * len(image_paths)
+        
+        images = []
+        for image_path, score in zip(image_paths, scores):
+            # 确保score是一个浮点数
+            if not isinstance(score, (int, float)):
+                logger.warning(f"警告: 评分不是数字类型，得到的是: {type(score)}, 值: {score}")
+                score = 0.5  # 默认分数
+            
+            # 记录图像信息
+            images.append({
+                "path": image_path,
+                "score": float(score),  # 确保是浮点数
+                # 远程服务不可用时的本地备选分数，不作为真实VQA分数记录
+                "vqa_fallback": is_fallback_score(score),
+                "prompt": garment_prompt,
+                "category": category
+            })
+        return images
+    
+    def _score_candidates(self, image_paths: List[str], garment_prompt: str, clip_prompt: str, category: str,
+                          stats: Dict, cancel_token: Optional[CancellationToken] = None) -> List[Optional[Dict]]:
+        """评分一批候选图像：启用评分级联时先用CLIP初筛，只有通过的候选送入VQA，被拒候选对应位置为None"""
+        cascade = self.scoring_cascade
+        if not cascade.enabled or not image_paths:
+            stats["vqa_calls"] += len(image_paths)
+            return self._score_garments(image_paths, garment_prompt, category, cancel_token)
+        
+        clip_scores, send, would_reject = cascade.screen(image_paths, clip_prompt, category)
+        sent_indices = [i for i, flag in enumerate(send) if flag]
+        stats["vqa_calls"] += len(sent_indices)
+        stats["vqa_calls_saved"] += len(image_paths) - len(sent_indices)
+        stats["cascade_rejected"] = stats.get("cascade_rejected", 0) + len(image_paths) - len(sent_indices)
+        
+        sent_results = self._score_garments([image_paths[i] for i in sent_indices], garment_prompt, category, cancel_token)
+        results: List[Optional[Dict]] = [None] * len(image_paths)
+        for index, image_info in zip(sent_indices, sent_results):
+            if image_info:
+                image_info["clip_score"] = clip_scores[index]
+                # 作为探索样本送入VQA的候选已有真实的VQA分数，与其他候选一样参与筛选
+                results[index] = image_info
+        
+        vqa_scores = [None] * len(image_paths)
+        vqa_fallback = [False] * len(image_paths)
+        for index, image_info in zip(sent_indices, sent_results):
+            if image_info:
+                vqa_scores[index] = image_info["score"]
+                vqa_fallback[index] = image_info["vqa_fallback"]
+        cascade.log_pairs(stats.get("run_id", ""), category, garment_prompt, image_paths, clip_scores,
+                          vqa_scores, would_reject, vqa_fallback)
+        return results
+    
+    def _generate_iteration(self, garment_prompt: str, category: str, output_dir: str,
+                            iteration: int, num_images: int, stats: Dict, search_state: Dict,
+                            backend: GarmentBackend, cancel_token: Optional[CancellationToken] = None,
+                            generation_prompt: Optional[str] = None) -> List[Dict]:
+        """完整解码每个候选并全部送入VQA评分，generation_prompt为生成使用的（翻译后）提示词"""
+        generation_prompt = generation_prompt or garment_prompt
+        generated = []
+        for i in range(num_images):
+            if is_cancelled(cancel_token):
+                break
+            # 构建输出路径
+            image_path = os.path.join(output_dir, f"garment_{stats['run_id'][:8]}_{iteration}_{i}.png")
+            
+            # 生成图像
+            candidate = self._next_initial_latents(search_state, backend)
+            generated_path = self.generate_garment_image(generation_prompt, image_path, latents=candidate["latents"],
+                                                         backend=backend, cancel_token=cancel_token)
+            stats["generated"] += 1
+            
+            if generated_path and os.path.exists(generated_path):
+                generated.append((generated_path, candidate))
+        
+        # 本轮生成的图像一起并发评分
+        scored = self._score_candidates([path for path, _ in generated], garment_prompt,
+                                        self._build_prompt(generation_prompt), category, stats, cancel_token)
+        images = []
+        for (_, candidate), image_info in zip(generated, scored):
+            if image_info:
+                image_info["seed"] = candidate["seed"]
+                image_info["parent_seed"] = candidate["parent_seed"]
+                self._update_elites(search_state, image_info, candidate)
+                images.append(image_info)
+        return images
+    
+    def _generate_iteration_with_preview(self, garment_prompt: str, category: str, output_dir: str,
+                                         iteration: int, num_images: int, stats: Dict, search_state: Dict,
+                                         backend: GarmentBackend, cancel_token: Optional[CancellationToken] = None,
+                                         generation_prompt: Optional[str] = None) -> List[Dict]:
+        """先用轻量VAE解码预览并用CLIP打分，只对top-k候选进行完整解码和VQA评分"""
+        clip_prompt = self._build_prompt(generation_prompt or garment_prompt)
+        candidates = []
+        for i in range(num_images):
+            if is_cancelled(cancel_token):
+                return []
+            candidate = self._next_initial_latents(search_state, backend)
+            latents = backend.generate_latents(clip_prompt, self.negative_prompt, latents=candidate["latents"],
+                                               cancel_token=cancel_token)
+            stats["generated"] += 1
+            if latents is None:
+                continue
+            
+            start_time = time.perf_counter()
+            preview = backend.decode_preview(latents)
+            stats["preview_decode_time"] += time.perf_counter() - start_time
+            if preview is None:
+                continue
+            
+            candidate.update({
+                "index": i,
+                "output_latents": latents,
+                "preview_score": self.clip_scorer.similarity(preview, clip_prompt)
+            })
+            candidates.append(candidate)
+        
+        # 按预览分数排序，只保留top-k
+        candidates.sort(key=lambda x: x["preview_score"], reverse=True)
+        top_k = max(1, GARMENT_PREVIEW_TOP_K)
+        skipped = max(0, len(candidates) - top_k)
+        stats["full_decodes_skipped"] += skipped
+        stats["vqa_calls_saved"] += skipped
+        
+        decoded = []
+        for candidate in candidates[:top_k]:
+            if is_cancelled(cancel_token):
+                break
+            image_path = os.path.join(output_dir, f"garment_{stats['run_id'][:8]}_{iteration}_{candidate['index']}.png")
+            
+            start_time = time.perf_counter()
+            decoded_path = backend.decode_full(candidate["output_latents"], image_path)
+            stats["full_decode_time"] += time.perf_counter() - start_time
+            stats["full_decodes"] += 1
+            
+            if decoded_path and os.path.exists(decoded_path):
+                decoded.append((decoded_path, candidate))
+        
+        # 完整解码的候选一起并发评分
+        scored = self._score_candidates([path for path, _ in decoded], garment_prompt, clip_prompt,
+                                        category, stats, cancel_token)
+        images = []
+        for (_, candidate), image_info in zip(decoded, scored):
+            if image_info:
+                image_info["preview_score"] = candidate["preview_score"]
+                image_info["seed"] = candidate["seed"]
+                image_info["parent_seed"] = candidate["parent_seed"]
+                self._update_elites(search_state, image_info, candidate)
+                images.append(image_info)
+        return images
+    
     def produce_garment(self, garment_prompt: str, category: str, output_dir: str, 
                         max_iterations: int = MAX_TEXT2GARMENT_ITERATIONS, 
-                        num_images_per_iter: int = 3) -> List[Dict]:
-        """生成并筛选服装图像"""
+                        num_images_per_iter: int = 3, stats: Optional[Dict] = None,
+                        search_strategy: Optional[str] = None, backend: Optional[str] = None,
+                        cancel_token: Optional[CancellationToken] = None,
+                        translate_prompt: Optional[bool] = None) -> List[Dict]:
+        """生成并筛选服装图像，stats用于回传本次请求的生成统计信息，取消令牌被触发时尽快停止生成
+
+        translate_prompt为None时按PROMPT_TRANSLATION_ENABLED决定是否将提示词翻译为英文后再生成
+        """
         # 确保输出目录存在
         os.makedirs(output_dir, exist_ok=True)
         
@@ -113,6 +337,42 @@ class Text2GarmentGenerator:
         all_images = []
         high_score_images = []
         current_iteration = 0
+        generation_backend = self.get_backend(backend, category)
+        use_preview = (GARMENT_PREVIEW_ENABLED and generation_backend.supports_preview
+                       and generation_backend.load() and generation_backend.has_preview())
+        if stats is None:
+            stats = {}
+        stats.update({
+            "run_id": uuid.uuid4().hex,
+            "backend": generation_backend.name,
+            "preview_enabled": use_preview,
+            "generated": 0,
+            "vqa_calls": 0,
+            "vqa_calls_saved": 0,
+            "full_decodes": 0,
+            "full_decodes_skipped": 0,
+            "preview_decode_time": 0.0,
+            "full_decode_time": 0.0,
+            "search_strategy": search_strategy or GARMENT_SEARCH_STRATEGY,
+            "generations_to_success": None,
+            "cascade_mode": self.scoring_cascade.mode,
+            "cascade_rejected": 0
+        })
+        
+        # 生成模型和CLIP使用翻译后的英文提示词，VQA评分仍使用原始描述
+        if translate_prompt is None:
+            translate_prompt = PROMPT_TRANSLATION_ENABLED
+        generation_prompt = prompt_translator_instance.translate(garment_prompt) if translate_prompt else garment_prompt
+        stats["prompt_translated"] = bool(translate_prompt)
+        stats["generation_prompt"] = generation_prompt
+        
+        # 种子搜索状态：guided模式下在后续迭代中围绕高分候选的初始噪声采样
+        search_state = {
+            "strategy": stats["search_strategy"],
+            "elites": [],
+            "children": 0,
+            "rng": random.Random()
+        }
         
         # 获取类别对应的评分阈值
         high_threshold = GARMENT_VQA_HIGH_THRESHOLD.get(category, 0.75)
@@ -120,47 +380,66 @@ class Text2GarmentGenerator:
         
         # 进行迭代生成和评估
         while current_iteration < max_iterations and len(high_score_images) < 3:
+            if is_cancelled(cancel_token):
+                logger.info("收到停止信号，结束服装生成")
+                break
             logger.info(f"迭代 {current_iteration + 1}/{max_iterations}...")
             
-            # 生成多个图像变体
-            for i in range(num_images_per_iter):
-                # 构建输出路径
-                image_path = os.path.join(output_dir, f"garment_{current_iteration}_{i}.png")
-                
-                # 生成图像
-                generated_path = self.generate_garment_image(garment_prompt, image_path)
+            # 生成多个图像变体并评分
+            if use_preview:
+                iteration_images = self._generate_iteration_with_preview(
+                    garment_prompt, category, output_dir, current_iteration, num_images_per_iter, stats,
+                    search_state, generation_backend, cancel_token, generation_prompt)
+            else:
+                iteration_images = self._generate_iteration(
+                    garment_prompt, category, output_dir, current_iteration, num_images_per_iter, stats,
+                    search_state, generation_backend, cancel_token, generation_prompt)
+            
+            # 记录本轮各候选的分数，供离线阈值调优回放；包括作为探索样本送入VQA的候选，
+            # 只有被评分级联拒绝、没有VQA分数的候选不记录（它们也不参与筛选）
+            if attempt_log_instance is not None:
+                attempt_log_instance.log_attempts("garment", stats["run_id"], category, current_iteration,
+                                                  [image_info["score"] for image_info in iteration_images],
+                                                  [image_info["vqa_fallback"] for image_info in iteration_images])
+            
+            for image_info in iteration_images:
+                all_images.append(image_info)
+                # 写入持久化服装库，供后续相似请求直接复用
+                add_to_garment_library(image_info, generation_backend.name)
                 
-                if generated_path and os.path.exists(generated_path):
-                    try:
-                        # 计算VQA分数
-                        score = self.vqa_scorer.score(generated_path, garment_prompt)
-                        
-                        # 确保score是一个浮点数
-                        if not isinstance(score, (int, float)):
-                            logger.warning(f"警告: 评分不是数字类型，得到的是: {type(score)}, 值: {score}")
-                            score = 0.5  # 默认分数
-                        
-                        # 记录图像信息
-                        image_info = {
-                            "path": generated_path,
-                            "score": float(score),  # 确保是浮点数
-                            "prompt": garment_prompt,
-                            "category": category
-                        }
-                        
-                        all_images.append(image_info)
-                        
-                        # 根据分数分类
-                        if score >= high_threshold:
-                            high_score_images.append(image_info)
-                    except Exception as e:
-                        logger.error(f"处理图像 {generated_path} 时出错: {e}")
-                        continue
+                # 根据分数分类
+                if image_info["score"] >= high_threshold:
+                    high_score_images.append(image_info)
+            
+            # 记录首次凑齐3张高分图像时累计生成的候选数量
+            if len(high_score_images) >= 3 and stats["generations_to_success"] is None:
+                stats["generations_to_success"] = stats["generated"]
             
             current_iteration += 1
         
+        stats["iterations"] = current_iteration
+        if attempt_log_instance is not None:
+            attempt_log_instance.log_run("garment", stats["run_id"], category, high_threshold, max_iterations,
+                                         num_images_per_iter, current_iteration, len(high_score_images) >= 3,
+                                         cancelled=is_cancelled(cancel_token))
+        if use_preview:
+            # 估算节省的解码时间：跳过的完整解码数 × 平均完整解码耗时 - 预览解码总耗时
+            avg_full_decode_time = stats["full_decode_time"] / stats["full_decodes"] if stats["full_decodes"] else 0.0
+            stats["decode_time_saved"] = stats["full_decodes_skipped"] * avg_full_decode_time - stats["preview_decode_time"]
+            logger.info(f"预览筛选统计: 跳过完整解码 {stats['full_decodes_skipped']} 次, "
+                        f"节省VQA调用 {stats['vqa_calls_saved']} 次, 估计节省解码时间 {stats['decode_time_saved']:.2f} 秒")
+        
+        stats["near_duplicates_suppressed"] = 0
+        if GARMENT_DIVERSITY_ENABLED and all_images:
+            # 在全部已评分图像中兼顾分数和视觉差异选出最终服装
+            high_score_images, suppressed = select_diverse_garments(
+                all_images, self.clip_scorer, k=3, mmr_lambda=GARMENT_MMR_LAMBDA,
+                duplicate_threshold=GARMENT_NEAR_DUPLICATE_THRESHOLD)
+            stats["near_duplicates_suppressed"] = suppressed
+            if suppressed:
+                logger.info(f"多样性筛选丢弃了 {suppressed} 张近重复图像")
         # 如果没有足够的高评分图像，使用低评分阈值
-        if len(high_score_images) < 3:
+        elif len(high_score_images) < 3:
             # 按分数排序
             try:
                 all_images.sort(key=lambda x: x["score"], reverse=True)
@@ -186,24 +465,29 @@ class Text2GarmentGenerator:
         # 返回筛选后的图像
         return valid_images
     
-    def description_to_garment(self, garment_description: Dict) -> Dict:
+    def description_to_garment(self, garment_description: Dict, cancel_token: Optional[CancellationToken] = None) -> Dict:
         """从服装描述生成服装图像"""
         # 获取类别和提示词
         category = garment_description.get("category", "upper_body")
         prompt = garment_description.get("prompt", "简约风格的白色T恤")
+        # 可选：请求中指定生成后端，否则按类别配置选择
+        backend = garment_description.get("backend")
         
-        # 创建输出目录
-        output_dir = os.path.join(STATIC_FOLDER, "garments", f"{category}_{str(hash(prompt))[:8]}")
+        # 创建输出目录（内置hash()按进程加盐，改用稳定的内容摘要；文件名带运行ID，重复运行不会覆盖）
+        output_dir = os.path.join(STATIC_FOLDER, "garments", f"{category}_{text_digest(prompt)[:8]}")
         os.makedirs(output_dir, exist_ok=True)
         
         # 生成服装图像
-        garment_images = self.produce_garment(prompt, category, output_dir)
+        stats = {}
+        garment_images = self.produce_garment(prompt, category, output_dir, stats=stats, backend=backend,
+                                              cancel_token=cancel_token)
         
         # 准备返回结果
         result = {
             "category": category,
             "prompt": prompt,
-            "garments": []
+            "garments": [],
+            "stats": stats
         }
         
         # 添加服装图像信息
@@ -230,6 +514,6 @@ class Text2GarmentGenerator:
 text2garment_generator_instance = Text2GarmentGenerator()
 
 # 导出函数
-def description_to_garment(garment_description: Dict) -> Dict:
+def description_to_garment(garment_description: Dict, cancel_token: Optional[CancellationToken] = None) -> Dict:
     """从服装描述生成服装图像"""
-    return text2garment_generator_instance.description_to_garment(garment_description)
\ No newline at end of file
+    return text2garment_generator_instance.description_to_garment(garment_description, cancel_token)
\ No newline at end of file
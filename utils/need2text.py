@@ -1,16 +1,37 @@
 import os
+import re
 import json
+import time
 from typing import Dict, Optional, Union
 from jinja2 import Template
 from openai import OpenAI
-from config.config import API_KEY, BASE_URL, LANGUAGE_MODEL
+from config.config import API_KEY, BASE_URL, LANGUAGE_MODEL, REMOTE_API_TIMEOUT
+from .circuit_breaker import remote_api_breaker
+from .hedging import language_hedger
+
+# 本地备选描述使用的类别关键词，按顺序匹配，均未命中时为upper_body
+CATEGORY_KEYWORDS = [
+    ("dresses", ["连衣裙", "礼服", "长裙", "dress"]),
+    ("lower_body", ["裤", "半身裙", "短裙", "jeans", "pants", "trousers", "skirt"]),
+    ("shoes", ["鞋", "靴", "shoes", "sneakers", "boots"]),
+    ("hat", ["帽", "hat", "cap"]),
+    ("glasses", ["眼镜", "墨镜", "glasses", "sunglasses"]),
+    ("belt", ["腰带", "皮带", "belt"]),
+    ("scarf", ["围巾", "丝巾", "scarf"]),
+]
+
+DEFAULT_DESCRIPTION = {
+    "category": "upper_body",
+    "prompt": "一件简约风格的白色T恤，棉质面料，圆领设计，短袖款式"
+}
 
 class Need2Text:
     def __init__(self):
         # 初始化OpenAI客户端
         self.client = OpenAI(
             api_key=API_KEY,
-            base_url=BASE_URL
+            base_url=BASE_URL,
+            timeout=REMOTE_API_TIMEOUT
         )
         
         # 初始化提示词模板
@@ -50,35 +71,59 @@ class Need2Text:
 服装类别可以是：upper_body（上装）、lower_body（下装）、dresses（连衣裙）、shoes（鞋类）、hat（帽子）、glasses（眼镜）、belt（腰带）、scarf（围巾）
 """)
 
-    def generate_response(self, prompt: str) -> Dict:
-        """使用Qwen2.5模型生成回复"""
+    @staticmethod
+    def local_fallback(user_need: str) -> Dict:
+        """远程服务不可用时按关键词推断服装类别，并直接以用户需求作为描述提示词
+
+        只使用用户需求：负面反馈描述的是不想要的内容（如"不要帽子"），拼入提示词或参与关键词匹配会得到相反的结果。
+        """
+        text = re.sub(r"\s+", " ", user_need or "").strip()
+        if not text:
+            return dict(DEFAULT_DESCRIPTION)
+        lowered = text.lower()
+        category = next(
+            (name for name, keywords in CATEGORY_KEYWORDS if any(keyword in lowered for keyword in keywords)),
+            "upper_body"
+        )
+        return {"category": category, "prompt": text}
+
+    def generate_response(self, prompt: str, fallback: Optional[Dict] = None) -> Dict:
+        """使用Qwen2.5模型生成回复，远程服务熔断或调用失败时返回fallback（未提供时返回默认描述）"""
+        fallback = fallback or dict(DEFAULT_DESCRIPTION)
+        if not remote_api_breaker.allow_request():
+            print("语言模型服务已熔断，使用本地备选描述")
+            return fallback
         try:
-            response = self.client.chat.completions.create(
-                model=LANGUAGE_MODEL,
-                messages=[
-                    {"role": "system", "content": "你是一个专业的服装设计师助手，擅长根据用户需求生成详细的服装描述。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=500
-            )
+            start_time = time.perf_counter()
+            try:
+                # 启用对冲时，超过近期延迟百分位数仍未返回的请求会再发出一个副本
+                response = language_hedger.call(
+                    self.client.chat.completions.create,
+                    model=LANGUAGE_MODEL,
+                    messages=[
+                        {"role": "system", "content": "你是一个专业的服装设计师助手，擅长根据用户需求生成详细的服装描述。"},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=500
+                )
+            except Exception as e:
+                remote_api_breaker.record_exception(e)
+                raise
+            remote_api_breaker.record_success(time.perf_counter() - start_time)
             content = response.choices[0].message.content.strip()
             # 解析JSON响应
             return json.loads(content)
         except Exception as e:
-            print(f"生成响应时出错: {e}")
-            # 返回默认值
-            return {
-                "category": "upper_body",
-                "prompt": "一件简约风格的白色T恤，棉质面料，圆领设计，短袖款式"
-            }
+            print(f"生成响应时出错，使用本地备选描述: {e}")
+            return fallback
 
     def get_need2text(self, user_need: str) -> Dict:
         """将用户需求转换为服装描述"""
         # 渲染提示词模板
         prompt = self.prompt_template.render(user_need=user_need)
         # 生成响应
-        result = self.generate_response(prompt)
+        result = self.generate_response(prompt, self.local_fallback(user_need))
         return result
 
     def get_addition_need2text(self, user_need: str, negative_feedback: str, original_description: str) -> Dict:
@@ -90,7 +135,7 @@ class Need2Text:
             original_description=original_description
         )
         # 生成响应
-        result = self.generate_response(prompt)
+        result = self.generate_response(prompt, self.local_fallback(user_need))
         return result
 
 # 创建全局实例
@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import threading
+from typing import Dict, Optional
+from jinja2 import Template
+from openai import OpenAI
+from transformers import CLIPTokenizer
+from config.config import API_KEY, BASE_URL, LANGUAGE_MODEL, PROMPT_TRANSLATION_CACHE
+
+# 翻译模板版本，修改翻译模板后需要同步修改，使旧的缓存失效
+TRANSLATION_TEMPLATE_VERSION = "v1"
+
+# 匹配中日韩文字
+CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+class PromptTranslator:
+    """将中文服装描述翻译为简洁的英文提示词，并按CLIP tokenizer精确截断
+
+    翻译结果按规范化后的原文持久化缓存，重复的提示词不会再次调用语言模型。
+    """
+
+    def __init__(self, cache_path: str = PROMPT_TRANSLATION_CACHE):
+        self.client = OpenAI(
+            api_key=API_KEY,
+            base_url=BASE_URL
+        )
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self.cache = self._load_cache()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # 与Flux和ClipScore使用相同的CLIP tokenizer，用于精确计算token数量
+        try:
+            local_model_path = os.path.join(os.path.dirname(__file__), "clip-vit-base-patch32")
+            self.tokenizer = CLIPTokenizer.from_pretrained(local_model_path, local_files_only=True)
+        except Exception as e:
+            print(f"加载CLIP tokenizer时出错，将按字符数截断提示词: {e}")
+            self.tokenizer = None
+
+        self.translation_template = Template("""
+Translate the following garment description into a concise English prompt for a text-to-image model.
+Keep the garment type, color, material, pattern, cut and style. Use short comma-separated phrases, most important first.
+Output only the English prompt, without quotes or explanations.
+
+Description: {{ prompt }}
+""")
+
+    def _load_cache(self) -> Dict[str, str]:
+        """加载持久化的翻译缓存"""
+        try:
+            if os.path.exists(self.cache_path):
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"加载翻译缓存时出错: {e}")
+        return {}
+
+    def _save_cache(self) -> None:
+        """原子地写回翻译缓存，调用方需持有锁"""
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"保存翻译缓存时出错: {e}")
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        """规范化提示词：去除首尾空白并合并连续空白"""
+        return re.sub(r"\s+", " ", prompt or "").strip()
+
+    def _cache_key(self, prompt: str) -> str:
+        return f"{LANGUAGE_MODEL}|{TRANSLATION_TEMPLATE_VERSION}|{prompt}"
+
+    def translate(self, prompt: str) -> str:
+        """将提示词翻译为英文；不含中文时直接返回规范化后的原文，失败时返回原文"""
+        normalized = self.normalize(prompt)
+        if not CJK_PATTERN.search(normalized):
+            return normalized
+
+        key = self._cache_key(normalized)
+        with self._lock:
+            cached = self.cache.get(key)
+        if cached:
+            self.cache_hits += 1
+            return cached
+
+        self.cache_misses += 1
+        try:
+            response = self.client.chat.completions.create(
+                model=LANGUAGE_MODEL,
+                messages=[
+                    {"role": "system", "content": "You are a professional fashion translator."},
+                    {"role": "user", "content": self.translation_template.render(prompt=normalized)}
+                ],
+                temperature=0.0,
+                max_tokens=150
+            )
+            translated = self.normalize(response.choices[0].message.content).strip("\"'")
+            if not translated:
+                return normalized
+        except Exception as e:
+            print(f"翻译提示词时出错: {e}")
+            return normalized
+
+        with self._lock:
+            self.cache[key] = translated
+            self._save_cache()
+        return translated
+
+    def count_tokens(self, text: str) -> Optional[int]:
+        """使用CLIP tokenizer计算token数量（不含起止符），tokenizer不可用时返回None"""
+        if self.tokenizer is None:
+            return None
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """按CLIP token数截断文本，优先在逗号分隔的短语边界处截断"""
+        if self.tokenizer is None:
+            return text[:max_tokens]
+
+        # 为起止符预留两个位置
+        budget = max_tokens - 2
+        if self.count_tokens(text) <= budget:
+            return text
+
+        kept = []
+        for phrase in [p.strip() for p in text.split(",") if p.strip()]:
+            candidate = ", ".join(kept + [phrase])
+            if self.count_tokens(candidate) > budget:
+                break
+            kept.append(phrase)
+        if kept:
+            return ", ".join(kept)
+
+        # 第一个短语就超出限制时按token硬截断
+        input_ids = self.tokenizer(text, add_special_tokens=False)["input_ids"][:budget]
+        return self.tokenizer.decode(input_ids).strip()
+
+    def get_stats(self) -> Dict:
+        """返回翻译缓存的命中统计"""
+        total = self.cache_hits + self.cache_misses
+        return {
+            "cache_size": len(self.cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "hit_ratio": self.cache_hits / total if total else 0.0
+        }
+
+
+# 创建全局实例
+prompt_translator_instance = PromptTranslator()
+
+
+# 导出函数
+def translate_prompt(prompt: str) -> str:
+    """将服装描述翻译为英文提示词"""
+    return prompt_translator_instance.translate(prompt)
@@ -0,0 +1,45 @@
+import time
+import threading
+from typing import Optional
+from .cancellation import CancellationToken, OperationCancelledError, is_cancelled
+
+
+class TokenBucket:
+    """客户端令牌桶限流：以rate个/秒的速度补充令牌，最多积累capacity个，每次请求消耗一个令牌
+
+    rate小于等于0时不限流。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = max(1.0, capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """按经过的时间补充令牌，调用方需持有锁"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """尝试取得一个令牌，成功返回0，否则返回预计需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, cancel_token: Optional[CancellationToken] = None, poll_interval: float = 0.1) -> None:
+        """阻塞直到取得令牌，等待期间令牌被取消时抛出OperationCancelledError"""
+        while True:
+            wait_time = self.try_acquire()
+            if wait_time == 0:
+                return
+            if is_cancelled(cancel_token):
+                raise OperationCancelledError("等待限流令牌时操作已取消")
+            time.sleep(min(wait_time, poll_interval))
@@ -0,0 +1,67 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+
+class VQAScoreStore:
+    """持久化的VQA分数存储（SQLite）
+
+    以（图像内容摘要，描述，视觉模型，模板版本）为键，更换模型或修改评分模板后旧记录自然不再命中。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS vqa_scores (
+                image_digest TEXT NOT NULL,
+                description TEXT NOT NULL,
+                model TEXT NOT NULL,
+                template_version TEXT NOT NULL,
+                score REAL NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (image_digest, description, model, template_version)
+            )
+        """)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image_digest: str, description: str, model: str, template_version: str) -> Optional[float]:
+        """查询已存储的分数，未命中时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT score FROM vqa_scores WHERE image_digest = ? AND description = ? AND model = ? AND template_version = ?",
+                (image_digest, description, model, template_version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return float(row[0])
+
+    def put(self, image_digest: str, description: str, model: str, template_version: str, score: float) -> None:
+        """写入或覆盖一条分数记录"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO vqa_scores VALUES (?, ?, ?, ?, ?, ?)",
+                (image_digest, description, model, template_version, float(score), time.time())
+            )
+            self._conn.commit()
+
+    def get_stats(self) -> Dict:
+        """返回存储的记录数和命中率"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM vqa_scores").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "size": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0
+            }
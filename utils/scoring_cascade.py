@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import random
+import threading
+from typing import Dict, List, Optional, Tuple
+from .metrics import ClipScore
+from config.config import GARMENT_VQA_LOW_THRESHOLD
+from config.config import SCORING_CASCADE_MODE, SCORING_CASCADE_TARGET_RECALL, SCORING_CASCADE_MIN_SAMPLES
+from config.config import SCORING_CASCADE_EXPLORATION_RATE, SCORING_CASCADE_LOG, SCORING_CASCADE_CALIBRATION
+
+
+def sample_weight(record: Dict) -> float:
+    """分数对记录的重要性权重
+
+    on模式下被阈值拒绝的候选只有按探索概率放行的部分得到VQA分数，每个这样的样本代表1/探索概率个被拒候选，
+    按该倍数加权；其余送入VQA的候选权重为1。
+    """
+    if record.get("mode") == "on" and record.get("would_reject"):
+        rate = record.get("exploration_rate", SCORING_CASCADE_EXPLORATION_RATE)
+        return 1.0 / rate if rate and rate > 0 else 0.0
+    return 1.0
+
+
+def calibrate_cutoffs(records: List[Dict], target_recall: float = SCORING_CASCADE_TARGET_RECALL,
+                      min_samples: int = SCORING_CASCADE_MIN_SAMPLES) -> Dict[str, Dict]:
+    """根据记录的CLIP/VQA分数对，为每个类别选择CLIP初筛阈值
+
+    阈值取VQA合格（不低于类别低评分阈值）样本CLIP分数的加权(1 - target_recall)分位数，
+    即至少保留target_recall比例的合格候选。没有VQA分数的被拒候选由同类的探索样本按权重代表（见sample_weight），
+    因此on模式积累的记录不会使阈值偏高。合格样本少于min_samples的类别不设阈值。
+    """
+    by_category: Dict[str, List[Dict]] = {}
+    for record in records:
+        if record.get("vqa_score") is None or record.get("clip_score") is None or record.get("vqa_fallback"):
+            continue
+        by_category.setdefault(record["category"], []).append(record)
+
+    calibration = {}
+    for category, category_records in by_category.items():
+        low_threshold = GARMENT_VQA_LOW_THRESHOLD.get(category, 0.65)
+        acceptable = sorted((r["clip_score"], sample_weight(r)) for r in category_records
+                            if r["vqa_score"] >= low_threshold)
+        if len(acceptable) < min_samples:
+            continue
+        # 加权分位数：取第一个使累计权重超过(1 - target_recall)比例的分数，权重全为1时与按下标取分位数一致
+        allowed_loss = (1 - target_recall) * sum(weight for _, weight in acceptable)
+        cumulative = 0.0
+        cutoff = acceptable[-1][0]
+        for clip_score, weight in acceptable:
+            cumulative += weight
+            if cumulative > allowed_loss:
+                cutoff = clip_score
+                break
+        total_weight = sum(sample_weight(r) for r in category_records)
+        rejected = sum(sample_weight(r) for r in category_records if r["clip_score"] < cutoff)
+        calibration[category] = {
+            "cutoff": cutoff,
+            "samples": len(category_records),
+            "acceptable_samples": len(acceptable),
+            "expected_reject_rate": rejected / total_weight if total_weight else 0.0
+        }
+    return calibration
+
+
+def load_score_pairs(log_path: str = SCORING_CASCADE_LOG) -> List[Dict]:
+    """读取记录的CLIP/VQA分数对"""
+    records = []
+    if not os.path.exists(log_path):
+        return records
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return records
+
+
+class ScoringCascade:
+    """两级评分：先用本地CLIP初筛，明显不合格的候选不再调用远程VQA
+
+    mode为off时不初筛；shadow时计算CLIP分数并记录，但所有候选仍送入VQA，用于积累校准数据；
+    on时按类别阈值拒绝候选，并以较小概率放行被拒候选以持续记录阈值以下的分数对，
+    放行的探索样本得到真实的VQA分数，与其他候选一样参与筛选，校准时按探索概率加权。
+    """
+
+    def __init__(self, clip_scorer: ClipScore, mode: str = SCORING_CASCADE_MODE,
+                 log_path: str = SCORING_CASCADE_LOG, calibration_path: str = SCORING_CASCADE_CALIBRATION):
+        self.clip_scorer = clip_scorer
+        self.mode = mode
+        self.log_path = log_path
+        self.calibration_path = calibration_path
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self.calibration = self._load_calibration()
+
+    def _load_calibration(self) -> Dict[str, Dict]:
+        """加载已保存的阈值，不存在时根据分数对记录重新校准"""
+        try:
+            if os.path.exists(self.calibration_path):
+                with open(self.calibration_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"加载评分级联阈值时出错: {e}")
+        return self.recalibrate() if self.mode != "off" else {}
+
+    def recalibrate(self) -> Dict[str, Dict]:
+        """根据分数对记录重新计算各类别阈值并保存"""
+        try:
+            calibration = calibrate_cutoffs(load_score_pairs(self.log_path))
+            os.makedirs(os.path.dirname(self.calibration_path), exist_ok=True)
+            with open(self.calibration_path, "w", encoding="utf-8") as f:
+                json.dump(calibration, f, ensure_ascii=False, indent=2)
+            self.calibration = calibration
+            return calibration
+        except Exception as e:
+            print(f"校准评分级联阈值时出错: {e}")
+            return {}
+
+    def cutoff(self, category: str) -> Optional[float]:
+        """返回类别的CLIP初筛阈值，尚未校准时返回None"""
+        entry = self.calibration.get(category)
+        return entry["cutoff"] if entry else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("shadow", "on")
+
+    def screen(self, image_paths: List[str], clip_prompt: str, category: str) -> Tuple[List[float], List[bool], List[bool]]:
+        """计算CLIP分数并决定哪些候选送入VQA
+
+        返回（CLIP分数，是否送入VQA，阈值是否判定为拒绝）。shadow模式下所有候选都送入VQA。
+        """
+        clip_scores = self.clip_scorer.similarity_batch(image_paths, clip_prompt)
+        cutoff = self.cutoff(category)
+        would_reject = [cutoff is not None and score < cutoff for score in clip_scores]
+        if self.mode == "on":
+            send = [not rejected or self._rng.random() < SCORING_CASCADE_EXPLORATION_RATE for rejected in would_reject]
+        else:
+            send = [True] * len(image_paths)
+        return clip_scores, send, would_reject
+
+    def log_pairs(self, run_id: str, category: str, prompt: str, image_paths: List[str], clip_scores: List[float],
+                  vqa_scores: List[Optional[float]], would_reject: List[bool],
+                  vqa_fallback: Optional[List[bool]] = None) -> None:
+        """追加记录一批候选的CLIP分数、VQA分数（未调用时为None）和初筛结果
+
+        vqa_fallback标记远程服务不可用时由本地备选评分得到的分数，这些记录不参与校准。
+        """
+        try:
+            now = time.time()
+            vqa_fallback = vqa_fallback or [False] * len(image_paths)
+            lines = [
+                json.dumps({
+                    "run_id": run_id,
+                    "mode": self.mode,
+                    "category": category,
+                    "prompt": prompt,
+                    "path": path,
+                    "clip_score": clip_score,
+                    "vqa_score": vqa_score,
+                    "would_reject": rejected,
+                    "exploration_rate": SCORING_CASCADE_EXPLORATION_RATE,
+                    "vqa_fallback": fallback,
+                    "timestamp": now
+                }, ensure_ascii=False)
+                for path, clip_score, vqa_score, rejected, fallback
+                in zip(image_paths, clip_scores, vqa_scores, would_reject, vqa_fallback)
+            ]
+            with self._lock:
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+        except Exception as e:
+            print(f"记录CLIP/VQA分数对时出错: {e}")
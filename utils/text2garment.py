@@ -1,11 +1,15 @@
 import os
 import json
+import uuid
 import requests
 from typing import Dict, List, Optional, Union
 from PIL import Image
 import ddgs
 from .image_process import image_process
-from .metrics import VQAScore
+from .metrics import VQAScore, is_fallback_score
+from .garment_library import add_to_garment_library
+from .digest import text_digest
+from .cancellation import CancellationToken, OperationCancelledError, is_cancelled
 from config.config import STATIC_FOLDER, MAX_TEXT2GARMENT_ITERATIONS, GARMENT_VQA_HIGH_THRESHOLD, GARMENT_VQA_LOW_THRESHOLD
 
 class Text2Garment:
@@ -49,7 +53,8 @@ class Text2Garment:
         
         return all_queries
 
-    def get_text2garment(self, queries: List[str], output_dir: str, num_images: int = 10) -> List[str]:
+    def get_text2garment(self, queries: List[str], output_dir: str, num_images: int = 10,
+                         cancel_token: Optional[CancellationToken] = None) -> List[str]:
         """通过DDG搜索获取服装图像"""
         # 确保输出目录存在
         os.makedirs(output_dir, exist_ok=True)
@@ -62,6 +67,8 @@ class Text2Garment:
                 results = self.ddgs.images(query, max_results=num_images)
                 
                 for i, result in enumerate(results):
+                    if is_cancelled(cancel_token):
+                        return downloaded_images
                     try:
                         # 下载图像
                         image_url = result["image"]
@@ -94,8 +101,8 @@ class Text2Garment:
 
     def produce_garment(self, garment_prompt: str, category: str, output_dir: str, 
                         max_iterations: int = MAX_TEXT2GARMENT_ITERATIONS, 
-                        num_images_per_iter: int = 10) -> List[Dict]:
-        """生成并筛选服装图像"""
+                        num_images_per_iter: int = 10, cancel_token: Optional[CancellationToken] = None) -> List[Dict]:
+        """生成并筛选服装图像，取消令牌被触发时尽快停止搜索"""
         # 确保输出目录存在
         os.makedirs(output_dir, exist_ok=True)
         
@@ -103,6 +110,8 @@ class Text2Garment:
         all_images = []
         high_score_images = []
         current_iteration = 0
+        # 每次运行使用独立的下载目录，重复运行不会覆盖之前的图像
+        run_id = uuid.uuid4().hex[:8]
         
         # 获取类别对应的评分阈值
         high_threshold = GARMENT_VQA_HIGH_THRESHOLD.get(category, 0.75)
@@ -110,21 +119,30 @@ class Text2Garment:
         
         # 进行迭代搜索和评估
         while current_iteration < max_iterations and len(high_score_images) < 3:
+            if is_cancelled(cancel_token):
+                print("收到停止信号，结束服装搜索")
+                break
             print(f"迭代 {current_iteration + 1}/{max_iterations}...")
             
             # 构建搜索查询词
             queries = self.make_queries(garment_prompt, category)
             
             # 搜索图像
-            image_dir = os.path.join(output_dir, f"iteration_{current_iteration}")
-            downloaded_images = self.get_text2garment(queries, image_dir, num_images_per_iter)
+            image_dir = os.path.join(output_dir, f"{run_id}_iteration_{current_iteration}")
+            downloaded_images = self.get_text2garment(queries, image_dir, num_images_per_iter, cancel_token)
             
-            # 评估图像
-            for image_path in downloaded_images:
+            # 并发评估本轮下载的图像，取消时放弃尚未返回的请求
+            try:
+                scores = self.vqa_scorer.score_many(downloaded_images, garment_prompt, cancel_token=cancel_token)
+            except OperationCancelledError:
+                print("评分已取消")
+                break
+            except Exception as e:
+                print(f"评分图像时出错: {e}")
+                scores = []
+            
+            for image_path, score in zip(downloaded_images, scores):
                 try:
-                    # 计算VQA分数
-                    score = self.vqa_scorer.score(image_path, garment_prompt)
-                    
                     # 确保score是一个浮点数
                     if not isinstance(score, (int, float)):
                         print(f"警告: 评分不是数字类型，得到的是: {type(score)}, 值: {score}")
@@ -134,11 +152,15 @@ class Text2Garment:
                     image_info = {
                         "path": image_path,
                         "score": float(score),  # 确保是浮点数
+                        # 远程服务不可用时的本地备选分数，不作为真实VQA分数记录
+                        "vqa_fallback": is_fallback_score(score),
                         "prompt": garment_prompt,
                         "category": category
                     }
                     
                     all_images.append(image_info)
+                    # 写入持久化服装库，供后续相似请求直接复用
+                    add_to_garment_library(image_info, "retrieval")
                     
                     # 根据分数分类
                     if score >= high_threshold:
@@ -176,19 +198,18 @@ class Text2Garment:
         # 返回筛选后的图像
         return valid_images
 
-    def description_to_garment(self, garment_description: Dict) -> Dict:
+    def description_to_garment(self, garment_description: Dict, cancel_token: Optional[CancellationToken] = None) -> Dict:
         """从服装描述生成服装图像"""
         # 获取类别和提示词
         category = garment_description.get("category", "upper_body")
         prompt = garment_description.get("prompt", "简约风格的白色T恤")
         
         # 创建输出目录
-        output_dir = os.path.join(STATIC_FOLDER, "garments", f"{category}_{str(hash(prompt))[:8]}")
-        # 整数不支持切片。需要先将hash值转换为字符串再切片
+        output_dir = os.path.join(STATIC_FOLDER, "garments", f"{category}_{text_digest(prompt)[:8]}")
         os.makedirs(output_dir, exist_ok=True)
 
         # 生成服装图像
-        garment_images = self.produce_garment(prompt, category, output_dir)
+        garment_images = self.produce_garment(prompt, category, output_dir, cancel_token=cancel_token)
         
         # 准备返回结果
         result = {
@@ -221,6 +242,6 @@ class Text2Garment:
 text2garment_instance = Text2Garment()
 
 # 导出函数
-def description_to_garment(garment_description: Dict) -> Dict:
+def description_to_garment(garment_description: Dict, cancel_token: Optional[CancellationToken] = None) -> Dict:
     """从服装描述生成服装图像"""
-    return text2garment_instance.description_to_garment(garment_description)
\ No newline at end of file
+    return text2garment_instance.description_to_garment(garment_description, cancel_token)
\ No newline at end of file
@@ -0,0 +1,140 @@
+import re
+import difflib
+from typing import Dict, List, Optional
+from config.config import GARMENT_VQA_HIGH_THRESHOLD, GARMENT_VQA_LOW_THRESHOLD
+from config.config import VTON_CLIP_SCORE_HIGH_THRESHOLD, VTON_CLIP_SCORE_LOW_THRESHOLD
+from config.config import THRESHOLD_TUNING_TARGET_ACCEPTANCE, THRESHOLD_TUNING_MIN_RUNS
+
+# 各阶段调优的配置项：提前结束迭代的高阈值按低阈值定义的质量要求调优，低阈值本身保持不变
+# required为提前结束所需的达标候选数量，与produce_garment（3张）和run_vton（1张）一致
+STAGES = {
+    "garment": {
+        "config_name": "GARMENT_VQA_HIGH_THRESHOLD",
+        "thresholds": GARMENT_VQA_HIGH_THRESHOLD,
+        "default_threshold": 0.75,
+        "quality_bars": GARMENT_VQA_LOW_THRESHOLD,
+        "default_quality_bar": 0.65,
+        "required": 3
+    },
+    "vton": {
+        "config_name": "VTON_CLIP_SCORE_HIGH_THRESHOLD",
+        "thresholds": VTON_CLIP_SCORE_HIGH_THRESHOLD,
+        "default_threshold": 0.7,
+        "quality_bars": VTON_CLIP_SCORE_LOW_THRESHOLD,
+        "default_quality_bar": 0.55,
+        "required": 1
+    }
+}
+
+
+def replay_run(run: Dict, threshold: float, quality_bar: float, required: int) -> Dict:
+    """按给定阈值回放一次运行，返回消耗的生成数、结果是否达到质量要求以及回放是否超出记录
+
+    逐轮累计分数，达标（不低于threshold）候选达到required个时停止；最终结果为分数最高的required个候选，
+    全部不低于quality_bar时视为合格。新阈值需要比记录更多的迭代而原运行已提前结束时（记录被截断），
+    按用满最大迭代次数计算生成数，合格与否按已记录的候选判断（偏保守）。
+    """
+    consumed: List[float] = []
+    iterations = 0
+    stopped = False
+    for scores in run["iteration_scores"]:
+        consumed.extend(scores)
+        iterations += 1
+        if sum(1 for score in consumed if score >= threshold) >= required:
+            stopped = True
+            break
+
+    censored = not stopped and run.get("stopped_early", False)
+    if censored:
+        iterations = run["max_iterations"]
+    top = sorted(consumed, reverse=True)[:required]
+    return {
+        "generations": iterations * run["per_iteration"],
+        "accepted": len(top) >= required and all(score >= quality_bar for score in top),
+        "censored": censored
+    }
+
+
+def evaluate_threshold(runs: List[Dict], threshold: float, quality_bar: float, required: int) -> Dict:
+    """回放全部运行，返回平均生成数、合格率和被截断回放的比例"""
+    replays = [replay_run(run, threshold, quality_bar, required) for run in runs]
+    return {
+        "threshold": threshold,
+        "expected_generations": sum(r["generations"] for r in replays) / len(replays),
+        "acceptance_rate": sum(r["accepted"] for r in replays) / len(replays),
+        "censored_rate": sum(r["censored"] for r in replays) / len(replays)
+    }
+
+
+def tune_category(runs: List[Dict], current_threshold: float, quality_bar: float, required: int,
+                  target_acceptance: float = THRESHOLD_TUNING_TARGET_ACCEPTANCE) -> Dict:
+    """在合格率不低于target_acceptance的阈值中选择平均生成数最少的；都达不到时选择合格率最高的"""
+    candidates = {round(score, 2) for run in runs for scores in run["iteration_scores"] for score in scores}
+    candidates = sorted(c for c in candidates | {round(current_threshold, 2), 1.0} if 0.0 <= c <= 1.0)
+    results = [evaluate_threshold(runs, threshold, quality_bar, required) for threshold in candidates]
+
+    feasible = [r for r in results if r["acceptance_rate"] >= target_acceptance]
+    if feasible:
+        best = min(feasible, key=lambda r: (r["expected_generations"], -r["acceptance_rate"], -r["threshold"]))
+    else:
+        best = max(results, key=lambda r: (r["acceptance_rate"], -r["expected_generations"]))
+    current = evaluate_threshold(runs, current_threshold, quality_bar, required)
+    return {
+        "runs": len(runs),
+        "quality_bar": quality_bar,
+        "current": current_threshold,
+        "recommended": best["threshold"],
+        "target_met": bool(feasible),
+        "current_expected_generations": current["expected_generations"],
+        "expected_generations": best["expected_generations"],
+        "current_acceptance_rate": current["acceptance_rate"],
+        "acceptance_rate": best["acceptance_rate"],
+        "censored_rate": best["censored_rate"]
+    }
+
+
+def tune_stage(runs: List[Dict], stage: str, target_acceptance: float = THRESHOLD_TUNING_TARGET_ACCEPTANCE,
+               min_runs: int = THRESHOLD_TUNING_MIN_RUNS) -> Dict[str, Dict]:
+    """为一个阶段的各类别推荐高阈值，运行数少于min_runs的类别跳过
+
+    含本地备选评分的运行不参与调优：备选分数与VQA分数只是近似同尺度，会使推荐阈值失真。
+    """
+    spec = STAGES[stage]
+    by_category: Dict[str, List[Dict]] = {}
+    for run in runs:
+        if run.get("stage") == stage and not run.get("fallback_attempts"):
+            by_category.setdefault(run["category"], []).append(run)
+
+    recommendations = {}
+    for category, category_runs in by_category.items():
+        if len(category_runs) < min_runs:
+            continue
+        recommendations[category] = tune_category(
+            category_runs,
+            spec["thresholds"].get(category, spec["default_threshold"]),
+            spec["quality_bars"].get(category, spec["default_quality_bar"]),
+            spec["required"],
+            target_acceptance
+        )
+    return recommendations
+
+
+def config_diff(config_path: str, recommendations: Dict[str, Dict[str, float]], label: Optional[str] = None) -> str:
+    """生成将推荐阈值写入配置文件的unified diff，recommendations为{配置项名: {类别: 阈值}}，label为diff中显示的文件路径"""
+    with open(config_path, "r", encoding="utf-8") as f:
+        original = f.read()
+
+    updated = original
+    for config_name, values in recommendations.items():
+        block = re.search(rf"^{config_name} = \{{.*?^\}}", updated, re.S | re.M)
+        if block is None:
+            continue
+        text = block.group(0)
+        for category, value in values.items():
+            text = re.sub(rf'("{category}":\s*)[0-9.]+', lambda m: f"{m.group(1)}{value:.2f}", text)
+        updated = updated[:block.start()] + text + updated[block.end():]
+
+    return "".join(difflib.unified_diff(
+        original.splitlines(keepends=True), updated.splitlines(keepends=True),
+        fromfile=f"a/{label or config_path}", tofile=f"b/{label or config_path}"
+    ))
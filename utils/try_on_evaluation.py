@@ -0,0 +1,97 @@
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from .metrics import VQAScore, ClipScore
+from .human_mask import human_mask_instance
+from .cancellation import CancellationToken
+from .prompt_translation import prompt_translator_instance
+from config.config import CLIP_PREPROCESS_WORKERS, PROMPT_TRANSLATION_ENABLED
+from config.config import TRY_ON_EVAL_VQA_WEIGHT, TRY_ON_EVAL_CLIP_WEIGHT, TRY_ON_EVAL_NO_HUMAN_PENALTY
+
+
+class TryOnEvaluator:
+    """批量评估虚拟试穿结果
+
+    每张结果图像只解码一次，解码得到的RGB图像供CLIP批量评分，BGR数组供人体检测和分割；
+    VQA评分在后台并发进行（按文件内容摘要查询分数存储并复用编码缓存，因此直接传入文件路径）。
+    clip_score与试穿迭代使用同一评分（ClipScore.score_batch，默认为校准后的余弦相似度），随图像变化，
+    可与VTON_CLIP_SCORE_*_THRESHOLD比较。返回每个结果一行的指标表，可直接按overall_score排序。
+    """
+
+    def __init__(self, vqa_scorer: Optional[VQAScore] = None, clip_scorer: Optional[ClipScore] = None,
+                 human_mask=None, max_workers: int = CLIP_PREPROCESS_WORKERS):
+        self.clip_scorer = clip_scorer or ClipScore()
+        self.vqa_scorer = vqa_scorer or VQAScore(clip_scorer=self.clip_scorer)
+        self.human_mask = human_mask or human_mask_instance
+        self._executor = ThreadPoolExecutor(max_workers=max(2, max_workers), thread_name_prefix="try_on_eval")
+
+    @staticmethod
+    def _decode(image_path: str) -> Tuple[Optional[Image.Image], Optional[np.ndarray]]:
+        """解码一次，返回RGB的PIL图像和BGR数组，失败时返回(None, None)"""
+        try:
+            with Image.open(image_path) as image:
+                rgb = image.convert("RGB")
+            return rgb, np.ascontiguousarray(np.asarray(rgb)[:, :, ::-1])
+        except Exception as e:
+            print(f"读取试穿结果图像时出错: {e}")
+            return None, None
+
+    def _human_metrics(self, bgr: Optional[np.ndarray]) -> Dict:
+        """人体检测和分割指标"""
+        if bgr is None:
+            return {"has_human": False, "human_area": 0.0}
+        mask = self.human_mask.segment_human(bgr)
+        area = float(np.count_nonzero(mask)) / mask.size if mask is not None and mask.size else 0.0
+        return {"has_human": bool(self.human_mask.detect_human(bgr)), "human_area": round(area, 4)}
+
+    @staticmethod
+    def vqa_description(clothing_description: str) -> str:
+        """试穿效果的VQA评估描述"""
+        return f"模特自然地穿着{clothing_description or '一件服装'}，服装合身，试穿效果真实"
+
+    def evaluate_batch(self, result_images: List[str], clothing_descriptions: List[str],
+                       category: Optional[str] = None,
+                       cancel_token: Optional[CancellationToken] = None) -> List[Dict]:
+        """评估多张试穿结果图像，返回与输入顺序一致的指标表"""
+        if len(result_images) != len(clothing_descriptions):
+            raise ValueError(f"图像数量({len(result_images)})与描述数量({len(clothing_descriptions)})不一致")
+        if not result_images:
+            return []
+
+        # VQA是远程调用，最先提交，与本地计算重叠
+        vqa_future = self._executor.submit(
+            self.vqa_scorer.score_many, result_images,
+            [self.vqa_description(description) for description in clothing_descriptions], cancel_token)
+
+        decoded = list(self._executor.map(self._decode, result_images))
+        human_iter = self._executor.map(self._human_metrics, [bgr for _, bgr in decoded])
+
+        # 无法解码的图像不参与CLIP评分
+        valid = [i for i, (rgb, _) in enumerate(decoded) if rgb is not None]
+        clip_scores = [0.0] * len(result_images)
+        texts = [clothing_descriptions[i] or "一件服装" for i in valid]
+        if PROMPT_TRANSLATION_ENABLED:
+            # 与试穿评分一致，CLIP使用翻译后的英文描述
+            texts = [prompt_translator_instance.translate(text) for text in texts]
+        for i, score in zip(valid, self.clip_scorer.score_batch([decoded[i][0] for i in valid], texts,
+                                                                 category=category)):
+            clip_scores[i] = score
+
+        human_metrics = list(human_iter)
+        vqa_scores = vqa_future.result()
+
+        table = []
+        for i, image_path in enumerate(result_images):
+            overall = TRY_ON_EVAL_VQA_WEIGHT * vqa_scores[i] + TRY_ON_EVAL_CLIP_WEIGHT * clip_scores[i]
+            if not human_metrics[i]["has_human"]:
+                overall *= TRY_ON_EVAL_NO_HUMAN_PENALTY
+            table.append({
+                "result_image": image_path,
+                "vqa_score": round(float(vqa_scores[i]), 4),
+                "clip_score": round(float(clip_scores[i]), 4),
+                "has_human": human_metrics[i]["has_human"],
+                "human_area": human_metrics[i]["human_area"],
+                "overall_score": round(10 * overall, 2)
+            })
+        return table